@@ -1,14 +1,113 @@
+import os
 from functools import lru_cache
 
+# Prefijo de las variables de entorno que sobreescriben la configuracion
+PREFIJO_ENTORNO = "MENSAJES_"
+
 
 class Configuracion:
-    """Configuracion central de la aplicacion."""
+    """Configuracion central de la aplicacion.
+
+    Cualquier atributo se puede sobreescribir con la variable de entorno
+    `MENSAJES_<ATRIBUTO>` (p. ej. `MENSAJES_RUTA_BASE_DATOS`). Asi la heredan los
+    workers que lanza `app.lanzador`, que son procesos nuevos.
+    """
 
     NOMBRE_APP: str = "API de Procesamiento de Mensajes"
     VERSION: str = "1.0.0"
     RUTA_BASE_DATOS: str = "mensajes.db"
+    # Con N > 1 los mensajes se reparten por session_id en N archivos (mensajes.0.db, ...),
+    # cada uno con su pool y su escritor. Para dividir una base existente:
+    # python -m app.herramientas.fragmentar_base_datos mensajes.db --fragmentos N
+    FRAGMENTOS_BASE_DATOS: int = 1
+    # Con fragmentos, message_id es unico solo dentro de su fragmento: un id repetido en una
+    # sesion de otro fragmento se guarda (201). True lo hace unico entre todos con un directorio
+    # de ids (mensajes.ids.db), a costa de una escritura confirmada mas en ese archivo compartido
+    # por cada mensaje o lote, que vuelve a serializar las escrituras de todos los fragmentos.
+    ID_UNICO_ENTRE_FRAGMENTOS: bool = False
+    # Motor de almacenamiento: "sqlite" (RUTA_BASE_DATOS y fragmentos) o "postgres" (URL_POSTGRES,
+    # requiere `pip install "psycopg[binary,pool]"`). Con postgres no aplican los fragmentos,
+    # la escritura agrupada ni la retencion, que son propios de los archivos SQLite.
+    MOTOR_BASE_DATOS: str = "sqlite"
+    URL_POSTGRES: str = ""
     LIMITE_PAGINACION_DEFECTO: int = 50
     LIMITE_PAGINACION_MAXIMO: int = 100
+    TAMANO_MAXIMO_LOTE: int = 500
+    # include_total sin since/until sale de los contadores de `sesiones` (exacto). Con rango se
+    # cuentan a lo sumo estas filas; si hay mas, el total se estima (pagination.total_exact=false).
+    # 0 = contar siempre todo el rango.
+    MAXIMO_CONTEO_EXACTO: int = 10_000
+
+    # Cache en memoria de paginas GET por sesion (se invalida al escribir en la sesion)
+    CACHE_PAGINAS_HABILITADA: bool = True
+    CACHE_PAGINAS_MAX_ENTRADAS: int = 2048
+    CACHE_PAGINAS_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_PAGINAS_TTL_SEGUNDOS: float = 5.0
+
+    # Compresion de respuestas JSON/NDJSON: gzip, o brotli si el paquete `brotli` esta instalado
+    COMPRESION_HABILITADA: bool = True
+    COMPRESION_TAMANO_MINIMO_BYTES: int = 1024
+    COMPRESION_NIVEL_GZIP: int = 6
+    COMPRESION_CALIDAD_BROTLI: int = 4
+
+    # Streams de sesion (SSE): mensajes sin enviar por suscriptor antes de cortarlo (reanuda
+    # por cursor), cada cuanto se envia un latido y cada cuanto se revisan en la base, una vez
+    # por sesion, las escrituras de otros workers
+    CAPACIDAD_COLA_SUSCRIPTOR: int = 1000
+    LATIDO_STREAM_SEGUNDOS: float = 15.0
+
+    # Chequeo previo de duplicados: ids guardados hace poco (0 = desactivado)
+    CAPACIDAD_IDS_RECIENTES: int = 100_000
+    # Modo idempotente: un POST repetido (mismo message_id y session_id) responde 200 con el
+    # mensaje guardado originalmente en lugar de 409
+    MODO_IDEMPOTENTE: bool = False
+
+    # Pool de conexiones SQLite compartido por las solicitudes
+    TAMANO_POOL_CONEXIONES: int = 8
+    ESPERA_POOL_SEGUNDOS: float = 5.0
+    SENTENCIAS_EN_CACHE: int = 128
+
+    # Hilos dedicados a la BD para los handlers async (0 = threadpool por defecto de Starlette).
+    # Conviene que TAMANO_POOL_CONEXIONES sea al menos igual.
+    HILOS_EJECUTOR_BD: int = 8
+
+    # Escritura agrupada (group commit): un hilo confirma muchas inserciones por transaccion
+    ESCRITURA_AGRUPADA: bool = False
+    TAMANO_LOTE_ESCRITURA: int = 256
+    INTERVALO_ESCRITURA_MS: float = 2.0
+    CAPACIDAD_COLA_ESCRITURA: int = 10000
+    ESPERA_COLA_ESCRITURA_SEGUNDOS: float = 1.0
+    # Espera maxima de cada llamador por la confirmacion de su lote (luego responde 503)
+    ESPERA_CONFIRMACION_ESCRITURA_SEGUNDOS: float = 30.0
+
+    # Ajustes de SQLite para varios procesos escribiendo el mismo archivo (WAL).
+    # Con WAL, synchronous=NORMAL no arriesga corrupcion: solo las ultimas transacciones
+    # ante un corte de energia.
+    ESPERA_BLOQUEO_SQLITE_MS: int = 5000
+    SINCRONIZACION_SQLITE: str = "NORMAL"
+    # El lanzador crea/migra el esquema una vez antes de iniciar los workers y lo desactiva
+    PREPARAR_ESQUEMA_AL_INICIAR: bool = True
+
+    # Retencion: un hilo por fragmento borra cada INTERVALO_RETENCION_SEGUNDOS los mensajes con
+    # mas de RETENCION_DIAS dias y los que pasen de MAXIMO_MENSAJES_POR_SESION en su sesion
+    # (los mas antiguos). 0 = sin ese limite; sin ninguno de los dos no se borra nada.
+    RETENCION_DIAS: float = 0.0
+    MAXIMO_MENSAJES_POR_SESION: int = 0
+    INTERVALO_RETENCION_SEGUNDOS: float = 3600.0
+    # Lo borrado se guarda antes en archivos .ndjson.gz en este directorio (vacio = no archivar)
+    DIRECTORIO_ARCHIVO_RETENCION: str = "archivo"
+    # Mensajes por transaccion y pausa entre lotes, para no retener el candado de escritura
+    TAMANO_LOTE_RETENCION: int = 500
+    PAUSA_LOTES_RETENCION_MS: float = 20.0
+    # Despues de cada pasada: paginas devueltas al sistema por paso de vacuum incremental y
+    # modo del checkpoint del WAL (PASSIVE, FULL, RESTART o TRUNCATE)
+    PAGINAS_VACUUM_INCREMENTAL: int = 1000
+    MODO_CHECKPOINT_RETENCION: str = "TRUNCATE"
+
+    # Archivo con las palabras prohibidas (una por linea). Se vigila y se recarga en caliente
+    # cada INTERVALO_RECARGA_PALABRAS_SEGUNDOS; vacio = usar PALABRAS_PROHIBIDAS.
+    RUTA_PALABRAS_PROHIBIDAS: str = ""
+    INTERVALO_RECARGA_PALABRAS_SEGUNDOS: float = 2.0
 
     # Lista de palabras que se filtran del contenido
     PALABRAS_PROHIBIDAS: list[str] = [
@@ -16,6 +115,20 @@ class Configuracion:
         "mierda", "puta", "bastardo", "pendejo", "cabron"
     ]
 
+    def __init__(self):
+        for nombre, defecto in vars(Configuracion).items():
+            valor = os.environ.get(PREFIJO_ENTORNO + nombre)
+            if nombre.isupper() and valor is not None:
+                setattr(self, nombre, _convertir(valor, defecto))
+
+
+def _convertir(valor: str, defecto):
+    if isinstance(defecto, bool):
+        return valor.strip().lower() in ("1", "true", "si", "yes")
+    if isinstance(defecto, list):
+        return [elemento.strip() for elemento in valor.split(",") if elemento.strip()]
+    return type(defecto)(valor)
+
 
 @lru_cache
 def obtener_configuracion() -> Configuracion:
@@ -0,0 +1,141 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.configuracion import obtener_configuracion
+
+try:
+    import brotli
+except ImportError:  # dependencia opcional: sin ella solo se ofrece gzip
+    brotli = None
+
+# Tipos que vale la pena comprimir; text/event-stream queda fuera a proposito
+TIPOS_COMPRIMIBLES = ("application/json", "application/x-ndjson", "text/plain")
+
+
+def elegir_codificacion(aceptadas: str) -> Optional[str]:
+    """Codificacion a usar segun Accept-Encoding: 'br' (si brotli esta instalado), 'gzip' o None.
+
+    Respeta los valores q (`gzip;q=0` la excluye) y el comodin `*`.
+    """
+    calidades: dict[str, float] = {}
+    for parte in aceptadas.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        calidad = 1.0
+        parametros = parametros.strip().replace(" ", "")
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[nombre] = calidad
+
+    comodin = calidades.get("*", 0.0)
+    candidatas = ("br", "gzip") if brotli is not None else ("gzip",)
+    for codificacion in candidatas:
+        if calidades.get(codificacion, comodin) > 0:
+            return codificacion
+    return None
+
+
+class _Compresor:
+    """Compresion incremental: cada bloque sale completo (flush) para no retener datos del stream."""
+
+    def __init__(self, codificacion: str):
+        config = obtener_configuracion()
+        self._brotli = codificacion == "br"
+        if self._brotli:
+            self._objeto = brotli.Compressor(quality=config.COMPRESION_CALIDAD_BROTLI)
+        else:
+            # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+            self._objeto = zlib.compressobj(config.COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos: bytes, final: bool) -> bytes:
+        if self._brotli:
+            salida = self._objeto.process(datos)
+            return salida + (self._objeto.finish() if final else self._objeto.flush())
+        salida = self._objeto.compress(datos)
+        return salida + self._objeto.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class MiddlewareCompresion:
+    """Comprime respuestas JSON/NDJSON con gzip o brotli segun lo que acepte el cliente.
+
+    Las respuestas de un solo bloque se comprimen si superan
+    COMPRESION_TAMANO_MINIMO_BYTES; las de streaming (exportacion NDJSON) se
+    comprimen bloque a bloque. Las 304 y las que ya traen Content-Encoding pasan sin
+    cambios.
+    """
+
+    def __init__(self, app: ASGIApp, tamano_minimo: int | None = None):
+        self.app = app
+        self._tamano_minimo = (
+            tamano_minimo if tamano_minimo is not None else obtener_configuracion().COMPRESION_TAMANO_MINIMO_BYTES
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio: Message | None = None
+        compresor: _Compresor | None = None
+
+        async def _enviar(mensaje: Message) -> None:
+            nonlocal inicio, compresor
+            if mensaje["type"] == "http.response.start":
+                # Se retiene hasta ver el primer bloque del cuerpo
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if inicio is not None:
+                inicial, inicio = inicio, None
+                if not self._comprimible(inicial, cuerpo, mas):
+                    await send(inicial)
+                    await send(mensaje)
+                    return
+                compresor = _Compresor(codificacion)
+                comprimido = compresor.comprimir(cuerpo, final=not mas)
+                cabeceras = MutableHeaders(raw=list(inicial["headers"]))
+                cabeceras["Content-Encoding"] = codificacion
+                cabeceras.add_vary_header("Accept-Encoding")
+                if mas:
+                    del cabeceras["Content-Length"]
+                else:
+                    cabeceras["Content-Length"] = str(len(comprimido))
+                inicial["headers"] = cabeceras.raw
+                await send(inicial)
+                await send({"type": "http.response.body", "body": comprimido, "more_body": mas})
+                return
+
+            if compresor is None:
+                await send(mensaje)
+                return
+            comprimido = compresor.comprimir(cuerpo, final=not mas)
+            await send({"type": "http.response.body", "body": comprimido, "more_body": mas})
+
+        await self.app(scope, receive, _enviar)
+
+    def _comprimible(self, inicio: Message, cuerpo: bytes, mas: bool) -> bool:
+        if inicio["status"] in (204, 304):
+            return False
+        cabeceras = Headers(raw=inicio["headers"])
+        if "content-encoding" in cabeceras:
+            return False
+        if not cabeceras.get("content-type", "").startswith(TIPOS_COMPRIMIBLES):
+            return False
+        return mas or len(cuerpo) >= self._tamano_minimo
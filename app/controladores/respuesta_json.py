@@ -0,0 +1,18 @@
+from typing import Any
+
+from pydantic_core import to_json
+from starlette.responses import Response
+
+
+class RespuestaJSONRapida(Response):
+    """Respuesta JSON serializada en una sola pasada por pydantic-core.
+
+    Acepta dicts, listas y modelos Pydantic anidados. Al devolver esta respuesta
+    directamente, FastAPI no vuelve a validar el contenido contra `response_model`
+    (que queda solo para la documentacion OpenAPI).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
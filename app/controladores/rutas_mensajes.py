@@ -1,12 +1,23 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Optional
+import hashlib
 
-from app.esquemas.esquema_mensaje import MensajeEntrada
-from app.esquemas.esquema_respuesta import RespuestaExitosa, RespuestaError, RespuestaListaMensajes
-from app.servicios.servicio_mensajes import ServicioMensajes
+from fastapi import APIRouter, Body, Depends, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, Optional
+
+from app.configuracion import obtener_configuracion
+from app.controladores.respuesta_json import RespuestaJSONRapida
+from app.esquemas.esquema_mensaje import MensajeEntrada, timestamp_a_epoch_us
+from app.esquemas.esquema_respuesta import (
+    RespuestaError,
+    RespuestaExitosa,
+    RespuestaListaMensajes,
+    RespuestaLote,
+)
+from app.excepciones.excepciones_api import ErrorFormatoInvalido
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
 from app.dependencias import obtener_servicio_mensajes
 
-enrutador = APIRouter(prefix="/api", tags=["mensajes"])
+enrutador = APIRouter(prefix="/api", tags=["mensajes"], default_response_class=RespuestaJSONRapida)
 
 
 @enrutador.post(
@@ -14,41 +25,219 @@ enrutador = APIRouter(prefix="/api", tags=["mensajes"])
     response_model=RespuestaExitosa,
     status_code=201,
     responses={
+        200: {"model": RespuestaExitosa, "description": "Reintento en modo idempotente: mensaje ya guardado"},
         400: {"model": RespuestaError},
         409: {"model": RespuestaError},
         422: {"model": RespuestaError},
     },
 )
-def crear_mensaje(
+async def crear_mensaje(
     mensaje: MensajeEntrada,
-    servicio: ServicioMensajes = Depends(obtener_servicio_mensajes),
-) -> dict:
-    """Recibe, valida, procesa y almacena un mensaje de chat."""
-    mensaje_procesado = servicio.crear_mensaje(mensaje)
-    return {"status": "success", "data": mensaje_procesado.model_dump()}
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> RespuestaJSONRapida:
+    """Recibe, valida, procesa y almacena un mensaje de chat.
+
+    En modo idempotente, repetir un mensaje ya guardado responde 200 con el original.
+    """
+    mensaje_procesado, creado = await servicio.registrar_mensaje(mensaje)
+    return RespuestaJSONRapida(
+        {"status": "success", "data": mensaje_procesado.respuesta()}, status_code=201 if creado else 200
+    )
+
+
+@enrutador.post(
+    "/messages/batch",
+    response_model=RespuestaLote,
+    responses={400: {"model": RespuestaError}},
+)
+async def crear_mensajes_lote(
+    mensajes: list[Any] = Body(...),
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> RespuestaJSONRapida:
+    """Recibe un lote de mensajes y los guarda en una sola transaccion.
+
+    Cada mensaje se valida por separado; el resultado indica por elemento si se
+    creo (201), si era duplicado (409, o 200 con el original en modo idempotente) o
+    si fue invalido (400/422).
+    """
+    config = obtener_configuracion()
+    maximo = config.TAMANO_MAXIMO_LOTE
+    if not mensajes:
+        raise ErrorFormatoInvalido("El lote debe contener al menos un mensaje")
+    if len(mensajes) > maximo:
+        raise ErrorFormatoInvalido(f"El lote admite como maximo {maximo} mensajes")
+
+    resultados = await servicio.crear_mensajes_lote(mensajes)
+    creados = sum(1 for resultado in resultados if resultado["http_status"] == 201)
+    fallidos = sum(1 for resultado in resultados if resultado["status"] == "error")
+    resumen = {"total": len(resultados), "created": creados, "failed": fallidos}
+    if config.MODO_IDEMPOTENTE:
+        resumen["existing"] = len(resultados) - creados - fallidos
+    return RespuestaJSONRapida({"status": "success", "data": resultados, "summary": resumen})
+
+
+# Declarada antes de /messages/{session_id}; si no, "search" se tomaria como session_id
+@enrutador.get(
+    "/messages/search",
+    response_model=RespuestaListaMensajes,
+    responses={400: {"model": RespuestaError}},
+)
+async def buscar_mensajes(
+    q: str = Query(min_length=1, max_length=500),
+    session_id: Optional[str] = Query(default=None),
+    sender: Optional[str] = Query(default=None, pattern="^(user|system)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None),
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> RespuestaJSONRapida:
+    """Busca mensajes por contenido (texto completo), ordenados por relevancia.
+
+    Todas las palabras de `q` deben aparecer (sin distinguir mayusculas ni tildes);
+    `palabra*` busca por prefijo. Cada resultado trae `score` y `snippet`. Para la
+    pagina siguiente se pasa `pagination.next_cursor` como `cursor`.
+    """
+    resultados, siguiente_cursor = await servicio.buscar_mensajes(
+        q, session_id=session_id, remitente=sender, limite=limit, cursor=cursor
+    )
+    return RespuestaJSONRapida({
+        "status": "success",
+        "data": resultados,
+        "pagination": {"limit": limit, "next_cursor": siguiente_cursor},
+    })
 
 
 @enrutador.get(
     "/messages/{session_id}",
     response_model=RespuestaListaMensajes,
-    responses={404: {"model": RespuestaError}},
+    responses={304: {"description": "La sesion no cambio desde el ETag enviado en If-None-Match"}, 404: {"model": RespuestaError}},
 )
-def obtener_mensajes(
+async def obtener_mensajes(
     session_id: str,
     limit: int = Query(default=50, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
     sender: Optional[str] = Query(default=None, pattern="^(user|system)$"),
-    servicio: ServicioMensajes = Depends(obtener_servicio_mensajes),
-) -> dict:
-    """Recupera mensajes de una sesion con paginacion y filtrado."""
-    mensajes, total = servicio.obtener_mensajes_sesion(
+    cursor: Optional[str] = Query(default=None),
+    include_total: bool = Query(default=False),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> Response:
+    """Recupera mensajes de una sesion con paginacion y filtrado.
+
+    `cursor` (tomado de `pagination.next_cursor`) tiene prioridad sobre `offset` y
+    mantiene el mismo costo sin importar la profundidad de la pagina. `since`
+    (inclusivo) y `until` (exclusivo) acotan por timestamp ISO 8601. `include_total`
+    agrega `pagination.total` y `pagination.total_exact` (False si es una estimacion).
+
+    El ETag combina la version de la sesion, que sube con cada escritura, con los
+    parametros de la pagina: si coincide con `If-None-Match` se responde 304 sin
+    consultar la pagina.
+    """
+    desde_us = _epoch_us_parametro("since", since)
+    hasta_us = _epoch_us_parametro("until", until)
+    # La version se lee antes que la pagina: si entre medio llega una escritura, la
+    # pagina queda con un ETag viejo y el siguiente pedido la vuelve a descargar.
+    version = await servicio.obtener_version_sesion(session_id)
+    etag = (
+        _etag_pagina(version, limit, offset, cursor, sender, desde_us, hasta_us, include_total)
+        if version is not None
+        else None
+    )
+    if etag is not None and _coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    mensajes, total, siguiente_cursor, total_exacto = await servicio.obtener_mensajes_sesion(
         session_id=session_id,
         limite=limit,
         desplazamiento=offset,
         remitente=sender,
+        cursor=cursor,
+        incluir_total=include_total,
+        desde_us=desde_us,
+        hasta_us=hasta_us,
+        version=version,
     )
-    return {
+    paginacion = {"limit": limit, "offset": offset, "next_cursor": siguiente_cursor}
+    if include_total:
+        paginacion["total"] = total
+        paginacion["total_exact"] = total_exacto
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"} if etag is not None else None
+    return RespuestaJSONRapida({
         "status": "success",
         "data": mensajes,
-        "pagination": {"total": total, "limit": limit, "offset": offset},
-    }
+        "pagination": paginacion,
+    }, headers=cabeceras)
+
+
+@enrutador.get(
+    "/messages/{session_id}/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        400: {"model": RespuestaError},
+        404: {"model": RespuestaError},
+    },
+)
+async def exportar_mensajes(
+    session_id: str,
+    sender: Optional[str] = Query(default=None, pattern="^(user|system)$"),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> StreamingResponse:
+    """Exporta todos los mensajes de una sesion como NDJSON, en streaming.
+
+    `since` (inclusivo) y `until` (exclusivo) filtran por timestamp ISO 8601.
+    """
+    bloques = await servicio.exportar_mensajes(
+        session_id,
+        remitente=sender,
+        desde_us=_epoch_us_parametro("since", since),
+        hasta_us=_epoch_us_parametro("until", until),
+    )
+    return StreamingResponse(bloques, media_type="application/x-ndjson")
+
+
+def _epoch_us_parametro(nombre: str, valor: Optional[str]) -> Optional[int]:
+    """Convierte un parametro de consulta ISO 8601 a microsegundos UTC."""
+    if valor is None:
+        return None
+    try:
+        return timestamp_a_epoch_us(valor)
+    except ValueError as exc:
+        raise ErrorFormatoInvalido(f"Parametro '{nombre}': {exc}")
+
+
+def _etag_pagina(
+    version: int,
+    limite: int,
+    desplazamiento: int,
+    cursor: Optional[str],
+    remitente: Optional[str],
+    desde_us: Optional[int],
+    hasta_us: Optional[int],
+    incluir_total: bool,
+) -> str:
+    """ETag debil `W/"<version>-<hash de los parametros>"`: cada pagina y filtro tiene el suyo.
+
+    Los parametros se normalizan antes del hash: since/until en microsegundos y el
+    offset se ignora si hay cursor, porque el cursor tiene prioridad.
+    """
+    if cursor is not None:
+        desplazamiento = 0
+    parametros = "|".join(
+        str(valor) for valor in (limite, desplazamiento, cursor or "", remitente or "", desde_us, hasta_us, int(incluir_total))
+    )
+    resumen = hashlib.blake2b(parametros.encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{version}-{resumen}"'
+
+
+def _coincide_etag(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparacion debil de If-None-Match (ignora el prefijo W/), con soporte de `*`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    valor = etag.removeprefix("W/")
+    return any(candidato.strip().removeprefix("W/") == valor for candidato in if_none_match.split(","))
@@ -0,0 +1,61 @@
+import time
+
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metricas import obtener_registro_metricas
+
+enrutador_metricas = APIRouter(tags=["metricas"])
+
+
+@enrutador_metricas.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def exportar_metricas() -> PlainTextResponse:
+    """Metricas del proceso en formato de texto de Prometheus."""
+    return PlainTextResponse(
+        obtener_registro_metricas().exportar_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+class MiddlewareMetricas:
+    """Cuenta respuestas por codigo de estado y mide la latencia por ruta.
+
+    La ruta se etiqueta con su plantilla (`/api/messages/{session_id}`) y no con la
+    URL real, para no crear una serie por cada sesion.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        codigo = 500
+
+        async def _enviar(mensaje: Message) -> None:
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, _enviar)
+        finally:
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path_format", None) or "sin_ruta"
+            metricas = obtener_registro_metricas()
+            metricas.incrementar(
+                "http_respuestas_total", metodo=scope["method"], ruta=plantilla, codigo=str(codigo)
+            )
+            metricas.observar(
+                "http_solicitud_duracion_segundos", time.perf_counter() - inicio, metodo=scope["method"], ruta=plantilla
+            )
+
+
+def registrar_metricas(aplicacion: FastAPI):
+    aplicacion.add_middleware(MiddlewareMetricas)
+    aplicacion.include_router(enrutador_metricas)
@@ -0,0 +1,79 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.configuracion import obtener_configuracion
+from app.controladores.respuesta_json import RespuestaJSONRapida
+from app.esquemas.esquema_respuesta import RespuestaError, RespuestaEstadisticasSesion
+from app.servicios.cursor_paginacion import decodificar_cursor
+from app.servicios.flujo_sesion import eventos_sesion
+from app.servicios.publicador_mensajes import PublicadorMensajes, Suscripcion
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+from app.dependencias import obtener_servicio_mensajes
+
+enrutador = APIRouter(prefix="/api", tags=["sesiones"], default_response_class=RespuestaJSONRapida)
+
+
+@enrutador.get(
+    "/sessions/{session_id}/stats",
+    response_model=RespuestaEstadisticasSesion,
+    responses={404: {"model": RespuestaError}},
+)
+async def obtener_estadisticas_sesion(
+    session_id: str,
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> RespuestaJSONRapida:
+    """Totales de una sesion: mensajes por remitente, palabras, caracteres y primer/ultimo timestamp."""
+    estadisticas = await servicio.obtener_estadisticas_sesion(session_id)
+    return RespuestaJSONRapida({"status": "success", "data": estadisticas})
+
+
+@enrutador.get(
+    "/sessions/{session_id}/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}, 400: {"model": RespuestaError}},
+)
+async def seguir_sesion(
+    request: Request,
+    session_id: str,
+    cursor: Optional[str] = Query(default=None),
+    last_event_id: Optional[str] = Header(default=None),
+    servicio: ServicioMensajesAsincrono = Depends(obtener_servicio_mensajes),
+) -> StreamingResponse:
+    """Envia por Server-Sent Events cada mensaje nuevo de la sesion apenas se guarda.
+
+    Con `cursor` (o el encabezado `Last-Event-ID` que manda el navegador al
+    reconectarse) primero se envian los mensajes guardados despues de esa posicion.
+    Sin cursor se empieza desde el ultimo mensaje actual. La sesion puede no existir
+    todavia.
+    """
+    desde = last_event_id or cursor
+    if desde:
+        decodificar_cursor(desde)
+
+    publicador: PublicadorMensajes = request.app.state.publicador
+    # Suscribirse antes de leer la posicion final: lo que llegue entre medio no se pierde
+    suscripcion = publicador.suscribir(session_id)
+    try:
+        if not desde:
+            desde = await servicio.obtener_cursor_final(session_id)
+    except BaseException:
+        publicador.cancelar(suscripcion)
+        raise
+
+    latido = obtener_configuracion().LATIDO_STREAM_SEGUNDOS
+    return StreamingResponse(
+        _eventos_y_cancelar(publicador, suscripcion, eventos_sesion(servicio, publicador, suscripcion, desde, latido)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _eventos_y_cancelar(publicador: PublicadorMensajes, suscripcion: Suscripcion, eventos):
+    """Cancela la suscripcion cuando el stream termina o el cliente se desconecta."""
+    try:
+        async for evento in eventos:
+            yield evento
+    finally:
+        publicador.cancelar(suscripcion)
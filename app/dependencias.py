@@ -1,10 +1,120 @@
-from app.repositorios.base_datos import obtener_conexion
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterator, Sequence
+
+from fastapi import Request
+
+from app.repositorios.directorio_ids import DirectorioIds
+from app.repositorios.escritor_agrupado import EscritorAgrupado
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_fragmentado import RepositorioMensajesFragmentado
 from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from app.repositorios.repositorio_postgres import RepositorioMensajesPostgres, conexion_postgres
+from app.configuracion import obtener_configuracion
+from app.servicios.cache_paginas import CachePaginas
+from app.servicios.ids_recientes import IdsRecientes
+from app.servicios.publicador_mensajes import PublicadorMensajes
 from app.servicios.servicio_mensajes import ServicioMensajes
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+
+
+def obtener_pools_conexiones(request: Request) -> list[PoolConexiones]:
+    """Pools creados en el ciclo de vida de la aplicacion, uno por fragmento."""
+    return request.app.state.pools_conexiones
+
+
+@contextmanager
+def servicio_desde_pool(
+    pool: PoolConexiones,
+    escritor: EscritorAgrupado | None = None,
+    cache: CachePaginas | None = None,
+    ids_recientes: IdsRecientes | None = None,
+    publicador: PublicadorMensajes | None = None,
+) -> Iterator[ServicioMensajes]:
+    """Toma una conexion del pool para una operacion y siempre la devuelve al final."""
+    conexion = pool.obtener()
+    try:
+        repositorio = RepositorioMensajes(conexion, escritor=escritor)
+        yield ServicioMensajes(
+            repositorio=repositorio,
+            cache=cache,
+            ids_recientes=ids_recientes,
+            idempotente=obtener_configuracion().MODO_IDEMPOTENTE,
+            publicador=publicador,
+            maximo_conteo_exacto=obtener_configuracion().MAXIMO_CONTEO_EXACTO,
+        )
+    finally:
+        pool.devolver(conexion)
+
+
+@contextmanager
+def servicio_fragmentado(
+    pools: Sequence[PoolConexiones],
+    escritores: Sequence[EscritorAgrupado] = (),
+    cache: CachePaginas | None = None,
+    ids_recientes: IdsRecientes | None = None,
+    publicador: PublicadorMensajes | None = None,
+    directorio: DirectorioIds | None = None,
+) -> Iterator[ServicioMensajes]:
+    """Servicio sobre todos los fragmentos; cada operacion toma la conexion de su fragmento."""
+    yield ServicioMensajes(
+        repositorio=RepositorioMensajesFragmentado(pools, escritores, directorio),
+        cache=cache,
+        ids_recientes=ids_recientes,
+        idempotente=obtener_configuracion().MODO_IDEMPOTENTE,
+        publicador=publicador,
+        maximo_conteo_exacto=obtener_configuracion().MAXIMO_CONTEO_EXACTO,
+    )
+
+
+@contextmanager
+def servicio_postgres(
+    pool,
+    cache: CachePaginas | None = None,
+    ids_recientes: IdsRecientes | None = None,
+    publicador: PublicadorMensajes | None = None,
+) -> Iterator[ServicioMensajes]:
+    """Servicio sobre PostgreSQL con una conexion del pool durante la operacion."""
+    with conexion_postgres(pool) as conexion:
+        yield ServicioMensajes(
+            repositorio=RepositorioMensajesPostgres(conexion),
+            cache=cache,
+            ids_recientes=ids_recientes,
+            idempotente=obtener_configuracion().MODO_IDEMPOTENTE,
+            publicador=publicador,
+            maximo_conteo_exacto=obtener_configuracion().MAXIMO_CONTEO_EXACTO,
+        )
 
 
-def obtener_servicio_mensajes() -> ServicioMensajes:
+async def obtener_servicio_mensajes(request: Request) -> ServicioMensajesAsincrono:
     """Proveedor de dependencias para el servicio de mensajes."""
-    conexion = obtener_conexion()
-    repositorio = RepositorioMensajes(conexion)
-    return ServicioMensajes(repositorio=repositorio)
+    estado = request.app.state
+    if estado.pool_postgres is not None:
+        proveedor = partial(
+            servicio_postgres,
+            estado.pool_postgres,
+            estado.cache_paginas,
+            estado.ids_recientes,
+            estado.publicador,
+        )
+    elif len(estado.pools_conexiones) == 1:
+        escritor = estado.escritores[0] if estado.escritores else None
+        proveedor = partial(
+            servicio_desde_pool,
+            estado.pools_conexiones[0],
+            escritor,
+            estado.cache_paginas,
+            estado.ids_recientes,
+            estado.publicador,
+        )
+    else:
+        proveedor = partial(
+            servicio_fragmentado,
+            estado.pools_conexiones,
+            estado.escritores,
+            estado.cache_paginas,
+            estado.ids_recientes,
+            estado.publicador,
+            estado.directorio_ids,
+        )
+    return ServicioMensajesAsincrono(proveedor, ejecutor=estado.ejecutor_bd)
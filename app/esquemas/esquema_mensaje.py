@@ -1,6 +1,39 @@
-from pydantic import BaseModel, Field, field_validator
-from datetime import datetime
-from typing import Literal
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Literal, Optional
+
+from app.metricas import obtener_registro_metricas
+
+
+def interpretar_timestamp(valor: str) -> datetime:
+    """Interpreta un timestamp ISO 8601 (acepta sufijo Z). Lanza ValueError si no es valido."""
+    try:
+        return datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        raise ValueError("El timestamp debe tener formato ISO 8601 valido")
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp_a_epoch_us(valor: str) -> int:
+    """Normaliza un timestamp ISO 8601 a microsegundos desde epoch (UTC).
+
+    Los timestamps sin zona horaria se interpretan como UTC. Asi `Z`, `+00:00`, otros
+    offsets y fracciones de segundo quedan en una misma escala ordenable.
+    """
+    instante = interpretar_timestamp(valor)
+    if instante.tzinfo is None:
+        instante = instante.replace(tzinfo=timezone.utc)
+    delta = instante - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+# Ultimo timestamp validado en este contexto y su epoch, para que MensajeEntrada no lo
+# vuelva a interpretar despues de validarlo
+_TIMESTAMP_VALIDADO: ContextVar[Optional[tuple[str, int]]] = ContextVar("timestamp_validado", default=None)
 
 
 class MensajeEntrada(BaseModel):
@@ -12,15 +45,29 @@ class MensajeEntrada(BaseModel):
     timestamp: str = Field(...)
     sender: Literal["user", "system"] = Field(...)
 
+    _timestamp_us: Optional[int] = PrivateAttr(default=None)
+
     @field_validator("timestamp")
     @classmethod
     def validar_timestamp(cls, valor: str) -> str:
-        try:
-            datetime.fromisoformat(valor.replace("Z", "+00:00"))
-        except (ValueError, AttributeError):
-            raise ValueError("El timestamp debe tener formato ISO 8601 valido")
+        with obtener_registro_metricas().medir("mensajes_etapa_duracion_segundos", etapa="validacion_timestamp"):
+            # Valida que el timestamp sea ISO 8601 y normalizable a epoch UTC
+            _TIMESTAMP_VALIDADO.set((valor, timestamp_a_epoch_us(valor)))
         return valor
 
+    def model_post_init(self, __context: Any) -> None:
+        # Toma el epoch que calculo validar_timestamp para este mismo valor
+        validado = _TIMESTAMP_VALIDADO.get()
+        if validado is not None and validado[0] is self.timestamp:
+            self._timestamp_us = validado[1]
+
+    @property
+    def timestamp_us(self) -> int:
+        """Timestamp normalizado (microsegundos desde epoch, UTC); se guarda indexado."""
+        if self._timestamp_us is None:
+            self._timestamp_us = timestamp_a_epoch_us(self.timestamp)
+        return self._timestamp_us
+
 
 class MetadatosMensaje(BaseModel):
     """Metadatos generados durante el procesamiento."""
@@ -31,7 +78,7 @@ class MetadatosMensaje(BaseModel):
 
 
 class MensajeProcesado(BaseModel):
-    """Mensaje con metadatos despues del procesamiento."""
+    """Mensaje con metadatos despues del procesamiento (formato de respuesta de la API)."""
 
     message_id: str
     session_id: str
@@ -39,3 +86,66 @@ class MensajeProcesado(BaseModel):
     timestamp: str
     sender: str
     metadata: MetadatosMensaje
+
+
+@dataclass(slots=True)
+class MensajeRegistro:
+    """Mensaje procesado como se guarda: los campos de una fila de `mensajes`.
+
+    Es la representacion interna desde el procesador hasta el INSERT. No valida nada
+    (eso ya lo hizo MensajeEntrada) y se convierte al formato de la API recien al
+    responder, con `respuesta()`.
+    """
+
+    message_id: str
+    session_id: str
+    content: str
+    timestamp: str
+    timestamp_us: int
+    sender: str
+    word_count: int
+    character_count: int
+    processed_at: str
+
+    @classmethod
+    def desde_fila(cls, fila: dict) -> "MensajeRegistro":
+        return cls(
+            fila["message_id"],
+            fila["session_id"],
+            fila["content"],
+            fila["timestamp"],
+            fila["timestamp_us"],
+            fila["sender"],
+            fila["word_count"],
+            fila["character_count"],
+            fila["processed_at"],
+        )
+
+    def fila(self) -> dict:
+        """Columnas para CONSULTA_INSERTAR."""
+        return {
+            "message_id": self.message_id,
+            "session_id": self.session_id,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "timestamp_us": self.timestamp_us,
+            "sender": self.sender,
+            "word_count": self.word_count,
+            "character_count": self.character_count,
+            "processed_at": self.processed_at,
+        }
+
+    def respuesta(self) -> dict:
+        """Formato de MensajeProcesado (metadata anidada), listo para serializar."""
+        return {
+            "message_id": self.message_id,
+            "session_id": self.session_id,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "sender": self.sender,
+            "metadata": {
+                "word_count": self.word_count,
+                "character_count": self.character_count,
+                "processed_at": self.processed_at,
+            },
+        }
@@ -22,3 +22,24 @@ class RespuestaListaMensajes(BaseModel):
     status: str = "success"
     data: list[dict]
     pagination: dict
+
+
+class EstadisticasSesion(BaseModel):
+    session_id: str
+    message_count: int
+    sender_counts: dict[str, int]
+    total_words: int
+    total_characters: int
+    first_timestamp: str
+    last_timestamp: str
+
+
+class RespuestaEstadisticasSesion(BaseModel):
+    status: str = "success"
+    data: EstadisticasSesion
+
+
+class RespuestaLote(BaseModel):
+    status: str = "success"
+    data: list[dict]
+    summary: dict
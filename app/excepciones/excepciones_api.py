@@ -8,6 +8,9 @@ class ErrorAPI(Exception):
         self.codigo_http = codigo_http
         super().__init__(mensaje)
 
+    def como_dict(self) -> dict:
+        return {"code": self.codigo, "message": self.mensaje, "details": self.detalles}
+
 
 class ErrorFormatoInvalido(ErrorAPI):
     def __init__(self, detalles: str):
@@ -19,6 +22,28 @@ class ErrorFormatoInvalido(ErrorAPI):
         )
 
 
+class ErrorValidacion(ErrorAPI):
+    def __init__(self, detalles: str):
+        super().__init__(
+            codigo="VALIDATION_ERROR",
+            mensaje="Error de validacion en los datos enviados",
+            detalles=detalles,
+            codigo_http=400,
+        )
+
+    @classmethod
+    def desde_errores(cls, errores: list) -> "ErrorValidacion":
+        """Resume el primer error de una validacion de Pydantic."""
+        if errores:
+            primer_error = errores[0]
+            campo = " -> ".join(str(loc) for loc in primer_error.get("loc", []) if loc != "body")
+            detalle = primer_error.get("msg", "Error de validacion")
+        else:
+            campo = "desconocido"
+            detalle = "Error de validacion"
+        return cls(f"Campo '{campo}': {detalle}")
+
+
 class ErrorContenidoInapropiado(ErrorAPI):
     def __init__(self, detalles: str):
         super().__init__(
@@ -47,3 +72,23 @@ class ErrorMensajeDuplicado(ErrorAPI):
             detalles=f"Ya existe un mensaje con el id: {message_id}",
             codigo_http=409,
         )
+
+
+class ErrorCursorInvalido(ErrorAPI):
+    def __init__(self, cursor: str):
+        super().__init__(
+            codigo="INVALID_CURSOR",
+            mensaje="Cursor de paginacion invalido",
+            detalles=f"El cursor no es valido: {cursor}",
+            codigo_http=400,
+        )
+
+
+class ErrorServicioNoDisponible(ErrorAPI):
+    def __init__(self, detalles: str):
+        super().__init__(
+            codigo="SERVICE_UNAVAILABLE",
+            mensaje="Servicio temporalmente no disponible",
+            detalles=detalles,
+            codigo_http=503,
+        )
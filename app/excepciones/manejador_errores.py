@@ -2,48 +2,25 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
-from app.excepciones.excepciones_api import ErrorAPI
+from app.excepciones.excepciones_api import ErrorAPI, ErrorValidacion
+from app.metricas import obtener_registro_metricas
 
 
 async def manejar_error_api(request: Request, exc: ErrorAPI) -> JSONResponse:
+    obtener_registro_metricas().incrementar("api_errores_total", code=exc.codigo)
     return JSONResponse(
         status_code=exc.codigo_http,
-        content={
-            "status": "error",
-            "error": {
-                "code": exc.codigo,
-                "message": exc.mensaje,
-                "details": exc.detalles,
-            },
-        },
+        content={"status": "error", "error": exc.como_dict()},
     )
 
 
 async def manejar_error_validacion(request: Request, exc: RequestValidationError) -> JSONResponse:
     """Convierte errores de validacion de Pydantic al formato estandar."""
-    errores = exc.errors()
-    if errores:
-        primer_error = errores[0]
-        campo = " -> ".join(str(loc) for loc in primer_error.get("loc", []) if loc != "body")
-        detalle = primer_error.get("msg", "Error de validacion")
-    else:
-        campo = "desconocido"
-        detalle = "Error de validacion"
-
-    return JSONResponse(
-        status_code=400,
-        content={
-            "status": "error",
-            "error": {
-                "code": "VALIDATION_ERROR",
-                "message": "Error de validacion en los datos enviados",
-                "details": f"Campo '{campo}': {detalle}",
-            },
-        },
-    )
+    return await manejar_error_api(request, ErrorValidacion.desde_errores(exc.errors()))
 
 
 async def manejar_error_interno(request: Request, exc: Exception) -> JSONResponse:
+    obtener_registro_metricas().incrementar("api_errores_total", code="INTERNAL_ERROR")
     return JSONResponse(
         status_code=500,
         content={
@@ -0,0 +1,75 @@
+"""Aplica una vez la politica de retencion: archiva y borra los mensajes vencidos.
+
+Sirve para correrla desde cron en lugar del hilo de cada worker. Sin argumentos usa
+las bases y la politica de la configuracion (RETENCION_DIAS, MAXIMO_MENSAJES_POR_SESION)
+y, con ID_UNICO_ENTRE_FRAGMENTOS, libera del directorio de ids los mensajes borrados.
+
+Uso: python -m app.herramientas.aplicar_retencion [ruta.db ...] [--dias N] [--maximo-por-sesion N]
+     python -m app.herramientas.aplicar_retencion --activar-vacuum-incremental
+"""
+import argparse
+import os
+from functools import partial
+
+from app.configuracion import obtener_configuracion
+from app.repositorios.base_datos import activar_vacuum_incremental, inicializar_base_datos, obtener_conexion
+from app.repositorios.directorio_ids import DirectorioIds, ruta_directorio
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_fragmentado import rutas_fragmentos
+from app.repositorios.retencion import Retencion
+
+
+def main(argumentos: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rutas", nargs="*", help="Bases a recortar (por defecto, las de la configuracion)")
+    parser.add_argument("--dias", type=float, help="Borra los mensajes con mas de N dias")
+    parser.add_argument("--maximo-por-sesion", type=int, help="Deja a lo sumo N mensajes por sesion")
+    parser.add_argument("--directorio-archivo", help="Donde guardar los .ndjson.gz ('' = no archivar)")
+    parser.add_argument(
+        "--activar-vacuum-incremental",
+        action="store_true",
+        help="Convierte bases creadas sin auto_vacuum (VACUUM completo; bloquea la base mientras dura)",
+    )
+    args = parser.parse_args(argumentos)
+
+    config = obtener_configuracion()
+    rutas = args.rutas or rutas_fragmentos(config.RUTA_BASE_DATOS, config.FRAGMENTOS_BASE_DATOS)
+    # Solo con las bases de la configuracion se sabe a que fragmento corresponde cada ruta.
+    # Si el directorio aun no existe, la API lo llenara al crearlo con lo que quede.
+    ruta_ids = ruta_directorio(config.RUTA_BASE_DATOS)
+    usa_directorio = not args.rutas and len(rutas) > 1 and config.ID_UNICO_ENTRE_FRAGMENTOS
+    directorio = (
+        DirectorioIds(PoolConexiones(ruta_ids, tamano=1))
+        if usa_directorio and os.path.exists(ruta_ids) and not args.activar_vacuum_incremental
+        else None
+    )
+    try:
+        for indice, ruta in enumerate(rutas):
+            inicializar_base_datos(ruta)
+            if args.activar_vacuum_incremental:
+                conexion = obtener_conexion(ruta)
+                try:
+                    activar_vacuum_incremental(conexion)
+                finally:
+                    conexion.close()
+                print(f"{ruta}: auto_vacuum incremental activado")
+                continue
+            retencion = Retencion(
+                ruta,
+                dias=args.dias,
+                maximo_por_sesion=args.maximo_por_sesion,
+                directorio_archivo=args.directorio_archivo,
+                al_borrar_ids=partial(directorio.liberar, fragmento=indice) if directorio is not None else None,
+            )
+            resultado = retencion.ejecutar()
+            print(
+                f"{ruta}: {resultado['borrados']} mensajes borrados, "
+                f"{resultado['paginas_liberadas']} paginas liberadas"
+            )
+    finally:
+        if directorio is not None:
+            directorio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Divide una base de mensajes existente en N fragmentos por session_id.
+
+Crea mensajes.0.db ... mensajes.N-1.db junto a la base de origen (o a `--destino`),
+con el mismo reparto que usa la API con FRAGMENTOS_BASE_DATOS = N y, con `--directorio-ids`
+(para ID_UNICO_ENTRE_FRAGMENTOS), el directorio de ids mensajes.ids.db. La base de origen
+no se borra. Se puede volver a ejecutar: los mensajes ya copiados se omiten.
+
+Uso: python -m app.herramientas.fragmentar_base_datos mensajes.db --fragmentos 4 [--destino ruta.db] [--directorio-ids]
+"""
+import argparse
+import os
+
+from app.repositorios.base_datos import inicializar_base_datos, obtener_conexion, reconstruir_tabla_sesiones
+from app.repositorios.directorio_ids import inicializar_directorio, ruta_directorio
+from app.repositorios.repositorio_fragmentado import indice_fragmento, rutas_fragmentos
+
+CONSULTA_COPIAR = """
+    INSERT OR IGNORE INTO mensajes (message_id, session_id, content, timestamp, timestamp_us, sender,
+                                    word_count, character_count, processed_at)
+    VALUES (:message_id, :session_id, :content, :timestamp, :timestamp_us, :sender,
+            :word_count, :character_count, :processed_at)
+"""
+
+
+def fragmentar_base_datos(
+    origen: str,
+    total: int,
+    destino: str | None = None,
+    tamano_bloque: int = 5000,
+    directorio_ids: bool = False,
+) -> list[int]:
+    """Copia cada mensaje de `origen` a su fragmento. Retorna cuantos se copiaron a cada uno."""
+    if total < 2:
+        raise ValueError("Se necesitan al menos 2 fragmentos")
+    if not os.path.exists(origen):
+        raise FileNotFoundError(origen)
+
+    # Deja el origen con el esquema actual (p. ej. la columna timestamp_us)
+    inicializar_base_datos(origen)
+    rutas = rutas_fragmentos(destino or origen, total)
+    for ruta in rutas:
+        inicializar_base_datos(ruta)
+
+    fuente = obtener_conexion(origen)
+    fragmentos = [obtener_conexion(ruta) for ruta in rutas]
+    copiados = [0] * total
+    try:
+        cursor = fuente.execute("SELECT * FROM mensajes")
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            por_fragmento: dict[int, list[dict]] = {}
+            for fila in filas:
+                por_fragmento.setdefault(indice_fragmento(fila["session_id"], total), []).append(dict(fila))
+            for indice, bloque in por_fragmento.items():
+                with fragmentos[indice]:
+                    copiados[indice] += fragmentos[indice].executemany(CONSULTA_COPIAR, bloque).rowcount
+        # La copia directa no pasa por el repositorio: los agregados se calculan al final
+        for conexion in fragmentos:
+            reconstruir_tabla_sesiones(conexion)
+    finally:
+        fuente.close()
+        for conexion in fragmentos:
+            conexion.close()
+    if directorio_ids:
+        inicializar_directorio(ruta_directorio(destino or origen), rutas)
+    return copiados
+
+
+def main(argumentos: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("origen", help="Base SQLite a dividir, p. ej. mensajes.db")
+    parser.add_argument("--fragmentos", type=int, required=True)
+    parser.add_argument("--destino", default=None, help="Ruta base de los fragmentos (por defecto, la del origen)")
+    parser.add_argument("--directorio-ids", action="store_true", help="Registrar los ids en mensajes.ids.db")
+    args = parser.parse_args(argumentos)
+
+    copiados = fragmentar_base_datos(args.origen, args.fragmentos, args.destino, directorio_ids=args.directorio_ids)
+    for ruta, cantidad in zip(rutas_fragmentos(args.destino or args.origen, args.fragmentos), copiados):
+        print(f"{ruta}: {cantidad} mensajes copiados")
+    print(f"Total: {sum(copiados)}. Configure FRAGMENTOS_BASE_DATOS = {args.fragmentos} para usarlos.")
+
+
+if __name__ == "__main__":
+    main()
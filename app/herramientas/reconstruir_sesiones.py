@@ -0,0 +1,33 @@
+"""Recalcula la tabla de agregados `sesiones` a partir de los mensajes guardados.
+
+Util despues de cargar o borrar mensajes por fuera de la API. Sin argumentos usa las
+bases de la configuracion (todos los fragmentos).
+
+Uso: python -m app.herramientas.reconstruir_sesiones [ruta.db ...]
+"""
+import argparse
+
+from app.configuracion import obtener_configuracion
+from app.repositorios.base_datos import inicializar_base_datos, obtener_conexion, reconstruir_tabla_sesiones
+from app.repositorios.repositorio_fragmentado import rutas_fragmentos
+
+
+def main(argumentos: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rutas", nargs="*", help="Bases a reconstruir (por defecto, las de la configuracion)")
+    args = parser.parse_args(argumentos)
+
+    config = obtener_configuracion()
+    rutas = args.rutas or rutas_fragmentos(config.RUTA_BASE_DATOS, config.FRAGMENTOS_BASE_DATOS)
+    for ruta in rutas:
+        inicializar_base_datos(ruta)
+        conexion = obtener_conexion(ruta)
+        try:
+            sesiones = reconstruir_tabla_sesiones(conexion)
+        finally:
+            conexion.close()
+        print(f"{ruta}: {sesiones} sesiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Lanzador de produccion: prepara el esquema una vez y levanta N workers de uvicorn.
+
+Cada worker es un proceso nuevo con su propio pool, ejecutor y cache; la configuracion
+les llega por variables de entorno `MENSAJES_*` (ver `Configuracion`).
+
+Uso: python -m app.lanzador [--workers N] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import os
+
+import uvicorn
+
+from app.configuracion import PREFIJO_ENTORNO
+from app.principal import preparar_bases_datos
+
+
+def main(argumentos: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument(
+        "--solo-preparar",
+        action="store_true",
+        help="Solo crear/migrar el esquema (p. ej. antes de gunicorn) y salir",
+    )
+    args = parser.parse_args(argumentos)
+
+    rutas = preparar_bases_datos()
+    if args.solo_preparar:
+        print(f"Esquema listo en: {', '.join(rutas) or 'PostgreSQL'}")
+        return
+
+    # Los workers ya encuentran el esquema creado; asi no compiten por migrarlo al arrancar
+    os.environ[PREFIJO_ENTORNO + "PREPARAR_ESQUEMA_AL_INICIAR"] = "0"
+    uvicorn.run(
+        "app.principal:aplicacion",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
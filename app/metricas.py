@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Callable, Iterable, Iterator
+
+# Limites (en segundos) de los histogramas de latencia: de 50us a 5s
+LIMITES_LATENCIA = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+Etiquetas = tuple[tuple[str, str], ...]
+# Un recolector entrega (nombre, tipo, valor, etiquetas) leidos al momento de exportar
+Recolector = Callable[[], Iterable[tuple[str, str, float, dict]]]
+
+
+class Histograma:
+    """Histograma acumulativo con limites fijos, al estilo Prometheus."""
+
+    def __init__(self, limites: tuple[float, ...] = LIMITES_LATENCIA):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    """Contadores e histogramas del proceso, exportables en formato texto de Prometheus."""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._contadores: dict[str, dict[Etiquetas, float]] = {}
+        self._histogramas: dict[str, dict[Etiquetas, Histograma]] = {}
+        self._ayudas: dict[str, str] = {}
+        self._recolectores: dict[str, Recolector] = {}
+
+    def describir(self, nombre: str, ayuda: str) -> None:
+        self._ayudas[nombre] = ayuda
+
+    def incrementar(self, nombre: str, cantidad: float = 1, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._candado:
+            serie = self._contadores.setdefault(nombre, {})
+            serie[clave] = serie.get(clave, 0) + cantidad
+
+    def observar(self, nombre: str, valor: float, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._candado:
+            serie = self._histogramas.setdefault(nombre, {})
+            histograma = serie.get(clave)
+            if histograma is None:
+                histograma = serie[clave] = Histograma()
+            histograma.observar(valor)
+
+    @contextmanager
+    def medir(self, nombre: str, **etiquetas: str) -> Iterator[None]:
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def registrar_recolector(self, nombre: str, recolector: Recolector) -> None:
+        """Agrega (o reemplaza) una fuente de metricas que se lee al exportar."""
+        self._recolectores[nombre] = recolector
+
+    def exportar_prometheus(self) -> str:
+        lineas: list[str] = []
+        with self._candado:
+            for nombre, serie in sorted(self._contadores.items()):
+                self._encabezado(lineas, nombre, "counter")
+                for etiquetas, valor in sorted(serie.items()):
+                    lineas.append(f"{nombre}{_formatear(etiquetas)} {_numero(valor)}")
+            for nombre, serie in sorted(self._histogramas.items()):
+                self._encabezado(lineas, nombre, "histogram")
+                for etiquetas, histograma in sorted(serie.items(), key=lambda item: item[0]):
+                    acumulado = 0
+                    for limite, cuenta in zip(histograma.limites, histograma.cuentas):
+                        acumulado += cuenta
+                        le = _formatear(etiquetas + (("le", repr(limite)),))
+                        lineas.append(f"{nombre}_bucket{le} {acumulado}")
+                    le = _formatear(etiquetas + (("le", "+Inf"),))
+                    lineas.append(f"{nombre}_bucket{le} {histograma.total}")
+                    lineas.append(f"{nombre}_sum{_formatear(etiquetas)} {histograma.suma!r}")
+                    lineas.append(f"{nombre}_count{_formatear(etiquetas)} {histograma.total}")
+
+        vistos: set[str] = set()
+        for recolector in list(self._recolectores.values()):
+            for nombre, tipo, valor, etiquetas in recolector():
+                if nombre not in vistos:
+                    self._encabezado(lineas, nombre, tipo)
+                    vistos.add(nombre)
+                lineas.append(f"{nombre}{_formatear(tuple(sorted(etiquetas.items())))} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+    def _encabezado(self, lineas: list[str], nombre: str, tipo: str) -> None:
+        if nombre in self._ayudas:
+            lineas.append(f"# HELP {nombre} {self._ayudas[nombre]}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+
+
+def _formatear(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{clave}="{_escapar(str(valor))}"' for clave, valor in etiquetas) + "}"
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+@lru_cache
+def obtener_registro_metricas() -> RegistroMetricas:
+    registro = RegistroMetricas()
+    registro.describir("mensajes_etapa_duracion_segundos", "Duracion de cada etapa del procesamiento de mensajes")
+    registro.describir("repositorio_operacion_duracion_segundos", "Duracion de las operaciones del repositorio")
+    registro.describir("http_solicitud_duracion_segundos", "Duracion de las solicitudes HTTP por ruta")
+    registro.describir("http_respuestas_total", "Respuestas HTTP por metodo, ruta y codigo de estado")
+    registro.describir("api_errores_total", "Errores devueltos por los manejadores de errores, por codigo")
+    return registro
+
+
+def medir_operacion(operacion: str):
+    """Decorador que registra la duracion de una operacion del repositorio."""
+
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with obtener_registro_metricas().medir("repositorio_operacion_duracion_segundos", operacion=operacion):
+                return funcion(*args, **kwargs)
+
+        return envoltura
+
+    return decorador
@@ -1,18 +1,201 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI
 
 from app.configuracion import obtener_configuracion
+from app.controladores.compresion import MiddlewareCompresion
 from app.controladores.rutas_mensajes import enrutador
+from app.controladores.rutas_metricas import registrar_metricas
+from app.controladores.rutas_sesiones import enrutador as enrutador_sesiones
 from app.excepciones.manejador_errores import registrar_manejadores_errores
+from app.metricas import obtener_registro_metricas
 from app.repositorios.base_datos import inicializar_base_datos
+from app.repositorios.directorio_ids import DirectorioIds, inicializar_directorio, ruta_directorio
+from app.repositorios.escritor_agrupado import EscritorAgrupado
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_fragmentado import rutas_fragmentos
+from app.repositorios.repositorio_postgres import conexion_postgres, crear_pool_postgres, inicializar_postgres
+from app.repositorios.retencion import Retencion
+from app.servicios.cache_paginas import CachePaginas
+from app.servicios.diccionario_palabras import obtener_diccionario_palabras
+from app.servicios.ids_recientes import IdsRecientes
+from app.servicios.publicador_mensajes import PublicadorMensajes
+
+
+MOTORES_BASE_DATOS = ("sqlite", "postgres")
+
+
+def motor_base_datos() -> str:
+    """Motor configurado en MOTOR_BASE_DATOS; ValueError si no es uno conocido."""
+    motor = obtener_configuracion().MOTOR_BASE_DATOS
+    if motor not in MOTORES_BASE_DATOS:
+        raise ValueError(f"MOTOR_BASE_DATOS desconocido: {motor!r} (use {' o '.join(MOTORES_BASE_DATOS)})")
+    return motor
+
+
+def preparar_bases_datos(pool_postgres=None) -> list[str]:
+    """Crea o migra el esquema. Retorna las rutas de los fragmentos SQLite (ninguna con postgres)."""
+    config = obtener_configuracion()
+    if motor_base_datos() == "postgres":
+        pool = pool_postgres or crear_pool_postgres()
+        try:
+            with conexion_postgres(pool) as conexion:
+                inicializar_postgres(conexion)
+        finally:
+            if pool_postgres is None:
+                pool.close()
+        return []
+    rutas = rutas_fragmentos(config.RUTA_BASE_DATOS, config.FRAGMENTOS_BASE_DATOS)
+    for ruta in rutas:
+        inicializar_base_datos(ruta)
+    if usa_directorio_ids(rutas):
+        directorio = ruta_directorio(config.RUTA_BASE_DATOS)
+        # Un directorio nuevo se llena con los ids que ya tienen los fragmentos
+        inicializar_directorio(directorio, rutas if not os.path.exists(directorio) else ())
+    return rutas
+
+
+def usa_directorio_ids(rutas: list[str]) -> bool:
+    """Los fragmentos comparten un directorio de message_id solo con ID_UNICO_ENTRE_FRAGMENTOS."""
+    return len(rutas) > 1 and obtener_configuracion().ID_UNICO_ENTRE_FRAGMENTOS
 
 
 @asynccontextmanager
 async def ciclo_vida(app: FastAPI):
-    # Al iniciar: crear tablas si no existen
-    inicializar_base_datos()
-    yield
+    # Al iniciar: crear tablas si no existen y abrir un pool de conexiones por fragmento
+    # (o uno solo de PostgreSQL). Con varios workers el lanzador ya preparo el esquema.
+    config = obtener_configuracion()
+    postgres = motor_base_datos() == "postgres"
+    app.state.pool_postgres = crear_pool_postgres() if postgres else None
+    if config.PREPARAR_ESQUEMA_AL_INICIAR:
+        preparar_bases_datos(app.state.pool_postgres)
+    # Los fragmentos, el escritor agrupado y la retencion trabajan sobre archivos SQLite
+    rutas = [] if postgres else rutas_fragmentos(config.RUTA_BASE_DATOS, config.FRAGMENTOS_BASE_DATOS)
+    app.state.pools_conexiones = [PoolConexiones(ruta) for ruta in rutas]
+    app.state.directorio_ids = (
+        DirectorioIds(PoolConexiones(ruta_directorio(config.RUTA_BASE_DATOS))) if usa_directorio_ids(rutas) else None
+    )
+    app.state.ejecutor_bd = (
+        ThreadPoolExecutor(max_workers=config.HILOS_EJECUTOR_BD, thread_name_prefix="bd")
+        if config.HILOS_EJECUTOR_BD > 0
+        else None
+    )
+    app.state.escritores = [EscritorAgrupado(ruta) for ruta in rutas] if config.ESCRITURA_AGRUPADA else []
+    app.state.cache_paginas = CachePaginas() if config.CACHE_PAGINAS_HABILITADA else None
+    app.state.ids_recientes = IdsRecientes() if config.CAPACIDAD_IDS_RECIENTES > 0 else None
+    app.state.publicador = PublicadorMensajes()
+    app.state.diccionario = obtener_diccionario_palabras()
+    al_borrar = app.state.cache_paginas.invalidar_sesion if app.state.cache_paginas is not None else None
+    directorio = app.state.directorio_ids
+    app.state.retenciones = [
+        Retencion(
+            ruta,
+            al_borrar=al_borrar,
+            al_borrar_ids=partial(directorio.liberar, fragmento=indice) if directorio is not None else None,
+        )
+        for indice, ruta in enumerate(rutas)
+    ]
+    _registrar_recolectores(app)
+    for escritor in app.state.escritores:
+        escritor.iniciar()
+    app.state.diccionario.iniciar()
+    for retencion in app.state.retenciones:
+        retencion.iniciar()
+    try:
+        yield
+    finally:
+        for retencion in app.state.retenciones:
+            retencion.detener()
+        app.state.diccionario.detener()
+        for escritor in app.state.escritores:
+            escritor.detener()
+        if app.state.ejecutor_bd is not None:
+            app.state.ejecutor_bd.shutdown(wait=True)
+        for pool in app.state.pools_conexiones:
+            pool.cerrar()
+        if app.state.directorio_ids is not None:
+            app.state.directorio_ids.cerrar()
+        if app.state.pool_postgres is not None:
+            app.state.pool_postgres.close()
+
+
+def _registrar_recolectores(app: FastAPI) -> None:
+    """Expone en /metrics el estado de los componentes creados en el ciclo de vida."""
+    registro = obtener_registro_metricas()
+    estado = app.state
+
+    def _pool():
+        for indice, pool in enumerate(estado.pools_conexiones):
+            yield "pool_conexiones_creadas", "gauge", pool.conexiones_creadas, {"fragmento": str(indice)}
+
+    registro.registrar_recolector("pool_conexiones", _pool)
+
+    if estado.pool_postgres is not None:
+        def _pool_postgres():
+            estadisticas = estado.pool_postgres.get_stats()
+            yield "pool_postgres_conexiones", "gauge", estadisticas.get("pool_size", 0), {}
+            yield "pool_postgres_disponibles", "gauge", estadisticas.get("pool_available", 0), {}
+            yield "pool_postgres_solicitudes_en_espera", "gauge", estadisticas.get("requests_waiting", 0), {}
+
+        registro.registrar_recolector("pool_postgres", _pool_postgres)
+
+    if estado.cache_paginas is not None:
+        def _cache():
+            for clave, valor in estado.cache_paginas.estadisticas().items():
+                tipo = "gauge" if clave in ("entries", "bytes") else "counter"
+                yield f"cache_paginas_{clave}", tipo, valor, {}
+
+        registro.registrar_recolector("cache_paginas", _cache)
+
+    if estado.ids_recientes is not None:
+        def _ids_recientes():
+            yield "ids_recientes_aciertos_total", "counter", estado.ids_recientes.aciertos, {}
+            yield "ids_recientes_fallos_total", "counter", estado.ids_recientes.fallos, {}
+            yield "ids_recientes_entradas", "gauge", len(estado.ids_recientes), {}
+
+        registro.registrar_recolector("ids_recientes", _ids_recientes)
+
+    def _publicador():
+        yield "stream_suscriptores", "gauge", estado.publicador.suscriptores, {}
+        yield "stream_mensajes_publicados_total", "counter", estado.publicador.publicados, {}
+        yield "stream_desbordes_total", "counter", estado.publicador.desbordes, {}
+
+    registro.registrar_recolector("publicador", _publicador)
+
+    def _diccionario():
+        diccionario = estado.diccionario
+        actual = diccionario.actual
+        yield "filtro_diccionario_info", "gauge", 1, {"version": actual.version}
+        yield "filtro_diccionario_palabras", "gauge", actual.palabras, {}
+        yield "filtro_diccionario_recargas_total", "counter", diccionario.recargas, {}
+        yield "filtro_diccionario_recargas_fallidas_total", "counter", diccionario.recargas_fallidas, {}
+        for palabra, cantidad in sorted(diccionario.coincidencias().items()):
+            yield "filtro_coincidencias_total", "counter", cantidad, {"palabra": palabra}
+
+    registro.registrar_recolector("diccionario_palabras", _diccionario)
+
+    if any(retencion.activa for retencion in estado.retenciones):
+        def _retencion():
+            for indice, retencion in enumerate(estado.retenciones):
+                etiquetas = {"fragmento": str(indice)}
+                yield "retencion_ejecuciones_total", "counter", retencion.ejecuciones, etiquetas
+                yield "retencion_mensajes_borrados_total", "counter", retencion.mensajes_borrados, etiquetas
+                yield "retencion_paginas_liberadas_total", "counter", retencion.paginas_liberadas, etiquetas
+                yield "retencion_errores_total", "counter", retencion.errores, etiquetas
+
+        registro.registrar_recolector("retencion", _retencion)
+
+    if estado.escritores:
+        def _escritor():
+            for indice, escritor in enumerate(estado.escritores):
+                etiquetas = {"fragmento": str(indice)}
+                yield "escritor_lotes_confirmados", "counter", escritor.lotes_confirmados, etiquetas
+                yield "escritor_mensajes_confirmados", "counter", escritor.mensajes_confirmados, etiquetas
+
+        registro.registrar_recolector("escritor", _escritor)
 
 
 def crear_aplicacion() -> FastAPI:
@@ -26,7 +209,11 @@ def crear_aplicacion() -> FastAPI:
     )
 
     app.include_router(enrutador)
+    app.include_router(enrutador_sesiones)
     registrar_manejadores_errores(app)
+    if config.COMPRESION_HABILITADA:
+        app.add_middleware(MiddlewareCompresion)
+    registrar_metricas(app)
 
     return app
 
@@ -35,5 +222,6 @@ aplicacion = crear_aplicacion()
 
 
 if __name__ == "__main__":
+    # Solo para desarrollo; en produccion usar `python -m app.lanzador`
     import uvicorn
     uvicorn.run("app.principal:aplicacion", host="0.0.0.0", port=8000, reload=True)
@@ -1,6 +1,7 @@
 import sqlite3
 
 from app.configuracion import obtener_configuracion
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
 
 ESQUEMA_SQL = """
 CREATE TABLE IF NOT EXISTS mensajes (
@@ -8,28 +9,257 @@ CREATE TABLE IF NOT EXISTS mensajes (
     session_id TEXT NOT NULL,
     content TEXT NOT NULL,
     timestamp TEXT NOT NULL,
+    timestamp_us INTEGER NOT NULL,
     sender TEXT NOT NULL CHECK(sender IN ('user', 'system')),
     word_count INTEGER NOT NULL,
     character_count INTEGER NOT NULL,
     processed_at TEXT NOT NULL
 );
 
-CREATE INDEX IF NOT EXISTS idx_session_id ON mensajes(session_id);
-CREATE INDEX IF NOT EXISTS idx_sender ON mensajes(sender);
-CREATE INDEX IF NOT EXISTS idx_timestamp ON mensajes(timestamp);
+-- Un indice por forma de consulta: la pagina de una sesion (con o sin filtro de sender)
+-- se lee como un rango ya ordenado por (timestamp_us, message_id), y los COUNT(*) y la
+-- ultima posicion se resuelven solo con el indice
+CREATE INDEX IF NOT EXISTS idx_sesion_tiempo ON mensajes(session_id, timestamp_us, message_id);
+CREATE INDEX IF NOT EXISTS idx_sesion_remitente_tiempo ON mensajes(session_id, sender, timestamp_us, message_id);
+
+-- Agregados por sesion, actualizados en la misma transaccion que cada insercion
+CREATE TABLE IF NOT EXISTS sesiones (
+    session_id TEXT PRIMARY KEY,
+    total_mensajes INTEGER NOT NULL,
+    mensajes_user INTEGER NOT NULL,
+    mensajes_system INTEGER NOT NULL,
+    total_palabras INTEGER NOT NULL,
+    total_caracteres INTEGER NOT NULL,
+    primer_timestamp TEXT NOT NULL,
+    primer_timestamp_us INTEGER NOT NULL,
+    ultimo_timestamp TEXT NOT NULL,
+    ultimo_timestamp_us INTEGER NOT NULL,
+    -- Sube con cada escritura en la sesion; es el ETag de sus paginas
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Indice de texto completo sobre `content`. Es de contenido externo (no duplica el texto):
+-- apunta a mensajes.rowid y se mantiene al dia con triggers. Un VACUUM completo puede
+-- renumerar esos rowid; despues de uno hay que llamar a reconstruir_indice_busqueda.
+-- session_id tambien se indexa para cruzar la busqueda con la sesion dentro del indice,
+-- pero no cuenta para la relevancia (peso 0 en bm25).
+CREATE VIRTUAL TABLE IF NOT EXISTS mensajes_fts USING fts5(
+    content,
+    session_id,
+    content = 'mensajes',
+    content_rowid = 'rowid',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+INSERT INTO mensajes_fts (mensajes_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)');
+
+CREATE TRIGGER IF NOT EXISTS mensajes_fts_insertar AFTER INSERT ON mensajes BEGIN
+    INSERT INTO mensajes_fts (rowid, content, session_id) VALUES (new.rowid, new.content, new.session_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mensajes_fts_borrar AFTER DELETE ON mensajes BEGIN
+    INSERT INTO mensajes_fts (mensajes_fts, rowid, content, session_id)
+    VALUES ('delete', old.rowid, old.content, old.session_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mensajes_fts_actualizar AFTER UPDATE OF content, session_id ON mensajes BEGIN
+    INSERT INTO mensajes_fts (mensajes_fts, rowid, content, session_id)
+    VALUES ('delete', old.rowid, old.content, old.session_id);
+    INSERT INTO mensajes_fts (rowid, content, session_id) VALUES (new.rowid, new.content, new.session_id);
+END;
+"""
+
+# Recalcula los agregados conservando la version de cada sesion (y subiendola),
+# para que un ETag emitido antes de reconstruir no vuelva a coincidir
+CONSULTA_RECONSTRUIR_SESIONES = """
+    INSERT INTO sesiones (session_id, total_mensajes, mensajes_user, mensajes_system,
+                          total_palabras, total_caracteres, primer_timestamp, primer_timestamp_us,
+                          ultimo_timestamp, ultimo_timestamp_us, version)
+    SELECT
+        session_id,
+        COUNT(*),
+        SUM(sender = 'user'),
+        SUM(sender = 'system'),
+        SUM(word_count),
+        SUM(character_count),
+        (SELECT timestamp FROM mensajes AS m WHERE m.session_id = agrupados.session_id
+         ORDER BY timestamp_us, message_id LIMIT 1),
+        MIN(timestamp_us),
+        (SELECT timestamp FROM mensajes AS m WHERE m.session_id = agrupados.session_id
+         ORDER BY timestamp_us DESC, message_id DESC LIMIT 1),
+        MAX(timestamp_us),
+        1
+    FROM mensajes AS agrupados
+    WHERE true
+    GROUP BY session_id
+    ON CONFLICT(session_id) DO UPDATE SET
+        total_mensajes = excluded.total_mensajes,
+        mensajes_user = excluded.mensajes_user,
+        mensajes_system = excluded.mensajes_system,
+        total_palabras = excluded.total_palabras,
+        total_caracteres = excluded.total_caracteres,
+        primer_timestamp = excluded.primer_timestamp,
+        primer_timestamp_us = excluded.primer_timestamp_us,
+        ultimo_timestamp = excluded.ultimo_timestamp,
+        ultimo_timestamp_us = excluded.ultimo_timestamp_us,
+        version = version + 1
 """
 
 
+# Sesiones que ya no tienen mensajes: quedan con totales en 0 (como las que vacia la
+# retencion) para no reiniciar la version, que es el ETag de sus paginas
+CONSULTA_VACIAR_SESIONES = """
+    UPDATE sesiones SET
+        total_mensajes = 0,
+        mensajes_user = 0,
+        mensajes_system = 0,
+        total_palabras = 0,
+        total_caracteres = 0,
+        primer_timestamp = '',
+        primer_timestamp_us = :maximo_us,
+        ultimo_timestamp = '',
+        ultimo_timestamp_us = :minimo_us,
+        version = version + 1
+    WHERE session_id NOT IN (SELECT session_id FROM mensajes)
+"""
+
+
+# Valores aceptados para PRAGMA synchronous (se validan antes de interpolarlos)
+_SINCRONIZACION_VALIDA = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
 def obtener_conexion(ruta_bd: str | None = None) -> sqlite3.Connection:
     config = obtener_configuracion()
     ruta = ruta_bd or config.RUTA_BASE_DATOS
-    conexion = sqlite3.connect(ruta, check_same_thread=False)
+    sincronizacion = config.SINCRONIZACION_SQLITE.upper()
+    if sincronizacion not in _SINCRONIZACION_VALIDA:
+        raise ValueError(f"SINCRONIZACION_SQLITE invalida: {config.SINCRONIZACION_SQLITE}")
+    conexion = sqlite3.connect(
+        ruta,
+        check_same_thread=False,
+        cached_statements=config.SENTENCIAS_EN_CACHE,
+        timeout=config.ESPERA_BLOQUEO_SQLITE_MS / 1000,
+    )
     conexion.row_factory = sqlite3.Row
+    # Solo tiene efecto al crear la base (tiene que ir antes de activar WAL); las existentes
+    # se convierten con `python -m app.herramientas.aplicar_retencion --activar-vacuum-incremental`
+    conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
     conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(f"PRAGMA busy_timeout={int(config.ESPERA_BLOQUEO_SQLITE_MS)}")
+    conexion.execute(f"PRAGMA synchronous={sincronizacion}")
     return conexion
 
 
 def inicializar_base_datos(ruta_bd: str | None = None):
+    """Crea el esquema, o lleva una base existente a la ultima version de MIGRACIONES."""
     conexion = obtener_conexion(ruta_bd)
+    try:
+        aplicar_migraciones(conexion)
+    finally:
+        conexion.close()
+
+
+def aplicar_migraciones(conexion: sqlite3.Connection) -> int:
+    """Aplica en orden las migraciones posteriores a `PRAGMA user_version`. Retorna la version final.
+
+    Cada migracion tiene que poder repetirse sin efecto: si dos procesos inician a la
+    vez, o uno se corta antes de anotar la version, puede volver a correr.
+    """
+    actual = conexion.execute("PRAGMA user_version").fetchone()[0]
+    for version, migracion in MIGRACIONES:
+        if version > actual:
+            migracion(conexion)
+            conexion.execute(f"PRAGMA user_version = {int(version)}")
+            actual = version
+    return actual
+
+
+def reconstruir_tabla_sesiones(conexion: sqlite3.Connection) -> int:
+    """Recalcula todos los agregados de `sesiones` desde `mensajes`. Retorna cuantas sesiones tienen mensajes."""
+    with conexion:
+        conexion.execute(CONSULTA_RECONSTRUIR_SESIONES)
+        conexion.execute(CONSULTA_VACIAR_SESIONES, {"maximo_us": 2**63 - 1, "minimo_us": -(2**63)})
+    return conexion.execute("SELECT COUNT(*) FROM sesiones WHERE total_mensajes > 0").fetchone()[0]
+
+
+def reconstruir_indice_busqueda(conexion: sqlite3.Connection) -> None:
+    """Vuelve a indexar todo el contenido de `mensajes` en `mensajes_fts`."""
+    with conexion:
+        conexion.execute("INSERT INTO mensajes_fts (mensajes_fts) VALUES ('rebuild')")
+
+
+def activar_vacuum_incremental(conexion: sqlite3.Connection) -> None:
+    """Pasa una base existente a auto_vacuum incremental con un VACUUM completo.
+
+    Bloquea la base mientras dura y puede renumerar los rowid, asi que tambien se
+    reconstruye el indice de busqueda.
+    """
+    conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conexion.execute("VACUUM")
+    reconstruir_indice_busqueda(conexion)
+
+
+def _migracion_esquema_base(conexion: sqlite3.Connection) -> None:
+    """Crea el esquema actual; las bases de antes de las migraciones numeradas se completan aca."""
+    _migrar_timestamp_normalizado(conexion)
+    sin_sesiones = conexion.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sesiones'"
+    ).fetchone() is None
+    sin_busqueda = conexion.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'mensajes_fts'"
+    ).fetchone() is None
     conexion.executescript(ESQUEMA_SQL)
-    conexion.close()
+    _migrar_version_sesiones(conexion)
+    if sin_sesiones:
+        # Bases anteriores a la tabla de agregados: se calculan desde los mensajes
+        reconstruir_tabla_sesiones(conexion)
+    if sin_busqueda:
+        # Bases anteriores al indice de texto completo: se indexa lo que ya habia
+        reconstruir_indice_busqueda(conexion)
+
+
+def _migracion_indices_por_consulta(conexion: sqlite3.Connection) -> None:
+    """Quita los indices que ninguna consulta usaba y que cada insercion pagaba.
+
+    idx_sender tenia dos valores posibles, idx_timestamp no servia a ninguna consulta
+    e idx_session_id es un prefijo de idx_sesion_tiempo. El filtro por sender pasa a
+    idx_sesion_remitente_tiempo.
+    """
+    with conexion:
+        conexion.execute("DROP INDEX IF EXISTS idx_sender")
+        conexion.execute("DROP INDEX IF EXISTS idx_timestamp")
+        conexion.execute("DROP INDEX IF EXISTS idx_session_id")
+        conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sesion_remitente_tiempo "
+            "ON mensajes(session_id, sender, timestamp_us, message_id)"
+        )
+    # Si la base ya tiene estadisticas para el planificador, que incluyan el indice nuevo
+    if conexion.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is not None:
+        conexion.execute("ANALYZE mensajes")
+
+
+def _migrar_timestamp_normalizado(conexion: sqlite3.Connection) -> None:
+    """Agrega y rellena `timestamp_us` en bases creadas antes de que existiera."""
+    columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(mensajes)")}
+    if not columnas or "timestamp_us" in columnas:
+        return
+    conexion.create_function("epoch_us", 1, timestamp_a_epoch_us, deterministic=True)
+    with conexion:
+        conexion.execute("ALTER TABLE mensajes ADD COLUMN timestamp_us INTEGER NOT NULL DEFAULT 0")
+        conexion.execute("UPDATE mensajes SET timestamp_us = epoch_us(timestamp)")
+        conexion.execute("DROP INDEX IF EXISTS idx_sesion_timestamp")
+
+
+def _migrar_version_sesiones(conexion: sqlite3.Connection) -> None:
+    """Agrega la columna `version` a tablas `sesiones` creadas antes de que existiera."""
+    columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(sesiones)")}
+    if "version" not in columnas:
+        with conexion:
+            conexion.execute("ALTER TABLE sesiones ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+# Version del esquema (PRAGMA user_version) -> migracion que lleva a ella. Solo se agregan
+# al final; ESQUEMA_SQL refleja siempre el resultado de aplicarlas todas.
+MIGRACIONES = [
+    (1, _migracion_esquema_base),
+    (2, _migracion_indices_por_consulta),
+]
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+from typing import Iterable, Optional, Sequence
+
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.pool_conexiones import PoolConexiones
+
+ESQUEMA_DIRECTORIO = """
+    CREATE TABLE IF NOT EXISTS ids_mensajes (
+        message_id TEXT PRIMARY KEY,
+        fragmento INTEGER NOT NULL
+    ) WITHOUT ROWID
+"""
+
+CONSULTA_RESERVAR = "INSERT OR IGNORE INTO ids_mensajes (message_id, fragmento) VALUES (?, ?)"
+
+
+def ruta_directorio(ruta_base: str) -> str:
+    """Archivo del directorio de ids junto a los fragmentos: mensajes.db -> mensajes.ids.db."""
+    raiz, extension = os.path.splitext(ruta_base)
+    return f"{raiz}.ids{extension}"
+
+
+def inicializar_directorio(ruta: str, rutas_fragmentos: Sequence[str] = ()) -> int:
+    """Crea el directorio y registra los ids que ya estan en los fragmentos. Retorna cuantos agrego.
+
+    Se puede repetir: los ids ya registrados se omiten.
+    """
+    conexion = obtener_conexion(ruta)
+    try:
+        conexion.execute(ESQUEMA_DIRECTORIO)
+        return registrar_ids_existentes(conexion, rutas_fragmentos)
+    finally:
+        conexion.close()
+
+
+def registrar_ids_existentes(
+    conexion: sqlite3.Connection,
+    rutas_fragmentos: Sequence[str],
+    tamano_bloque: int = 5000,
+) -> int:
+    """Copia al directorio los message_id de cada fragmento (el primero que lo tenga se queda con el id)."""
+    agregados = 0
+    for indice, ruta in enumerate(rutas_fragmentos):
+        if not os.path.exists(ruta):
+            continue
+        fragmento = obtener_conexion(ruta)
+        try:
+            cursor = fragmento.execute("SELECT message_id FROM mensajes")
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                with conexion:
+                    agregados += conexion.executemany(
+                        CONSULTA_RESERVAR, ((fila["message_id"], indice) for fila in filas)
+                    ).rowcount
+        finally:
+            fragmento.close()
+    return agregados
+
+
+class DirectorioIds:
+    """Indice global message_id -> fragmento, para que el id sea unico entre fragmentos.
+
+    Antes de escribir en su fragmento, cada mensaje reserva su id aqui; si otro mensaje
+    ya lo tiene, es un duplicado aunque este en otro fragmento. La reserva se confirma
+    antes que el mensaje: si la escritura falla se libera, pero si el proceso cae entre
+    ambas el id queda reservado sin mensaje y se rechaza como duplicado. La retencion
+    libera los ids de los mensajes que borra.
+    """
+
+    def __init__(self, pool: PoolConexiones):
+        self._pool = pool
+
+    def reservar(self, ids: Sequence[tuple[str, int]]) -> set[int]:
+        """Reserva (message_id, fragmento) en una transaccion. Retorna las posiciones ya tomadas.
+
+        Un id repetido dentro de `ids` queda reservado la primera vez.
+        """
+        tomadas: set[int] = set()
+        with self._pool.conexion() as conexion:
+            with conexion:
+                for posicion, (message_id, fragmento) in enumerate(ids):
+                    if conexion.execute(CONSULTA_RESERVAR, (message_id, fragmento)).rowcount == 0:
+                        tomadas.add(posicion)
+        return tomadas
+
+    def liberar(self, ids: Iterable[str], fragmento: Optional[int] = None) -> None:
+        """Quita reservas de mensajes que no se llegaron a guardar o que se borraron.
+
+        Con `fragmento`, solo las que apuntan a ese fragmento: un id repetido en otro
+        fragmento (de antes del directorio) conserva la suya.
+        """
+        with self._pool.conexion() as conexion:
+            with conexion:
+                if fragmento is None:
+                    conexion.executemany("DELETE FROM ids_mensajes WHERE message_id = ?", ((i,) for i in ids))
+                else:
+                    conexion.executemany(
+                        "DELETE FROM ids_mensajes WHERE message_id = ? AND fragmento = ?",
+                        ((i, fragmento) for i in ids),
+                    )
+
+    def cerrar(self) -> None:
+        self._pool.cerrar()
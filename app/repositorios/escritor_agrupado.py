@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+
+from app.configuracion import obtener_configuracion
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado, ErrorServicioNoDisponible
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+
+
+class EscrituraPendiente:
+    """Mensaje encolado; quien lo encola espera aqui hasta que su lote se confirme."""
+
+    __slots__ = ("datos", "_listo", "_error")
+
+    def __init__(self, datos: dict):
+        self.datos = datos
+        self._listo = threading.Event()
+        self._error: BaseException | None = None
+
+    def completar(self, error: BaseException | None = None) -> None:
+        self._error = error
+        self._listo.set()
+
+    def resultado(self, espera: float | None = None) -> None:
+        """Bloquea hasta el commit (a lo sumo `espera` segundos). Relanza el error si el mensaje no se guardo.
+
+        Si se agota la espera el mensaje puede confirmarse igual mas tarde; un reintento
+        del cliente lo vera como duplicado.
+        """
+        if not self._listo.wait(espera):
+            raise ErrorServicioNoDisponible("La escritura no se confirmo a tiempo, intente nuevamente")
+        if self._error is not None:
+            raise self._error
+
+
+class EscritorAgrupado:
+    """Hilo escritor unico que agrupa muchas inserciones en cada transaccion.
+
+    Los llamadores encolan mensajes y esperan su resultado; el hilo toma lo que haya
+    en la cola (hasta `tamano_lote` o hasta que pase `intervalo_ms` desde el primero)
+    y lo confirma con un solo commit, repartiendo el costo del fsync entre todos.
+    """
+
+    def __init__(
+        self,
+        ruta_bd: str | None = None,
+        tamano_lote: int | None = None,
+        intervalo_ms: float | None = None,
+        capacidad_cola: int | None = None,
+        espera_encolar: float | None = None,
+        espera_confirmacion: float | None = None,
+    ):
+        config = obtener_configuracion()
+        self._ruta = ruta_bd or config.RUTA_BASE_DATOS
+        self._tamano_lote = tamano_lote or config.TAMANO_LOTE_ESCRITURA
+        self._intervalo = (intervalo_ms if intervalo_ms is not None else config.INTERVALO_ESCRITURA_MS) / 1000
+        self._espera_encolar = espera_encolar if espera_encolar is not None else config.ESPERA_COLA_ESCRITURA_SEGUNDOS
+        self._espera_confirmacion = (
+            espera_confirmacion if espera_confirmacion is not None else config.ESPERA_CONFIRMACION_ESCRITURA_SEGUNDOS
+        )
+        self._cola: queue.Queue[EscrituraPendiente | None] = queue.Queue(
+            maxsize=capacidad_cola or config.CAPACIDAD_COLA_ESCRITURA
+        )
+        self._hilo = threading.Thread(target=self._ejecutar, name="escritor-agrupado", daemon=True)
+        self.lotes_confirmados = 0
+        self.mensajes_confirmados = 0
+        # Error que detuvo el hilo (p. ej. no se pudo abrir la base); las escrituras nuevas fallan con el
+        self._fallo: ErrorServicioNoDisponible | None = None
+
+    def iniciar(self) -> None:
+        self._hilo.start()
+
+    def detener(self) -> None:
+        """Confirma lo que quede en la cola y termina el hilo."""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join()
+
+    def encolar(self, datos: dict) -> EscrituraPendiente:
+        if self._fallo is not None:
+            raise self._fallo
+        pendiente = EscrituraPendiente(datos)
+        try:
+            self._cola.put(pendiente, timeout=self._espera_encolar)
+        except queue.Full:
+            raise ErrorServicioNoDisponible("La cola de escritura esta llena, intente nuevamente")
+        return pendiente
+
+    def guardar(self, datos: dict) -> None:
+        self.encolar(datos).resultado(self._espera_confirmacion)
+
+    def guardar_lote(self, lote: list[dict]) -> set[int]:
+        """Encola todo el lote y retorna las posiciones duplicadas."""
+        pendientes = [self.encolar(datos) for datos in lote]
+        duplicados: set[int] = set()
+        for posicion, pendiente in enumerate(pendientes):
+            try:
+                pendiente.resultado(self._espera_confirmacion)
+            except ErrorMensajeDuplicado:
+                duplicados.add(posicion)
+        return duplicados
+
+    def _ejecutar(self) -> None:
+        try:
+            conexion = obtener_conexion(self._ruta)
+        except Exception as exc:
+            self._fallar(exc)
+            return
+        repositorio = RepositorioMensajes(conexion)
+        try:
+            detener = False
+            while not detener:
+                primero = self._cola.get()
+                if primero is None:
+                    break
+                lote = [primero]
+                limite = time.monotonic() + self._intervalo
+                while len(lote) < self._tamano_lote:
+                    restante = limite - time.monotonic()
+                    try:
+                        siguiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if siguiente is None:
+                        detener = True
+                        break
+                    lote.append(siguiente)
+                self._confirmar(repositorio, lote)
+        except Exception as exc:
+            self._fallar(exc)
+        finally:
+            conexion.close()
+
+    def _fallar(self, causa: Exception) -> None:
+        """El hilo no puede seguir: completa con error todo lo encolado y rechaza lo que llegue."""
+        error = ErrorServicioNoDisponible("El escritor de la base de datos no esta disponible")
+        error.__cause__ = causa
+        self._fallo = error
+        while True:
+            try:
+                pendiente = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if pendiente is not None:
+                pendiente.completar(error)
+
+    def _confirmar(self, repositorio: RepositorioMensajes, lote: list[EscrituraPendiente]) -> None:
+        try:
+            duplicados = repositorio.guardar_mensajes_lote([pendiente.datos for pendiente in lote])
+        except Exception as exc:
+            for pendiente in lote:
+                pendiente.completar(exc)
+            return
+
+        self.lotes_confirmados += 1
+        self.mensajes_confirmados += len(lote) - len(duplicados)
+        for posicion, pendiente in enumerate(lote):
+            if posicion in duplicados:
+                pendiente.completar(ErrorMensajeDuplicado(pendiente.datos["message_id"]))
+            else:
+                pendiente.completar()
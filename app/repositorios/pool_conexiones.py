@@ -0,0 +1,127 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.configuracion import obtener_configuracion
+from app.excepciones.excepciones_api import ErrorServicioNoDisponible
+from app.repositorios.base_datos import obtener_conexion
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite reutilizables entre solicitudes.
+
+    Las conexiones se crean bajo demanda hasta `tamano` y se reparten en orden
+    LIFO para reutilizar siempre las mas recientes (cache de sentencias caliente).
+    Cada conexion la usa un solo hilo a la vez, entre `obtener` y `devolver`.
+    """
+
+    def __init__(
+        self,
+        ruta_bd: str | None = None,
+        tamano: int | None = None,
+        tiempo_espera: float | None = None,
+    ):
+        config = obtener_configuracion()
+        self._ruta = ruta_bd or config.RUTA_BASE_DATOS
+        self._tamano = tamano or config.TAMANO_POOL_CONEXIONES
+        self._tiempo_espera = tiempo_espera if tiempo_espera is not None else config.ESPERA_POOL_SEGUNDOS
+        self._disponibles: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=self._tamano)
+        self._candado = threading.Lock()
+        self._creadas = 0
+        self._cerrado = False
+
+    @property
+    def tamano(self) -> int:
+        return self._tamano
+
+    @property
+    def conexiones_creadas(self) -> int:
+        return self._creadas
+
+    def obtener(self) -> sqlite3.Connection:
+        """Entrega una conexion sana. Espera si todas estan ocupadas."""
+        if self._cerrado:
+            raise RuntimeError("El pool de conexiones esta cerrado")
+
+        try:
+            conexion = self._disponibles.get_nowait()
+        except queue.Empty:
+            conexion = self._crear_si_hay_cupo()
+            if conexion is None:
+                try:
+                    conexion = self._disponibles.get(timeout=self._tiempo_espera)
+                except queue.Empty:
+                    raise ErrorServicioNoDisponible(
+                        "No hay conexiones disponibles con la base de datos"
+                    )
+
+        if not self._esta_sana(conexion):
+            self._descartar(conexion)
+            conexion = self._crear_si_hay_cupo()
+            if conexion is None:
+                raise ErrorServicioNoDisponible("No se pudo reabrir la conexion con la base de datos")
+        return conexion
+
+    def devolver(self, conexion: sqlite3.Connection) -> None:
+        """Regresa la conexion al pool, descartando cualquier transaccion a medias."""
+        try:
+            if conexion.in_transaction:
+                conexion.rollback()
+        except sqlite3.Error:
+            self._descartar(conexion)
+            return
+
+        if self._cerrado:
+            self._descartar(conexion)
+            return
+        try:
+            self._disponibles.put_nowait(conexion)
+        except queue.Full:
+            self._descartar(conexion)
+
+    @contextmanager
+    def conexion(self) -> Iterator[sqlite3.Connection]:
+        conexion = self.obtener()
+        try:
+            yield conexion
+        finally:
+            self.devolver(conexion)
+
+    def cerrar(self) -> None:
+        self._cerrado = True
+        while True:
+            try:
+                conexion = self._disponibles.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conexion)
+
+    def _crear_si_hay_cupo(self) -> sqlite3.Connection | None:
+        with self._candado:
+            if self._creadas >= self._tamano:
+                return None
+            self._creadas += 1
+        try:
+            return obtener_conexion(self._ruta)
+        except sqlite3.Error:
+            with self._candado:
+                self._creadas -= 1
+            raise
+
+    def _descartar(self, conexion: sqlite3.Connection) -> None:
+        try:
+            conexion.close()
+        except sqlite3.Error:
+            pass
+        with self._candado:
+            self._creadas -= 1
+
+    @staticmethod
+    def _esta_sana(conexion: sqlite3.Connection) -> bool:
+        try:
+            conexion.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+
+class RepositorioMensajesBase(ABC):
+    """Contrato de almacenamiento que usa ServicioMensajes.
+
+    Los mensajes entran y salen como dicts con las columnas de `mensajes`
+    (MensajeRegistro.fila()). Las implementaciones: RepositorioMensajes (SQLite),
+    RepositorioMensajesFragmentado (varios SQLite) y RepositorioMensajesPostgres.
+    `tests/unitarias/test_contrato_repositorio.py` corre las mismas pruebas contra todas.
+    """
+
+    @abstractmethod
+    def guardar_mensaje(self, datos: dict) -> None:
+        """Guarda un mensaje y suma sus agregados a la sesion. ErrorMensajeDuplicado si el id existe."""
+
+    @abstractmethod
+    def guardar_mensajes_lote(self, lote: list[dict]) -> set[int]:
+        """Guarda el lote en una transaccion (por base). Retorna las posiciones con message_id repetido.
+
+        Un id repetido dentro del mismo lote se guarda la primera vez.
+        """
+
+    @abstractmethod
+    def obtener_mensajes_por_sesion(
+        self,
+        session_id: str,
+        limite: int = 50,
+        desplazamiento: int = 0,
+        remitente: Optional[str] = None,
+        despues_de: Optional[tuple[int, str]] = None,
+        incluir_total: bool = True,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+    ) -> tuple[list[dict], Optional[int]]:
+        """Pagina de la sesion ordenada por (timestamp_us, message_id). Retorna (mensajes, total)."""
+
+    @abstractmethod
+    def contar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        maximo_exacto: int = 0,
+    ) -> tuple[int, bool]:
+        """Total de la sesion con los filtros de la pagina. Retorna (total, exacto).
+
+        Con un rango de tiempo se cuentan a lo sumo `maximo_exacto` filas (0 = todas);
+        si hay mas, el total es una estimacion y `exacto` es False.
+        """
+
+    @abstractmethod
+    def iterar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        tamano_bloque: int = 500,
+    ) -> Iterator[dict]:
+        """Todos los mensajes de la sesion en orden, leidos por bloques."""
+
+    @abstractmethod
+    def obtener_mensaje(self, message_id: str, session_id: str) -> Optional[dict]:
+        """Mensaje por clave primaria; None si no existe o es de otra sesion."""
+
+    @abstractmethod
+    def obtener_estadisticas_sesion(self, session_id: str) -> Optional[dict]:
+        """Fila de agregados de la sesion, o None si no tiene mensajes."""
+
+    @abstractmethod
+    def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        """Version de la sesion (sube con cada escritura), o None si nunca tuvo mensajes."""
+
+    @abstractmethod
+    def obtener_ultima_posicion(self, session_id: str) -> Optional[tuple[int, str]]:
+        """(timestamp_us, message_id) del ultimo mensaje de la sesion."""
+
+    @abstractmethod
+    def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        despues_de: Optional[tuple[float, int]] = None,
+    ) -> list[dict]:
+        """Busqueda de texto ordenada por (puntaje, rowid), menor puntaje = mas relevante.
+
+        Cada fila trae ademas `rowid`, `puntaje` y `fragmento_texto` (con <mark>).
+        """
@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import os
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence
+
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado
+from app.repositorios.directorio_ids import DirectorioIds
+from app.repositorios.escritor_agrupado import EscritorAgrupado
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_base import RepositorioMensajesBase
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+
+
+def indice_fragmento(session_id: str, total: int) -> int:
+    """Fragmento de una sesion. Usa crc32 para que sea estable entre procesos y reinicios."""
+    return zlib.crc32(session_id.encode("utf-8")) % total
+
+
+def rutas_fragmentos(ruta_base: str, total: int) -> list[str]:
+    """Rutas de los archivos de cada fragmento: mensajes.db -> mensajes.0.db, mensajes.1.db, ...
+
+    Con un solo fragmento se usa la ruta base tal cual.
+    """
+    if total <= 1:
+        return [ruta_base]
+    raiz, extension = os.path.splitext(ruta_base)
+    return [f"{raiz}.{indice}{extension}" for indice in range(total)]
+
+
+class RepositorioMensajesFragmentado(RepositorioMensajesBase):
+    """Reparte los mensajes en varias bases SQLite segun el session_id.
+
+    Cada fragmento tiene su propio pool (y su escritor agrupado, si se usa), asi que
+    las escrituras de sesiones en fragmentos distintos no esperan el mismo candado.
+    Todas las lecturas de una sesion tocan un solo fragmento. La conexion se toma del
+    pool del fragmento solo durante cada operacion.
+
+    Con `directorio`, `message_id` es unico entre todos los fragmentos (cada escritura
+    reserva antes su id en el DirectorioIds). Sin el, solo es unico dentro de cada fragmento.
+    """
+
+    def __init__(
+        self,
+        pools: Sequence[PoolConexiones],
+        escritores: Optional[Sequence[EscritorAgrupado]] = None,
+        directorio: Optional[DirectorioIds] = None,
+    ):
+        if escritores and len(escritores) != len(pools):
+            raise ValueError("Se necesita un escritor por fragmento")
+        self._pools = list(pools)
+        self._escritores = list(escritores) if escritores else [None] * len(self._pools)
+        self._directorio = directorio
+
+    @property
+    def total_fragmentos(self) -> int:
+        return len(self._pools)
+
+    def guardar_mensaje(self, datos: dict) -> None:
+        indice = self._indice(datos["session_id"])
+        if self._directorio is not None and self._directorio.reservar([(datos["message_id"], indice)]):
+            raise ErrorMensajeDuplicado(datos["message_id"])
+        try:
+            with self._repositorio(indice) as repositorio:
+                repositorio.guardar_mensaje(datos)
+        except ErrorMensajeDuplicado:
+            # Ya estaba en este fragmento (base anterior al directorio): la reserva le corresponde
+            raise
+        except Exception:
+            if self._directorio is not None:
+                self._directorio.liberar([datos["message_id"]])
+            raise
+
+    def guardar_mensajes_lote(self, lote: list[dict]) -> set[int]:
+        """Guarda el lote repartido por fragmento; cada fragmento en su propia transaccion.
+
+        Retorna las posiciones duplicadas referidas al lote original. Con directorio, todos
+        los ids del lote se reservan antes en una sola transaccion; si falla un fragmento se
+        liberan las reservas de ese fragmento (los anteriores ya quedaron confirmados).
+        """
+        indices = [self._indice(datos["session_id"]) for datos in lote]
+        duplicados: set[int] = set()
+        if self._directorio is not None:
+            duplicados = self._directorio.reservar(
+                [(datos["message_id"], indice) for datos, indice in zip(lote, indices)]
+            )
+
+        posiciones_por_fragmento: dict[int, list[int]] = {}
+        for posicion, indice in enumerate(indices):
+            if posicion not in duplicados:
+                posiciones_por_fragmento.setdefault(indice, []).append(posicion)
+
+        for indice, posiciones in posiciones_por_fragmento.items():
+            try:
+                with self._repositorio(indice) as repositorio:
+                    locales = repositorio.guardar_mensajes_lote([lote[posicion] for posicion in posiciones])
+            except Exception:
+                if self._directorio is not None:
+                    self._directorio.liberar(lote[posicion]["message_id"] for posicion in posiciones)
+                raise
+            duplicados.update(posiciones[local] for local in locales)
+        return duplicados
+
+    def obtener_mensajes_por_sesion(self, session_id: str, **opciones) -> tuple[list[dict], Optional[int]]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.obtener_mensajes_por_sesion(session_id, **opciones)
+
+    def contar_mensajes_sesion(self, session_id: str, **opciones) -> tuple[int, bool]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.contar_mensajes_sesion(session_id, **opciones)
+
+    def obtener_mensaje(self, message_id: str, session_id: str) -> Optional[dict]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.obtener_mensaje(message_id, session_id)
+
+    def obtener_estadisticas_sesion(self, session_id: str) -> Optional[dict]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.obtener_estadisticas_sesion(session_id)
+
+    def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.obtener_version_sesion(session_id)
+
+    def obtener_ultima_posicion(self, session_id: str) -> Optional[tuple[int, str]]:
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            return repositorio.obtener_ultima_posicion(session_id)
+
+    def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        despues_de: Optional[tuple[float, int]] = None,
+    ) -> list[dict]:
+        """Busca en un fragmento (con `session_id`) o en todos, mezclando por relevancia.
+
+        El `rowid` de cada resultado se combina con su fragmento (rowid * N + fragmento)
+        para que el orden (puntaje, rowid) sea total entre fragmentos y sirva de cursor.
+        Cada fragmento calcula bm25 con sus propias estadisticas, asi que el orden
+        entre fragmentos es aproximado.
+        """
+        total = len(self._pools)
+        indices = [self._indice(session_id)] if session_id is not None else range(total)
+        por_fragmento = []
+        for indice in indices:
+            local = None
+            if despues_de is not None:
+                puntaje, combinado = despues_de
+                # rowid * N + indice > combinado  <=>  rowid > (combinado - indice) // N
+                local = (puntaje, (combinado - indice) // total)
+            with self._repositorio(indice) as repositorio:
+                filas = repositorio.buscar_mensajes(texto, session_id, remitente, limite, local)
+            for fila in filas:
+                fila["rowid"] = fila["rowid"] * total + indice
+            por_fragmento.append(filas)
+        mezcla = heapq.merge(*por_fragmento, key=lambda fila: (fila["puntaje"], fila["rowid"]))
+        return list(itertools.islice(mezcla, limite))
+
+    def iterar_mensajes_sesion(self, session_id: str, **opciones) -> Iterator[dict]:
+        """Igual que en RepositorioMensajes; la conexion se devuelve al agotar o cerrar el iterador."""
+        with self._repositorio(self._indice(session_id)) as repositorio:
+            yield from repositorio.iterar_mensajes_sesion(session_id, **opciones)
+
+    def cerrar(self):
+        """Los pools pertenecen al ciclo de vida de la aplicacion; no hay nada que cerrar aqui."""
+
+    def _indice(self, session_id: str) -> int:
+        return indice_fragmento(session_id, len(self._pools))
+
+    @contextmanager
+    def _repositorio(self, indice: int) -> Iterator[RepositorioMensajes]:
+        with self._pools[indice].conexion() as conexion:
+            yield RepositorioMensajes(conexion, escritor=self._escritores[indice])
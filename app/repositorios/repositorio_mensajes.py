@@ -1,54 +1,165 @@
 import sqlite3
-from typing import Optional
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from app.excepciones.excepciones_api import ErrorMensajeDuplicado
+from app.metricas import medir_operacion
+from app.repositorios.repositorio_base import RepositorioMensajesBase
 
+if TYPE_CHECKING:
+    from app.repositorios.escritor_agrupado import EscritorAgrupado
 
-class RepositorioMensajes:
-    """Capa de acceso a datos para mensajes."""
 
-    def __init__(self, conexion: sqlite3.Connection):
+CONSULTA_INSERTAR = """
+    INSERT INTO mensajes (message_id, session_id, content, timestamp, timestamp_us, sender,
+                          word_count, character_count, processed_at)
+    VALUES (:message_id, :session_id, :content, :timestamp, :timestamp_us, :sender,
+            :word_count, :character_count, :processed_at)
+"""
+
+# Suma los agregados de un grupo de mensajes nuevos a su sesion (o la crea)
+CONSULTA_ACUMULAR_SESION = """
+    INSERT INTO sesiones (session_id, total_mensajes, mensajes_user, mensajes_system,
+                          total_palabras, total_caracteres, primer_timestamp, primer_timestamp_us,
+                          ultimo_timestamp, ultimo_timestamp_us, version)
+    VALUES (:session_id, :total_mensajes, :mensajes_user, :mensajes_system,
+            :total_palabras, :total_caracteres, :primer_timestamp, :primer_timestamp_us,
+            :ultimo_timestamp, :ultimo_timestamp_us, 1)
+    ON CONFLICT(session_id) DO UPDATE SET
+        total_mensajes = total_mensajes + excluded.total_mensajes,
+        mensajes_user = mensajes_user + excluded.mensajes_user,
+        mensajes_system = mensajes_system + excluded.mensajes_system,
+        total_palabras = total_palabras + excluded.total_palabras,
+        total_caracteres = total_caracteres + excluded.total_caracteres,
+        primer_timestamp = CASE WHEN excluded.primer_timestamp_us < primer_timestamp_us
+                                THEN excluded.primer_timestamp ELSE primer_timestamp END,
+        primer_timestamp_us = MIN(primer_timestamp_us, excluded.primer_timestamp_us),
+        ultimo_timestamp = CASE WHEN excluded.ultimo_timestamp_us > ultimo_timestamp_us
+                                THEN excluded.ultimo_timestamp ELSE ultimo_timestamp END,
+        ultimo_timestamp_us = MAX(ultimo_timestamp_us, excluded.ultimo_timestamp_us),
+        version = version + 1
+"""
+
+# Contadores por sesion y sender, mantenidos al escribir; tambien limitan el rango de tiempo
+CONSULTA_CONTADORES_SESION = """
+    SELECT total_mensajes, mensajes_user, mensajes_system, primer_timestamp_us, ultimo_timestamp_us
+    FROM sesiones WHERE session_id = ?
+"""
+
+# Resultados de busqueda: el fragmento del texto con los terminos marcados
+CONSULTA_BUSCAR = """
+    SELECT mensajes.rowid AS rowid, mensajes.*, mensajes_fts.rank AS puntaje,
+           snippet(mensajes_fts, 0, '<mark>', '</mark>', '...', 16) AS fragmento_texto
+    FROM mensajes_fts JOIN mensajes ON mensajes.rowid = mensajes_fts.rowid
+    WHERE {condiciones}
+    ORDER BY mensajes_fts.rank, mensajes.rowid
+    LIMIT ?
+"""
+
+# Limite de parametros por consulta IN (...) para no exceder SQLITE_MAX_VARIABLE_NUMBER
+_MAX_PARAMETROS_IN = 500
+
+
+class RepositorioMensajes(RepositorioMensajesBase):
+    """Capa de acceso a datos para mensajes (SQLite)."""
+
+    def __init__(self, conexion: sqlite3.Connection, escritor: Optional["EscritorAgrupado"] = None):
         self._conexion = conexion
+        # Con escritor agrupado las escrituras se delegan a su hilo y se confirman por lotes
+        self._escritor = escritor
 
+    @medir_operacion("guardar_mensaje")
     def guardar_mensaje(self, datos: dict) -> None:
-        consulta = """
-            INSERT INTO mensajes (message_id, session_id, content, timestamp, sender,
-                                  word_count, character_count, processed_at)
-            VALUES (:message_id, :session_id, :content, :timestamp, :sender,
-                    :word_count, :character_count, :processed_at)
-        """
+        if self._escritor is not None:
+            self._escritor.guardar(datos)
+            return
         try:
-            self._conexion.execute(consulta, datos)
+            self._conexion.execute(CONSULTA_INSERTAR, datos)
+            self._conexion.executemany(CONSULTA_ACUMULAR_SESION, _acumulados_por_sesion([datos]))
             self._conexion.commit()
         except sqlite3.IntegrityError:
+            self._conexion.rollback()
             raise ErrorMensajeDuplicado(datos["message_id"])
 
+    @medir_operacion("guardar_mensajes_lote")
+    def guardar_mensajes_lote(self, lote: list[dict]) -> set[int]:
+        """Inserta varios mensajes en una sola transaccion.
+
+        Retorna las posiciones del lote que no se guardaron por tener un message_id
+        ya existente (en la BD o repetido antes dentro del mismo lote).
+        """
+        if not lote:
+            return set()
+        if self._escritor is not None:
+            return self._escritor.guardar_lote(lote)
+
+        try:
+            # IMMEDIATE toma el candado de escritura antes de buscar duplicados,
+            # asi ningun otro escritor puede insertar esos ids entre medio.
+            self._conexion.execute("BEGIN IMMEDIATE")
+            vistos = self._ids_existentes([datos["message_id"] for datos in lote])
+            duplicados: set[int] = set()
+            nuevos: list[dict] = []
+            for posicion, datos in enumerate(lote):
+                if datos["message_id"] in vistos:
+                    duplicados.add(posicion)
+                else:
+                    vistos.add(datos["message_id"])
+                    nuevos.append(datos)
+            self._conexion.executemany(CONSULTA_INSERTAR, nuevos)
+            self._conexion.executemany(CONSULTA_ACUMULAR_SESION, _acumulados_por_sesion(nuevos))
+            self._conexion.commit()
+        except BaseException:
+            self._conexion.rollback()
+            raise
+        return duplicados
+
+    def _ids_existentes(self, ids: list[str]) -> set[str]:
+        existentes: set[str] = set()
+        for inicio in range(0, len(ids), _MAX_PARAMETROS_IN):
+            bloque = ids[inicio:inicio + _MAX_PARAMETROS_IN]
+            marcadores = ", ".join("?" * len(bloque))
+            filas = self._conexion.execute(
+                f"SELECT message_id FROM mensajes WHERE message_id IN ({marcadores})", bloque
+            ).fetchall()
+            existentes.update(fila[0] for fila in filas)
+        return existentes
+
+    @medir_operacion("obtener_mensajes_por_sesion")
     def obtener_mensajes_por_sesion(
         self,
         session_id: str,
         limite: int = 50,
         desplazamiento: int = 0,
         remitente: Optional[str] = None,
-    ) -> tuple[list[dict], int]:
-        """Recupera mensajes paginados para una sesion. Retorna (mensajes, total)."""
-        condiciones = ["session_id = ?"]
-        parametros: list = [session_id]
+        despues_de: Optional[tuple[int, str]] = None,
+        incluir_total: bool = True,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+    ) -> tuple[list[dict], Optional[int]]:
+        """Recupera mensajes paginados para una sesion. Retorna (mensajes, total).
 
-        if remitente:
-            condiciones.append("sender = ?")
-            parametros.append(remitente)
+        El orden es cronologico real: por `timestamp_us` (UTC) y luego `message_id`.
+        Con `despues_de` = (timestamp_us, message_id) la pagina empieza justo despues
+        de esa posicion (paginacion por cursor); `desde_us` (inclusivo) y `hasta_us`
+        (exclusivo) acotan un rango. Todo se resuelve como un rango del indice
+        compuesto. `total` (exacto, ver contar_mensajes_sesion) es None si no se pidio.
+        """
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+        tabla = _tabla_sesion(remitente)
 
-        clausula_where = " AND ".join(condiciones)
+        total = None
+        if incluir_total:
+            total, _ = self.contar_mensajes_sesion(session_id, remitente, desde_us, hasta_us)
 
-        # Contar total para metadata de paginacion
-        consulta_total = f"SELECT COUNT(*) FROM mensajes WHERE {clausula_where}"
-        total = self._conexion.execute(consulta_total, parametros).fetchone()[0]
+        if despues_de is not None:
+            condiciones.append("(timestamp_us, message_id) > (?, ?)")
+            parametros.extend(despues_de)
 
         # Consulta con paginacion
         consulta = f"""
-            SELECT * FROM mensajes
-            WHERE {clausula_where}
-            ORDER BY timestamp ASC
+            SELECT * FROM {tabla}
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY timestamp_us ASC, message_id ASC
             LIMIT ? OFFSET ?
         """
         parametros.extend([limite, desplazamiento])
@@ -57,5 +168,253 @@ class RepositorioMensajes:
 
         return mensajes, total
 
+    @medir_operacion("contar_mensajes_sesion")
+    def contar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        maximo_exacto: int = 0,
+    ) -> tuple[int, bool]:
+        """Total de la sesion con los filtros de la pagina. Retorna (total, exacto).
+
+        Sin rango de tiempo (o con uno que abarca toda la sesion) sale de los contadores
+        de `sesiones`: exacto y sin tocar `mensajes`. Con rango se cuenta por el indice,
+        deteniendose en `maximo_exacto` + 1 filas (0 = sin tope); si se llega al tope, el
+        total se estima repartiendo el contador de la sesion en el tiempo.
+        """
+        fila = self._conexion.execute(CONSULTA_CONTADORES_SESION, (session_id,)).fetchone()
+        if _rango_abarca_sesion(fila, desde_us, hasta_us):
+            return _total_contadores(fila, remitente), True
+
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+        seleccion = f"SELECT 1 FROM {_tabla_sesion(remitente)} WHERE {' AND '.join(condiciones)}"
+        if maximo_exacto > 0:
+            seleccion += " LIMIT ?"
+            parametros.append(maximo_exacto + 1)
+        total = self._conexion.execute(f"SELECT COUNT(*) FROM ({seleccion})", parametros).fetchone()[0]
+        if maximo_exacto <= 0 or total <= maximo_exacto:
+            return total, True
+        return _estimar_total(fila, remitente, desde_us, hasta_us, minimo=total), False
+
+    def iterar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        tamano_bloque: int = 500,
+    ) -> Iterator[dict]:
+        """Recorre todos los mensajes de una sesion en orden, sin cargarlos en memoria.
+
+        Las filas se leen del cursor por bloques con `fetchmany`; la conexion queda
+        ocupada hasta que el iterador se agota o se cierra.
+        """
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+        cursor = self._conexion.execute(
+            f"""
+            SELECT * FROM {_tabla_sesion(remitente)}
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY timestamp_us ASC, message_id ASC
+            """,
+            parametros,
+        )
+        try:
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                for fila in filas:
+                    yield dict(fila)
+        finally:
+            cursor.close()
+
+    @medir_operacion("obtener_mensaje")
+    def obtener_mensaje(self, message_id: str, session_id: str) -> Optional[dict]:
+        """Busca un mensaje por clave primaria; None si no existe o es de otra sesion."""
+        fila = self._conexion.execute(
+            "SELECT * FROM mensajes WHERE message_id = ? AND session_id = ?", (message_id, session_id)
+        ).fetchone()
+        return dict(fila) if fila is not None else None
+
+    @medir_operacion("obtener_estadisticas_sesion")
+    def obtener_estadisticas_sesion(self, session_id: str) -> Optional[dict]:
+        """Agregados de la sesion (una fila de `sesiones`), o None si no tiene mensajes."""
+        fila = self._conexion.execute(
+            "SELECT * FROM sesiones WHERE session_id = ? AND total_mensajes > 0", (session_id,)
+        ).fetchone()
+        return dict(fila) if fila is not None else None
+
+    @medir_operacion("obtener_version_sesion")
+    def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        """Version de la sesion (sube con cada escritura), o None si no tiene mensajes."""
+        fila = self._conexion.execute("SELECT version FROM sesiones WHERE session_id = ?", (session_id,)).fetchone()
+        return fila[0] if fila is not None else None
+
+    @medir_operacion("obtener_ultima_posicion")
+    def obtener_ultima_posicion(self, session_id: str) -> Optional[tuple[int, str]]:
+        """(timestamp_us, message_id) del ultimo mensaje de la sesion en orden cronologico."""
+        fila = self._conexion.execute(
+            "SELECT timestamp_us, message_id FROM mensajes WHERE session_id = ? "
+            "ORDER BY timestamp_us DESC, message_id DESC LIMIT 1",
+            (session_id,),
+        ).fetchone()
+        return (fila[0], fila[1]) if fila is not None else None
+
+    @medir_operacion("buscar_mensajes")
+    def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        despues_de: Optional[tuple[float, int]] = None,
+    ) -> list[dict]:
+        """Busca `texto` en el contenido con FTS5, ordenado por relevancia (bm25).
+
+        Cada termino se busca tal cual (sin operadores FTS5); un `*` final busca por
+        prefijo. Con `despues_de` = (puntaje, rowid) la pagina empieza justo despues
+        de ese resultado. Cada fila trae `rowid`, `puntaje` y `fragmento_texto`.
+        """
+        terminos = expresion_busqueda(texto)
+        if not terminos:
+            return []
+        expresion = f"content : ({terminos})"
+        condiciones = ["mensajes_fts MATCH ?"]
+        parametros: list = []
+        if session_id is not None:
+            # La sesion se cruza dentro del indice (si tiene algo indexable); la igualdad
+            # exacta la confirma la tabla
+            if any(caracter.isalnum() for caracter in session_id):
+                expresion += f" AND session_id : {_frase(session_id)}"
+            condiciones.append("mensajes.session_id = ?")
+            parametros.append(session_id)
+        parametros.insert(0, expresion)
+        if remitente:
+            condiciones.append("mensajes.sender = ?")
+            parametros.append(remitente)
+        if despues_de is not None:
+            condiciones.append("(mensajes_fts.rank > ? OR (mensajes_fts.rank = ? AND mensajes.rowid > ?))")
+            parametros.extend([despues_de[0], despues_de[0], despues_de[1]])
+        parametros.append(limite)
+        consulta = CONSULTA_BUSCAR.format(condiciones=" AND ".join(condiciones))
+        return [dict(fila) for fila in self._conexion.execute(consulta, parametros).fetchall()]
+
+    @staticmethod
+    def _condiciones_sesion(
+        session_id: str,
+        remitente: Optional[str],
+        desde_us: Optional[int],
+        hasta_us: Optional[int],
+    ) -> tuple[list[str], list]:
+        condiciones = ["session_id = ?"]
+        parametros: list = [session_id]
+        if remitente:
+            condiciones.append("sender = ?")
+            parametros.append(remitente)
+        if desde_us is not None:
+            condiciones.append("timestamp_us >= ?")
+            parametros.append(desde_us)
+        if hasta_us is not None:
+            condiciones.append("timestamp_us < ?")
+            parametros.append(hasta_us)
+        return condiciones, parametros
+
     def cerrar(self):
         self._conexion.close()
+
+
+def _tabla_sesion(remitente: Optional[str]) -> str:
+    """`mensajes` con el indice que sirve a la consulta por sesion (y sender).
+
+    Sin estadisticas el planificador prefiere idx_sesion_tiempo aun con sender y
+    cursor, y recorre los mensajes del otro sender; INDEXED BY lo fija (y falla en vez
+    de degradarse si el indice no existe).
+    """
+    indice = "idx_sesion_remitente_tiempo" if remitente else "idx_sesion_tiempo"
+    return f"mensajes INDEXED BY {indice}"
+
+
+def _total_contadores(fila: Optional[dict], remitente: Optional[str]) -> int:
+    if fila is None:
+        return 0
+    return fila[f"mensajes_{remitente}"] if remitente else fila["total_mensajes"]
+
+
+def _rango_abarca_sesion(fila: Optional[dict], desde_us: Optional[int], hasta_us: Optional[int]) -> bool:
+    """True si el rango [desde_us, hasta_us) incluye todos los mensajes de la sesion (o no tiene)."""
+    if fila is None or fila["total_mensajes"] == 0:
+        return True
+    return (desde_us is None or desde_us <= fila["primer_timestamp_us"]) and (
+        hasta_us is None or hasta_us > fila["ultimo_timestamp_us"]
+    )
+
+
+def _estimar_total(
+    fila: dict,
+    remitente: Optional[str],
+    desde_us: Optional[int],
+    hasta_us: Optional[int],
+    minimo: int,
+) -> int:
+    """Parte del contador de la sesion que cae en el rango, suponiendo mensajes parejos en el tiempo.
+
+    Nunca menos de `minimo` (las filas ya contadas) ni mas que el contador.
+    """
+    primero, despues_del_ultimo = fila["primer_timestamp_us"], fila["ultimo_timestamp_us"] + 1
+    inicio = max(desde_us if desde_us is not None else primero, primero)
+    fin = min(hasta_us if hasta_us is not None else despues_del_ultimo, despues_del_ultimo)
+    total = _total_contadores(fila, remitente)
+    proporcional = round(total * max(fin - inicio, 0) / (despues_del_ultimo - primero))
+    return min(max(proporcional, minimo), total)
+
+
+def _acumulados_por_sesion(filas: list[dict]) -> list[dict]:
+    """Agrupa mensajes nuevos por sesion en los incrementos que suma CONSULTA_ACUMULAR_SESION."""
+    acumulados: dict[str, dict] = {}
+    for datos in filas:
+        actual = acumulados.get(datos["session_id"])
+        if actual is None:
+            actual = acumulados[datos["session_id"]] = {
+                "session_id": datos["session_id"],
+                "total_mensajes": 0,
+                "mensajes_user": 0,
+                "mensajes_system": 0,
+                "total_palabras": 0,
+                "total_caracteres": 0,
+                "primer_timestamp": datos["timestamp"],
+                "primer_timestamp_us": datos["timestamp_us"],
+                "ultimo_timestamp": datos["timestamp"],
+                "ultimo_timestamp_us": datos["timestamp_us"],
+            }
+        actual["total_mensajes"] += 1
+        actual[f"mensajes_{datos['sender']}"] += 1
+        actual["total_palabras"] += datos["word_count"]
+        actual["total_caracteres"] += datos["character_count"]
+        if datos["timestamp_us"] < actual["primer_timestamp_us"]:
+            actual["primer_timestamp"], actual["primer_timestamp_us"] = datos["timestamp"], datos["timestamp_us"]
+        if datos["timestamp_us"] > actual["ultimo_timestamp_us"]:
+            actual["ultimo_timestamp"], actual["ultimo_timestamp_us"] = datos["timestamp"], datos["timestamp_us"]
+    return list(acumulados.values())
+
+
+def expresion_busqueda(texto: str) -> str:
+    """Convierte el texto del usuario en una expresion FTS5 segura.
+
+    Cada palabra va entre comillas (asi AND, OR, NEAR, `:` o `"` no se interpretan
+    como sintaxis) y todas deben aparecer. Un `*` al final de una palabra se
+    conserva como busqueda por prefijo.
+    """
+    terminos = []
+    for palabra in texto.split():
+        prefijo = palabra.endswith("*")
+        palabra = palabra.rstrip("*")
+        if palabra:
+            terminos.append(_frase(palabra) + ("*" if prefijo else ""))
+    return " ".join(terminos)
+
+
+def _frase(texto: str) -> str:
+    """Texto literal como frase FTS5 (entre comillas, con las comillas internas duplicadas)."""
+    return '"' + texto.replace('"', '""') + '"'
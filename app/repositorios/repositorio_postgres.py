@@ -0,0 +1,409 @@
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.configuracion import obtener_configuracion
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado, ErrorServicioNoDisponible
+from app.metricas import medir_operacion
+from app.repositorios.repositorio_base import RepositorioMensajesBase
+from app.repositorios.repositorio_mensajes import (
+    _acumulados_por_sesion,
+    _estimar_total,
+    _rango_abarca_sesion,
+    _total_contadores,
+)
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool, PoolTimeout
+except ImportError:  # dependencia opcional: solo hace falta con MOTOR_BASE_DATOS=postgres
+    psycopg = None
+
+ESQUEMA_POSTGRES = """
+CREATE TABLE IF NOT EXISTS mensajes (
+    -- Orden de insercion; desempata la busqueda y sirve de cursor (como el rowid de SQLite)
+    id BIGINT GENERATED ALWAYS AS IDENTITY UNIQUE,
+    -- Intercalacion "C": mismo orden binario que SQLite, asi el cursor (timestamp_us,
+    -- message_id) recorre las sesiones igual en los dos motores
+    message_id TEXT COLLATE "C" PRIMARY KEY,
+    session_id TEXT COLLATE "C" NOT NULL,
+    content TEXT NOT NULL,
+    "timestamp" TEXT NOT NULL,
+    timestamp_us BIGINT NOT NULL,
+    sender TEXT COLLATE "C" NOT NULL CHECK(sender IN ('user', 'system')),
+    word_count INTEGER NOT NULL,
+    character_count INTEGER NOT NULL,
+    processed_at TEXT NOT NULL,
+    contenido_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+);
+
+CREATE INDEX IF NOT EXISTS idx_sesion_tiempo ON mensajes(session_id, timestamp_us, message_id);
+CREATE INDEX IF NOT EXISTS idx_sesion_remitente_tiempo ON mensajes(session_id, sender, timestamp_us, message_id);
+CREATE INDEX IF NOT EXISTS idx_contenido_tsv ON mensajes USING GIN (contenido_tsv);
+
+CREATE TABLE IF NOT EXISTS sesiones (
+    session_id TEXT COLLATE "C" PRIMARY KEY,
+    total_mensajes INTEGER NOT NULL,
+    mensajes_user INTEGER NOT NULL,
+    mensajes_system INTEGER NOT NULL,
+    total_palabras BIGINT NOT NULL,
+    total_caracteres BIGINT NOT NULL,
+    primer_timestamp TEXT NOT NULL,
+    primer_timestamp_us BIGINT NOT NULL,
+    ultimo_timestamp TEXT NOT NULL,
+    ultimo_timestamp_us BIGINT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0
+);
+"""
+
+COLUMNAS = (
+    "message_id", "session_id", "content", "timestamp", "timestamp_us",
+    "sender", "word_count", "character_count", "processed_at",
+)
+_SELECCION = ", ".join(f'"{columna}"' for columna in COLUMNAS)
+
+CONSULTA_INSERTAR = f"""
+    INSERT INTO mensajes ({_SELECCION})
+    VALUES (%(message_id)s, %(session_id)s, %(content)s, %(timestamp)s, %(timestamp_us)s, %(sender)s,
+            %(word_count)s, %(character_count)s, %(processed_at)s)
+    ON CONFLICT (message_id) DO NOTHING
+    RETURNING message_id
+"""
+
+# Tabla de paso del COPY; una por conexion y se vacia al confirmar
+CONSULTA_TABLA_LOTE = """
+    CREATE TEMP TABLE IF NOT EXISTS lote_mensajes (
+        posicion INTEGER NOT NULL,
+        message_id TEXT COLLATE "C" NOT NULL,
+        session_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        "timestamp" TEXT NOT NULL,
+        timestamp_us BIGINT NOT NULL,
+        sender TEXT NOT NULL,
+        word_count INTEGER NOT NULL,
+        character_count INTEGER NOT NULL,
+        processed_at TEXT NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+
+# La primera aparicion de cada id dentro del lote; los ya existentes se saltan
+CONSULTA_INSERTAR_LOTE = f"""
+    INSERT INTO mensajes ({_SELECCION})
+    SELECT {_SELECCION} FROM (
+        SELECT DISTINCT ON (message_id) * FROM lote_mensajes ORDER BY message_id, posicion
+    ) AS primeros
+    ORDER BY posicion
+    ON CONFLICT (message_id) DO NOTHING
+    RETURNING message_id
+"""
+
+CONSULTA_ACUMULAR_SESION = """
+    INSERT INTO sesiones (session_id, total_mensajes, mensajes_user, mensajes_system,
+                          total_palabras, total_caracteres, primer_timestamp, primer_timestamp_us,
+                          ultimo_timestamp, ultimo_timestamp_us, version)
+    VALUES (%(session_id)s, %(total_mensajes)s, %(mensajes_user)s, %(mensajes_system)s,
+            %(total_palabras)s, %(total_caracteres)s, %(primer_timestamp)s, %(primer_timestamp_us)s,
+            %(ultimo_timestamp)s, %(ultimo_timestamp_us)s, 1)
+    ON CONFLICT (session_id) DO UPDATE SET
+        total_mensajes = sesiones.total_mensajes + excluded.total_mensajes,
+        mensajes_user = sesiones.mensajes_user + excluded.mensajes_user,
+        mensajes_system = sesiones.mensajes_system + excluded.mensajes_system,
+        total_palabras = sesiones.total_palabras + excluded.total_palabras,
+        total_caracteres = sesiones.total_caracteres + excluded.total_caracteres,
+        primer_timestamp = CASE WHEN excluded.primer_timestamp_us < sesiones.primer_timestamp_us
+                                THEN excluded.primer_timestamp ELSE sesiones.primer_timestamp END,
+        primer_timestamp_us = LEAST(sesiones.primer_timestamp_us, excluded.primer_timestamp_us),
+        ultimo_timestamp = CASE WHEN excluded.ultimo_timestamp_us > sesiones.ultimo_timestamp_us
+                                THEN excluded.ultimo_timestamp ELSE sesiones.ultimo_timestamp END,
+        ultimo_timestamp_us = GREATEST(sesiones.ultimo_timestamp_us, excluded.ultimo_timestamp_us),
+        version = sesiones.version + 1
+"""
+
+# ts_rank se niega para ordenar como bm25 en SQLite (menor = mas relevante) y se pasa a
+# float8 para que el puntaje del cursor vuelva exacto. El fragmento se arma solo para la pagina.
+CONSULTA_BUSCAR = f"""
+    SELECT pagina.*,
+           ts_headline('simple', pagina.content, to_tsquery('simple', %(consulta)s),
+                       'StartSel=<mark>, StopSel=</mark>, MaxWords=16, MinWords=4') AS fragmento_texto
+    FROM (
+        SELECT {_SELECCION}, id AS rowid,
+               -ts_rank(contenido_tsv, to_tsquery('simple', %(consulta)s))::float8 AS puntaje
+        FROM mensajes
+        WHERE {{condiciones}}
+        ORDER BY puntaje, id
+        LIMIT %(limite)s
+    ) AS pagina
+    ORDER BY puntaje, rowid
+"""
+
+
+def crear_pool_postgres(url: Optional[str] = None) -> "ConnectionPool":
+    """Pool de conexiones PostgreSQL con el tamano y la espera del pool SQLite."""
+    if psycopg is None:
+        raise RuntimeError('MOTOR_BASE_DATOS=postgres requiere: pip install "psycopg[binary,pool]"')
+    config = obtener_configuracion()
+    url = url or config.URL_POSTGRES
+    if not url:
+        raise ValueError("MOTOR_BASE_DATOS=postgres requiere URL_POSTGRES")
+    return ConnectionPool(
+        url,
+        min_size=1,
+        max_size=config.TAMANO_POOL_CONEXIONES,
+        timeout=config.ESPERA_POOL_SEGUNDOS,
+        kwargs={"autocommit": True, "row_factory": dict_row},
+        check=ConnectionPool.check_connection,
+        name="mensajes",
+        open=True,
+    )
+
+
+@contextmanager
+def conexion_postgres(pool: "ConnectionPool") -> Iterator["psycopg.Connection"]:
+    """Toma una conexion del pool para una operacion y siempre la devuelve al final."""
+    try:
+        conexion = pool.getconn()
+    except PoolTimeout:
+        raise ErrorServicioNoDisponible("No hay conexiones disponibles con la base de datos")
+    try:
+        yield conexion
+    finally:
+        # El pool descarta cualquier transaccion a medias (p. ej. una exportacion cortada)
+        pool.putconn(conexion)
+
+
+def inicializar_postgres(conexion: "psycopg.Connection") -> None:
+    """Crea tablas e indices si no existen."""
+    with conexion.transaction():
+        conexion.execute(ESQUEMA_POSTGRES)
+
+
+class RepositorioMensajesPostgres(RepositorioMensajesBase):
+    """Acceso a datos sobre PostgreSQL.
+
+    Recibe una conexion en autocommit con filas como dict (las del pool de
+    `crear_pool_postgres`); cada escritura abre su propia transaccion.
+    """
+
+    def __init__(self, conexion: "psycopg.Connection"):
+        self._conexion = conexion
+
+    @medir_operacion("guardar_mensaje")
+    def guardar_mensaje(self, datos: dict) -> None:
+        with self._conexion.transaction():
+            if self._conexion.execute(CONSULTA_INSERTAR, datos).fetchone() is None:
+                raise ErrorMensajeDuplicado(datos["message_id"])
+            self._conexion.cursor().executemany(CONSULTA_ACUMULAR_SESION, _acumulados_por_sesion([datos]))
+
+    @medir_operacion("guardar_mensajes_lote")
+    def guardar_mensajes_lote(self, lote: list[dict]) -> set[int]:
+        """Carga el lote con COPY en una tabla temporal y lo inserta con ON CONFLICT DO NOTHING.
+
+        Retorna las posiciones que no se guardaron (id existente o repetido antes en el lote).
+        """
+        if not lote:
+            return set()
+        with self._conexion.transaction():
+            cursor = self._conexion.cursor()
+            cursor.execute(CONSULTA_TABLA_LOTE)
+            with cursor.copy(f"COPY lote_mensajes (posicion, {_SELECCION}) FROM STDIN") as copia:
+                for posicion, datos in enumerate(lote):
+                    copia.write_row((posicion, *(datos[columna] for columna in COLUMNAS)))
+            creados = {fila["message_id"] for fila in cursor.execute(CONSULTA_INSERTAR_LOTE).fetchall()}
+
+            duplicados: set[int] = set()
+            nuevos: list[dict] = []
+            for posicion, datos in enumerate(lote):
+                if datos["message_id"] in creados:
+                    creados.discard(datos["message_id"])
+                    nuevos.append(datos)
+                else:
+                    duplicados.add(posicion)
+            cursor.executemany(CONSULTA_ACUMULAR_SESION, _acumulados_por_sesion(nuevos))
+        return duplicados
+
+    @medir_operacion("obtener_mensajes_por_sesion")
+    def obtener_mensajes_por_sesion(
+        self,
+        session_id: str,
+        limite: int = 50,
+        desplazamiento: int = 0,
+        remitente: Optional[str] = None,
+        despues_de: Optional[tuple[int, str]] = None,
+        incluir_total: bool = True,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+    ) -> tuple[list[dict], Optional[int]]:
+        """Igual que en SQLite: orden (timestamp_us, message_id), cursor y rango sobre el indice compuesto."""
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+
+        total = None
+        if incluir_total:
+            total, _ = self.contar_mensajes_sesion(session_id, remitente, desde_us, hasta_us)
+
+        if despues_de is not None:
+            condiciones.append("(timestamp_us, message_id) > (%s, %s)")
+            parametros.extend(despues_de)
+
+        consulta = f"""
+            SELECT {_SELECCION} FROM mensajes
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY timestamp_us ASC, message_id ASC
+            LIMIT %s OFFSET %s
+        """
+        parametros.extend([limite, desplazamiento])
+        return self._conexion.execute(consulta, parametros).fetchall(), total
+
+    @medir_operacion("contar_mensajes_sesion")
+    def contar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        maximo_exacto: int = 0,
+    ) -> tuple[int, bool]:
+        """Igual que en SQLite: contadores de `sesiones`, o conteo con tope y estimacion si hay rango."""
+        fila = self._conexion.execute(
+            "SELECT total_mensajes, mensajes_user, mensajes_system, primer_timestamp_us, ultimo_timestamp_us "
+            "FROM sesiones WHERE session_id = %s",
+            (session_id,),
+        ).fetchone()
+        if _rango_abarca_sesion(fila, desde_us, hasta_us):
+            return _total_contadores(fila, remitente), True
+
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+        seleccion = f"SELECT 1 FROM mensajes WHERE {' AND '.join(condiciones)}"
+        if maximo_exacto > 0:
+            seleccion += " LIMIT %s"
+            parametros.append(maximo_exacto + 1)
+        consulta = f"SELECT COUNT(*) AS total FROM ({seleccion}) AS filas"
+        total = self._conexion.execute(consulta, parametros).fetchone()["total"]
+        if maximo_exacto <= 0 or total <= maximo_exacto:
+            return total, True
+        return _estimar_total(fila, remitente, desde_us, hasta_us, minimo=total), False
+
+    def iterar_mensajes_sesion(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        tamano_bloque: int = 500,
+    ) -> Iterator[dict]:
+        """Recorre la sesion con un cursor del servidor, trayendo `tamano_bloque` filas a la vez.
+
+        El cursor vive en una transaccion de solo lectura que queda abierta hasta que el
+        iterador se agota o se cierra.
+        """
+        condiciones, parametros = self._condiciones_sesion(session_id, remitente, desde_us, hasta_us)
+        with self._conexion.transaction():
+            with self._conexion.cursor(name="exportacion_sesion") as cursor:
+                cursor.itersize = tamano_bloque
+                cursor.execute(
+                    f"""
+                    SELECT {_SELECCION} FROM mensajes
+                    WHERE {' AND '.join(condiciones)}
+                    ORDER BY timestamp_us ASC, message_id ASC
+                    """,
+                    parametros,
+                )
+                yield from cursor
+
+    @medir_operacion("obtener_mensaje")
+    def obtener_mensaje(self, message_id: str, session_id: str) -> Optional[dict]:
+        return self._conexion.execute(
+            f"SELECT {_SELECCION} FROM mensajes WHERE message_id = %s AND session_id = %s",
+            (message_id, session_id),
+        ).fetchone()
+
+    @medir_operacion("obtener_estadisticas_sesion")
+    def obtener_estadisticas_sesion(self, session_id: str) -> Optional[dict]:
+        return self._conexion.execute(
+            "SELECT * FROM sesiones WHERE session_id = %s AND total_mensajes > 0", (session_id,)
+        ).fetchone()
+
+    @medir_operacion("obtener_version_sesion")
+    def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        fila = self._conexion.execute("SELECT version FROM sesiones WHERE session_id = %s", (session_id,)).fetchone()
+        return fila["version"] if fila is not None else None
+
+    @medir_operacion("obtener_ultima_posicion")
+    def obtener_ultima_posicion(self, session_id: str) -> Optional[tuple[int, str]]:
+        fila = self._conexion.execute(
+            "SELECT timestamp_us, message_id FROM mensajes WHERE session_id = %s "
+            "ORDER BY timestamp_us DESC, message_id DESC LIMIT 1",
+            (session_id,),
+        ).fetchone()
+        return (fila["timestamp_us"], fila["message_id"]) if fila is not None else None
+
+    @medir_operacion("buscar_mensajes")
+    def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        despues_de: Optional[tuple[float, int]] = None,
+    ) -> list[dict]:
+        """Busqueda con tsvector/GIN ordenada por relevancia (ts_rank) y luego por id.
+
+        Los terminos se tratan igual que en SQLite (literales, `*` final = prefijo), pero
+        la configuracion 'simple' no quita tildes: "cancion" no encuentra "canción".
+        """
+        consulta = expresion_tsquery(texto)
+        if not consulta:
+            return []
+        condiciones = ["contenido_tsv @@ to_tsquery('simple', %(consulta)s)"]
+        parametros: dict = {"consulta": consulta, "limite": limite}
+        if session_id is not None:
+            condiciones.append("session_id = %(session_id)s")
+            parametros["session_id"] = session_id
+        if remitente:
+            condiciones.append("sender = %(remitente)s")
+            parametros["remitente"] = remitente
+        if despues_de is not None:
+            condiciones.append(
+                "(-ts_rank(contenido_tsv, to_tsquery('simple', %(consulta)s))::float8, id) > (%(puntaje)s, %(rowid)s)"
+            )
+            parametros["puntaje"], parametros["rowid"] = despues_de
+        consulta_sql = CONSULTA_BUSCAR.format(condiciones=" AND ".join(condiciones))
+        return self._conexion.execute(consulta_sql, parametros).fetchall()
+
+    @staticmethod
+    def _condiciones_sesion(
+        session_id: str,
+        remitente: Optional[str],
+        desde_us: Optional[int],
+        hasta_us: Optional[int],
+    ) -> tuple[list[str], list]:
+        condiciones = ["session_id = %s"]
+        parametros: list = [session_id]
+        if remitente:
+            condiciones.append("sender = %s")
+            parametros.append(remitente)
+        if desde_us is not None:
+            condiciones.append("timestamp_us >= %s")
+            parametros.append(desde_us)
+        if hasta_us is not None:
+            condiciones.append("timestamp_us < %s")
+            parametros.append(hasta_us)
+        return condiciones, parametros
+
+    def cerrar(self):
+        self._conexion.close()
+
+
+def expresion_tsquery(texto: str) -> str:
+    """Convierte el texto del usuario en una tsquery segura: todos los terminos, literales.
+
+    Cada palabra va como lexema entre comillas simples (asi &, |, !, <-> o `:` no se
+    interpretan) y un `*` final se convierte en busqueda por prefijo (`:*`).
+    """
+    terminos = []
+    for palabra in texto.split():
+        prefijo = palabra.endswith("*")
+        palabra = palabra.rstrip("*")
+        if palabra:
+            literal = palabra.replace("\\", "\\\\").replace("'", "''")
+            terminos.append(f"'{literal}'" + (":*" if prefijo else ""))
+    return " & ".join(terminos)
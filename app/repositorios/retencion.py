@@ -0,0 +1,253 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from app.configuracion import obtener_configuracion
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.repositorio_mensajes import _acumulados_por_sesion
+
+registro = logging.getLogger(__name__)
+
+# Limites de los timestamps de una sesion vacia, para que el proximo UPSERT los reemplace
+_MAXIMO_US = 2**63 - 1
+_MINIMO_US = -(2**63)
+
+# Modos aceptados para PRAGMA wal_checkpoint (se validan antes de interpolarlos)
+_MODOS_CHECKPOINT = {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}
+
+CONSULTA_SESIONES_VENCIDAS = """
+    SELECT session_id FROM sesiones WHERE total_mensajes > 0 AND primer_timestamp_us < ?
+"""
+
+CONSULTA_SESIONES_EXCEDIDAS = """
+    SELECT session_id, total_mensajes - :maximo AS exceso FROM sesiones WHERE total_mensajes > :maximo
+"""
+
+# Los mas antiguos de la sesion, por idx_sesion_tiempo
+CONSULTA_MAS_ANTIGUOS = """
+    SELECT rowid, * FROM mensajes
+    WHERE session_id = ? AND timestamp_us < ?
+    ORDER BY timestamp_us, message_id
+    LIMIT ?
+"""
+
+# Resta a la sesion los agregados de los mensajes borrados y sube su version
+CONSULTA_DESCONTAR_SESION = """
+    UPDATE sesiones SET
+        total_mensajes = total_mensajes - :total_mensajes,
+        mensajes_user = mensajes_user - :mensajes_user,
+        mensajes_system = mensajes_system - :mensajes_system,
+        total_palabras = total_palabras - :total_palabras,
+        total_caracteres = total_caracteres - :total_caracteres,
+        primer_timestamp = :nuevo_primer_timestamp,
+        primer_timestamp_us = :nuevo_primer_timestamp_us,
+        ultimo_timestamp = CASE WHEN :vacia THEN '' ELSE ultimo_timestamp END,
+        ultimo_timestamp_us = CASE WHEN :vacia THEN :minimo_us ELSE ultimo_timestamp_us END,
+        version = version + 1
+    WHERE session_id = :session_id
+"""
+
+
+class Retencion:
+    """Aplica la politica de retencion a una base: archiva y borra mensajes vencidos.
+
+    Un mensaje vence si su timestamp tiene mas de `dias` dias, o si su sesion pasa de
+    `maximo_por_sesion` mensajes (se van los mas antiguos). Cada lote se lee, se
+    agrega al archivo .ndjson.gz, se borra y se descuenta de `sesiones` en una sola
+    transaccion corta, con una pausa entre lotes para que los escritores de la API no
+    esperen el candado. Al terminar se liberan paginas (vacuum incremental) y se hace
+    checkpoint del WAL.
+
+    Una sesion que queda sin mensajes conserva su fila en `sesiones` (con totales en 0)
+    para que su version, y con ella el ETag, siga subiendo.
+    """
+
+    def __init__(
+        self,
+        ruta_bd: str | None = None,
+        dias: float | None = None,
+        maximo_por_sesion: int | None = None,
+        directorio_archivo: str | None = None,
+        tamano_lote: int | None = None,
+        pausa_ms: float | None = None,
+        intervalo: float | None = None,
+        al_borrar: Optional[Callable[[str], None]] = None,
+        al_borrar_ids: Optional[Callable[[list[str]], None]] = None,
+    ):
+        config = obtener_configuracion()
+        self._ruta = ruta_bd or config.RUTA_BASE_DATOS
+        self._dias = dias if dias is not None else config.RETENCION_DIAS
+        self._maximo = maximo_por_sesion if maximo_por_sesion is not None else config.MAXIMO_MENSAJES_POR_SESION
+        self._directorio = (
+            directorio_archivo if directorio_archivo is not None else config.DIRECTORIO_ARCHIVO_RETENCION
+        )
+        self._tamano_lote = tamano_lote or config.TAMANO_LOTE_RETENCION
+        self._pausa = (pausa_ms if pausa_ms is not None else config.PAUSA_LOTES_RETENCION_MS) / 1000
+        self._intervalo = intervalo if intervalo is not None else config.INTERVALO_RETENCION_SEGUNDOS
+        self._modo_checkpoint = config.MODO_CHECKPOINT_RETENCION.upper()
+        if self._modo_checkpoint not in _MODOS_CHECKPOINT:
+            raise ValueError(f"MODO_CHECKPOINT_RETENCION invalido: {config.MODO_CHECKPOINT_RETENCION}")
+        self._paginas_vacuum = config.PAGINAS_VACUUM_INCREMENTAL
+        # Para invalidar lo que haya en memoria de una sesion (p. ej. el cache de paginas)
+        self._al_borrar = al_borrar
+        # Recibe los message_id de cada lote borrado (p. ej. para liberarlos del DirectorioIds)
+        self._al_borrar_ids = al_borrar_ids
+
+        self._archivo: gzip.GzipFile | None = None
+        self._detener = threading.Event()
+        self._hilo: threading.Thread | None = None
+        self.ejecuciones = 0
+        self.mensajes_borrados = 0
+        self.paginas_liberadas = 0
+        self.errores = 0
+        self.ultimo_error: str | None = None
+
+    @property
+    def activa(self) -> bool:
+        return self._dias > 0 or self._maximo > 0
+
+    def iniciar(self) -> None:
+        """Arranca el hilo que aplica la politica cada `intervalo` segundos (nada si no hay politica)."""
+        if self.activa and self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._vigilar, name="retencion", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        """Termina el hilo; una pasada en curso se corta al final del lote actual."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def ejecutar(self, ahora_us: int | None = None) -> dict:
+        """Una pasada completa. Retorna cuantos mensajes se borraron y cuantas paginas se liberaron."""
+        if ahora_us is None:
+            ahora_us = time.time_ns() // 1000
+        conexion = obtener_conexion(self._ruta)
+        borrados = 0
+        paginas = 0
+        try:
+            if self._dias > 0:
+                corte = ahora_us - int(self._dias * 86_400_000_000)
+                sesiones = [fila[0] for fila in conexion.execute(CONSULTA_SESIONES_VENCIDAS, (corte,))]
+                for session_id in sesiones:
+                    borrados += self._recortar_sesion(conexion, session_id, corte, None)
+            if self._maximo > 0:
+                excedidas = conexion.execute(CONSULTA_SESIONES_EXCEDIDAS, {"maximo": self._maximo}).fetchall()
+                for session_id, exceso in excedidas:
+                    borrados += self._recortar_sesion(conexion, session_id, _MAXIMO_US, exceso)
+            if borrados:
+                paginas = self._compactar(conexion)
+        finally:
+            self._cerrar_archivo()
+            conexion.close()
+        self.ejecuciones += 1
+        self.mensajes_borrados += borrados
+        self.paginas_liberadas += paginas
+        return {"borrados": borrados, "paginas_liberadas": paginas}
+
+    def _recortar_sesion(
+        self, conexion: sqlite3.Connection, session_id: str, corte_us: int, cantidad: int | None
+    ) -> int:
+        """Borra por lotes los mensajes de la sesion anteriores a `corte_us` (a lo sumo `cantidad`)."""
+        borrados = 0
+        while not self._detener.is_set() and (cantidad is None or borrados < cantidad):
+            limite = self._tamano_lote if cantidad is None else min(self._tamano_lote, cantidad - borrados)
+            en_lote = self._borrar_lote(conexion, session_id, corte_us, limite)
+            borrados += en_lote
+            if en_lote < limite:
+                break
+            self._detener.wait(self._pausa)
+        if borrados and self._al_borrar is not None:
+            self._al_borrar(session_id)
+        return borrados
+
+    def _borrar_lote(self, conexion: sqlite3.Connection, session_id: str, corte_us: int, limite: int) -> int:
+        # IMMEDIATE: otro proceso aplicando la misma politica no puede leer este lote antes del borrado
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            filas = [dict(fila) for fila in conexion.execute(CONSULTA_MAS_ANTIGUOS, (session_id, corte_us, limite))]
+            if not filas:
+                conexion.rollback()
+                return 0
+            rowids = [fila.pop("rowid") for fila in filas]
+            # Se archiva antes del commit: si algo falla despues, el lote queda en la base
+            # y a lo sumo se archiva dos veces
+            self._archivar(filas)
+            conexion.execute(
+                f"DELETE FROM mensajes WHERE rowid IN ({','.join('?' * len(rowids))})", rowids
+            )
+            descuento = _acumulados_por_sesion(filas)[0]
+            primero = conexion.execute(
+                "SELECT timestamp, timestamp_us FROM mensajes WHERE session_id = ? "
+                "ORDER BY timestamp_us, message_id LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            descuento.update(
+                nuevo_primer_timestamp=primero[0] if primero is not None else "",
+                nuevo_primer_timestamp_us=primero[1] if primero is not None else _MAXIMO_US,
+                vacia=primero is None,
+                minimo_us=_MINIMO_US,
+            )
+            conexion.execute(CONSULTA_DESCONTAR_SESION, descuento)
+            conexion.commit()
+        except BaseException:
+            conexion.rollback()
+            raise
+        if self._al_borrar_ids is not None:
+            self._al_borrar_ids([fila["message_id"] for fila in filas])
+        return len(filas)
+
+    def _archivar(self, filas: list[dict]) -> None:
+        if not self._directorio:
+            return
+        if self._archivo is None:
+            os.makedirs(self._directorio, exist_ok=True)
+            base = os.path.splitext(os.path.basename(self._ruta))[0]
+            marca = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            ruta = os.path.join(self._directorio, f"{base}-{marca}-{os.getpid()}.ndjson.gz")
+            self._archivo = gzip.open(ruta, "xb")
+        for fila in filas:
+            self._archivo.write(json.dumps(fila, ensure_ascii=False).encode("utf-8") + b"\n")
+        # Cada lote queda completo y en disco antes de borrarlo de la base
+        self._archivo.flush()
+        os.fsync(self._archivo.fileobj.fileno())
+
+    def _cerrar_archivo(self) -> None:
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def _compactar(self, conexion: sqlite3.Connection) -> int:
+        """Devuelve al sistema las paginas libres (si la base usa auto_vacuum incremental) y hace checkpoint."""
+        liberadas = 0
+        if conexion.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            while not self._detener.is_set():
+                libres = conexion.execute("PRAGMA freelist_count").fetchone()[0]
+                if libres == 0:
+                    break
+                paso = min(libres, self._paginas_vacuum)
+                conexion.execute(f"PRAGMA incremental_vacuum({int(paso)})").fetchall()
+                liberadas += paso
+                self._detener.wait(self._pausa)
+        conexion.execute(f"PRAGMA wal_checkpoint({self._modo_checkpoint})").fetchall()
+        return liberadas
+
+    def _vigilar(self) -> None:
+        while not self._detener.wait(self._intervalo):
+            try:
+                self.ejecutar()
+                self.ultimo_error = None
+            except Exception as exc:
+                # Cualquier fallo de una pasada (base, archivo o una fila rara) no detiene el hilo:
+                # se cuenta en retencion_errores_total y se reintenta en la siguiente
+                self.errores += 1
+                self.ultimo_error = str(exc)
+                registro.exception("Fallo la pasada de retencion sobre %s", self._ruta)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from app.configuracion import obtener_configuracion
+
+# Bytes aproximados por mensaje ademas de su contenido (dicts, ids, metadata)
+_BYTES_BASE_POR_MENSAJE = 400
+# Las generaciones se reparten en ranuras fijas para no crecer con cada sesion nueva
+_RANURAS_GENERACION = 4096
+
+
+def estimar_bytes_pagina(mensajes: list[dict]) -> int:
+    return sum(len(mensaje["content"]) + _BYTES_BASE_POR_MENSAJE for mensaje in mensajes)
+
+
+class CachePaginas:
+    """Cache LRU con expiracion para paginas de mensajes, invalidable por sesion.
+
+    Las claves son tuplas cuyo primer elemento es el session_id. Cada sesion lleva un
+    numero de generacion que sube al invalidarla: una lectura que empezo antes de una
+    escritura no puede guardar su pagina (ya vieja) despues de la invalidacion. Las
+    generaciones viven en ranuras por hash, asi que una colision solo hace que alguna
+    pagina no se guarde, nunca que se sirva una vieja.
+    """
+
+    def __init__(
+        self,
+        max_entradas: int | None = None,
+        max_bytes: int | None = None,
+        ttl_segundos: float | None = None,
+        reloj: Callable[[], float] = time.monotonic,
+    ):
+        config = obtener_configuracion()
+        self._max_entradas = max_entradas or config.CACHE_PAGINAS_MAX_ENTRADAS
+        self._max_bytes = max_bytes or config.CACHE_PAGINAS_MAX_BYTES
+        self._ttl = ttl_segundos if ttl_segundos is not None else config.CACHE_PAGINAS_TTL_SEGUNDOS
+        self._reloj = reloj
+        self._candado = threading.Lock()
+        # clave -> (expira_en, bytes, valor)
+        self._entradas: OrderedDict[tuple, tuple[float, int, Any]] = OrderedDict()
+        self._claves_por_sesion: dict[str, set[tuple]] = {}
+        self._generaciones = [0] * _RANURAS_GENERACION
+        self._bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def generacion(self, session_id: str) -> int:
+        return self._generaciones[hash(session_id) % _RANURAS_GENERACION]
+
+    def obtener(self, clave: tuple[Hashable, ...]) -> Any | None:
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            if entrada[0] <= self._reloj():
+                self._quitar(clave)
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[2]
+
+    def guardar(self, clave: tuple[Hashable, ...], valor: Any, tamano: int, generacion: int) -> None:
+        session_id = clave[0]
+        if tamano > self._max_bytes:
+            return
+        with self._candado:
+            if self.generacion(session_id) != generacion:
+                return
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (self._reloj() + self._ttl, tamano, valor)
+            self._claves_por_sesion.setdefault(session_id, set()).add(clave)
+            self._bytes += tamano
+            while len(self._entradas) > self._max_entradas or self._bytes > self._max_bytes:
+                mas_antigua = next(iter(self._entradas))
+                self._quitar(mas_antigua)
+                self.desalojos += 1
+
+    def invalidar_sesion(self, session_id: str) -> None:
+        with self._candado:
+            self._generaciones[hash(session_id) % _RANURAS_GENERACION] += 1
+            for clave in self._claves_por_sesion.pop(session_id, set()):
+                entrada = self._entradas.pop(clave, None)
+                if entrada is not None:
+                    self._bytes -= entrada[1]
+            self.invalidaciones += 1
+
+    def estadisticas(self) -> dict:
+        with self._candado:
+            return {
+                "hits": self.aciertos,
+                "misses": self.fallos,
+                "evictions": self.desalojos,
+                "invalidations": self.invalidaciones,
+                "entries": len(self._entradas),
+                "bytes": self._bytes,
+            }
+
+    def _quitar(self, clave: tuple) -> None:
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+        claves = self._claves_por_sesion.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._claves_por_sesion[clave[0]]
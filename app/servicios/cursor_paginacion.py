@@ -0,0 +1,49 @@
+import base64
+import binascii
+import json
+
+from app.excepciones.excepciones_api import ErrorCursorInvalido
+
+
+def codificar_cursor(clave_orden: int, message_id: str) -> str:
+    """Codifica la posicion (timestamp_us, message_id) como un token opaco."""
+    crudo = json.dumps([clave_orden, message_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError):
+        raise ErrorCursorInvalido(cursor)
+    if (
+        not isinstance(valores, list)
+        or len(valores) != 2
+        or type(valores[0]) is not int
+        or not isinstance(valores[1], str)
+    ):
+        raise ErrorCursorInvalido(cursor)
+    return valores[0], valores[1]
+
+
+def codificar_cursor_busqueda(puntaje: float, rowid: int) -> str:
+    """Codifica la posicion de un resultado de busqueda (puntaje bm25, rowid) como un token opaco."""
+    crudo = json.dumps([puntaje, rowid], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor_busqueda(cursor: str) -> tuple[float, int]:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError):
+        raise ErrorCursorInvalido(cursor)
+    if (
+        not isinstance(valores, list)
+        or len(valores) != 2
+        or type(valores[0]) not in (int, float)
+        or type(valores[1]) is not int
+    ):
+        raise ErrorCursorInvalido(cursor)
+    return float(valores[0]), valores[1]
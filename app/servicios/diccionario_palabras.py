@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import NamedTuple
+
+from app.configuracion import obtener_configuracion
+from app.servicios.filtro_contenido import FiltroContenido
+
+
+class VersionDiccionario(NamedTuple):
+    """Filtro compilado junto con la version de las palabras que contiene. Nunca se modifica."""
+
+    filtro: FiltroContenido
+    version: str
+    palabras: int
+
+
+def leer_palabras(ruta: str) -> list[str]:
+    """Una palabra por linea; se ignoran lineas vacias y las que empiezan con '#'."""
+    with open(ruta, encoding="utf-8") as archivo:
+        lineas = (linea.strip() for linea in archivo)
+        return [linea for linea in lineas if linea and not linea.startswith("#")]
+
+
+def compilar_version(palabras: list[str]) -> VersionDiccionario:
+    normalizadas = sorted({palabra.lower() for palabra in palabras})
+    version = hashlib.sha256("\n".join(normalizadas).encode("utf-8")).hexdigest()[:12]
+    return VersionDiccionario(FiltroContenido(palabras_prohibidas=palabras), version, len(normalizadas))
+
+
+class DiccionarioPalabras:
+    """Diccionario de palabras prohibidas que se puede recargar sin reiniciar el proceso.
+
+    Con `ruta` las palabras se leen de ese archivo y un hilo revisa cada `intervalo`
+    segundos si cambio; de ser asi compila un filtro nuevo fuera de las solicitudes y
+    lo publica reemplazando una sola referencia. Las solicitudes solo leen `actual`,
+    asi que nunca esperan una recompilacion ni ven un filtro a medio armar. Sin
+    `ruta` se usa la lista fija (la de la configuracion por defecto).
+    """
+
+    def __init__(
+        self,
+        ruta: str | None = None,
+        intervalo: float | None = None,
+        palabras: list[str] | None = None,
+    ):
+        config = obtener_configuracion()
+        self._ruta = ruta
+        self._intervalo = intervalo if intervalo is not None else config.INTERVALO_RECARGA_PALABRAS_SEGUNDOS
+        self._firma: tuple[int, int] | None = None
+        if ruta:
+            self._firma = self._firma_archivo()
+            palabras = leer_palabras(ruta)
+        self.actual = compilar_version(palabras if palabras is not None else config.PALABRAS_PROHIBIDAS)
+
+        self._coincidencias: Counter[str] = Counter()
+        self._candado = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: threading.Thread | None = None
+        self.recargas = 0
+        self.recargas_fallidas = 0
+        self.ultimo_error: str | None = None
+
+    @property
+    def filtro(self) -> FiltroContenido:
+        return self.actual.filtro
+
+    def iniciar(self) -> None:
+        """Arranca el hilo que vigila el archivo (no hace nada sin `ruta`)."""
+        if self._ruta and self._hilo is None:
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._vigilar, name="diccionario-palabras", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def recargar_si_cambio(self) -> bool:
+        """Recompila si el archivo cambio. Retorna True si se publico una version nueva.
+
+        Si el archivo no se puede leer se conserva la version anterior.
+        """
+        if not self._ruta:
+            return False
+        try:
+            firma = self._firma_archivo()
+            if firma == self._firma:
+                return False
+            nueva = compilar_version(leer_palabras(self._ruta))
+        except (OSError, UnicodeDecodeError) as exc:
+            self.recargas_fallidas += 1
+            self.ultimo_error = str(exc)
+            return False
+        self._firma = firma
+        if nueva.version == self.actual.version:
+            return False
+        self.actual = nueva
+        self.recargas += 1
+        self.ultimo_error = None
+        return True
+
+    def registrar_coincidencias(self, palabras: list[str]) -> None:
+        if palabras:
+            with self._candado:
+                self._coincidencias.update(palabras)
+
+    def coincidencias(self) -> dict[str, int]:
+        with self._candado:
+            return dict(self._coincidencias)
+
+    def _vigilar(self) -> None:
+        while not self._detener.wait(self._intervalo):
+            self.recargar_si_cambio()
+
+    def _firma_archivo(self) -> tuple[int, int]:
+        estado = os.stat(self._ruta)
+        return estado.st_mtime_ns, estado.st_size
+
+
+@lru_cache
+def obtener_diccionario_palabras() -> DiccionarioPalabras:
+    """Diccionario compartido del proceso, desde RUTA_PALABRAS_PROHIBIDAS o la lista fija."""
+    return DiccionarioPalabras(ruta=obtener_configuracion().RUTA_PALABRAS_PROHIBIDAS or None)
@@ -3,27 +3,87 @@ import re
 from app.configuracion import obtener_configuracion
 
 
+def _expresion_desde_trie(nodo: dict) -> str:
+    """Convierte un trie de caracteres en una expresion regular equivalente.
+
+    Agrupar por prefijos comunes evita que el motor de regex pruebe cada palabra
+    por separado en cada posicion del texto, lo que importa con miles de palabras.
+    """
+    alternativas = [
+        re.escape(caracter) + _expresion_desde_trie(hijo)
+        for caracter, hijo in sorted(nodo.items())
+        if caracter
+    ]
+    if not alternativas:
+        return ""
+    if len(alternativas) == 1:
+        expresion = alternativas[0]
+    else:
+        expresion = "(?:" + "|".join(alternativas) + ")"
+    if "" in nodo:
+        expresion = f"(?:{expresion})?"
+    return expresion
+
+
+def compilar_patron(palabras: list[str]) -> re.Pattern | None:
+    """Compila todas las palabras en un unico patron con limites de palabra."""
+    trie: dict = {}
+    for palabra in palabras:
+        if not palabra:
+            continue
+        nodo = trie
+        for caracter in palabra.lower():
+            nodo = nodo.setdefault(caracter, {})
+        nodo[""] = {}
+    if not trie:
+        return None
+    return re.compile(rf"\b{_expresion_desde_trie(trie)}\b", re.IGNORECASE)
+
+
 class FiltroContenido:
-    """Filtro simple de palabras inapropiadas."""
+    """Filtro de palabras inapropiadas.
+
+    Todas las palabras se compilan una sola vez en un patron, de modo que detectar
+    y enmascarar es una sola pasada sobre el texto sin importar cuantas haya.
+    """
 
     def __init__(self, palabras_prohibidas: list[str] | None = None):
         config = obtener_configuracion()
-        self._palabras_prohibidas = palabras_prohibidas or config.PALABRAS_PROHIBIDAS
+        self._palabras_prohibidas = (
+            palabras_prohibidas if palabras_prohibidas is not None else config.PALABRAS_PROHIBIDAS
+        )
+        # Forma en minusculas -> palabra tal como fue configurada
+        self._canonicas: dict[str, str] = {}
+        for palabra in self._palabras_prohibidas:
+            self._canonicas.setdefault(palabra.lower(), palabra)
+        self._patron = compilar_patron(self._palabras_prohibidas)
 
     def contiene_contenido_inapropiado(self, texto: str) -> tuple[bool, list[str]]:
         """Verifica si el texto tiene palabras prohibidas. Retorna (bool, palabras_encontradas)."""
-        texto_lower = texto.lower()
-        encontradas = []
-        for palabra in self._palabras_prohibidas:
-            patron = rf"\b{re.escape(palabra.lower())}\b"
-            if re.search(patron, texto_lower):
-                encontradas.append(palabra)
-        return len(encontradas) > 0, encontradas
+        if self._patron is None:
+            return False, []
+        encontradas: dict[str, None] = {}
+        for coincidencia in self._patron.finditer(texto):
+            encontradas[self._canonica(coincidencia.group())] = None
+        return len(encontradas) > 0, list(encontradas)
 
     def filtrar_contenido(self, texto: str) -> str:
         """Reemplaza palabras prohibidas con asteriscos."""
-        resultado = texto
-        for palabra in self._palabras_prohibidas:
-            patron = re.compile(rf"\b{re.escape(palabra)}\b", re.IGNORECASE)
-            resultado = patron.sub("*" * len(palabra), resultado)
-        return resultado
+        return self.analizar(texto)[0]
+
+    def analizar(self, texto: str) -> tuple[str, list[str]]:
+        """Detecta y enmascara en una sola pasada. Retorna (texto_filtrado, palabras_encontradas)."""
+        if self._patron is None:
+            return texto, []
+        encontradas: dict[str, None] = {}
+
+        def _enmascarar(coincidencia: re.Match) -> str:
+            encontrada = coincidencia.group()
+            encontradas[self._canonica(encontrada)] = None
+            return "*" * len(encontrada)
+
+        resultado = self._patron.sub(_enmascarar, texto)
+        return resultado, list(encontradas)
+
+    def _canonica(self, encontrada: str) -> str:
+        return self._canonicas.get(encontrada.lower(), encontrada)
@@ -0,0 +1,119 @@
+from typing import AsyncIterator, Optional
+
+from pydantic_core import to_json
+
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
+from app.excepciones.excepciones_api import ErrorSesionNoEncontrada
+from app.servicios.cursor_paginacion import codificar_cursor, decodificar_cursor
+from app.servicios.ids_recientes import IdsRecientes
+from app.servicios.publicador_mensajes import PublicadorMensajes, RevisionSesion, Suscripcion
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+
+# Mensajes por consulta al ponerse al dia desde la base
+_MENSAJES_POR_CONSULTA = 100
+# Ids enviados que se recuerdan para no repetir un mensaje que llega por ambas vias
+_IDS_ENVIADOS = 1024
+
+
+def posicion_mensaje(mensaje: dict) -> tuple[int, str]:
+    """Posicion (timestamp_us, message_id) de un mensaje en el orden de la sesion."""
+    return timestamp_a_epoch_us(mensaje["timestamp"]), mensaje["message_id"]
+
+
+def evento_mensaje(mensaje: dict) -> tuple[bytes, tuple[int, str]]:
+    """Evento SSE de un mensaje y su posicion (timestamp_us, message_id).
+
+    El `id` del evento es el cursor de esa posicion, asi el navegador lo reenvia en
+    `Last-Event-ID` al reconectarse.
+    """
+    posicion = posicion_mensaje(mensaje)
+    evento = b"id: " + codificar_cursor(*posicion).encode() + b"\nevent: message\ndata: " + to_json(mensaje) + b"\n\n"
+    return evento, posicion
+
+
+async def eventos_sesion(
+    servicio: ServicioMensajesAsincrono,
+    publicador: PublicadorMensajes,
+    suscripcion: Suscripcion,
+    cursor: Optional[str],
+    latido: float,
+) -> AsyncIterator[bytes]:
+    """Eventos SSE de una sesion: primero lo guardado despues de `cursor`, luego cada mensaje nuevo.
+
+    Los mensajes confirmados en este proceso llegan por la suscripcion sin leer la
+    base. Las escrituras de otros workers se buscan a lo sumo una vez por `latido` y
+    por sesion: el suscriptor que reclama la revision compara la version y, si cambio,
+    lee lo posterior a la ultima posicion leida de la base y lo reparte a todos por el
+    publicador (sin lo que ya se publico en este proceso). Esa posicion solo avanza con
+    lo leido de la base: un mensaje local con timestamp posterior no hace saltear los
+    de otros workers. Si la suscripcion se desborda el stream termina y el cliente
+    reanuda con `Last-Event-ID`.
+    """
+    session_id = suscripcion.session_id
+    enviados = IdsRecientes(_IDS_ENVIADOS)
+
+    async def _leer_desde(posicion: Optional[tuple[int, str]], version: int) -> AsyncIterator[dict]:
+        siguiente = codificar_cursor(*posicion) if posicion is not None else None
+        while True:
+            try:
+                mensajes, _, siguiente, _ = await servicio.obtener_mensajes_sesion(
+                    session_id,
+                    limite=_MENSAJES_POR_CONSULTA,
+                    cursor=siguiente,
+                    incluir_total=False,
+                    version=version,
+                )
+            except ErrorSesionNoEncontrada:
+                return
+            for mensaje in mensajes:
+                yield mensaje
+            if siguiente is None:
+                return
+
+    async def _revisar(revision: RevisionSesion) -> list[dict]:
+        """Lo que otros workers guardaron desde la ultima revision y aun no se publico aqui."""
+        version = await servicio.obtener_version_sesion(session_id)
+        if version is None or version == revision.version:
+            return []
+        remotos = []
+        async for mensaje in _leer_desde(revision.posicion, version):
+            revision.posicion = posicion_mensaje(mensaje)
+            if not revision.publicados.contiene(mensaje["message_id"]):
+                remotos.append(mensaje)
+        revision.version = version
+        return remotos
+
+    def _enviar(mensaje: dict) -> Optional[bytes]:
+        if enviados.contiene(mensaje["message_id"]):
+            return None
+        enviados.agregar(mensaje["message_id"])
+        return evento_mensaje(mensaje)[0]
+
+    # Ponerse al dia desde el cursor propio
+    posicion = decodificar_cursor(cursor) if cursor else None
+    version = await servicio.obtener_version_sesion(session_id)
+    if version is not None:
+        async for mensaje in _leer_desde(posicion, version):
+            posicion = posicion_mensaje(mensaje)
+            evento = _enviar(mensaje)
+            if evento is not None:
+                yield evento
+    publicador.iniciar_revision(session_id, posicion, version, latido)
+
+    while not suscripcion.desbordada:
+        eventos = [evento for evento in map(_enviar, await suscripcion.esperar(latido)) if evento is not None]
+        if suscripcion.desbordada:
+            break
+        revision = publicador.reclamar_revision(session_id)
+        if revision is not None:
+            try:
+                remotos = await _revisar(revision)
+            finally:
+                publicador.terminar_revision(revision, latido)
+            if remotos:
+                publicador.publicar(session_id, remotos)
+                eventos.extend(evento for evento in map(_enviar, remotos) if evento is not None)
+        for evento in eventos:
+            yield evento
+        if not eventos:
+            yield b": latido\n\n"
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+from app.configuracion import obtener_configuracion
+
+
+class IdsRecientes:
+    """Conjunto acotado (LRU) de message_id guardados hace poco por este proceso.
+
+    Sirve como chequeo previo barato: un reintento de un mensaje ya guardado se
+    detecta antes de pasar por el filtro y los metadatos. Un acierto siempre se
+    confirma contra la clave primaria, asi que un id que ya no exista (p. ej. por
+    retencion) no produce un falso duplicado.
+    """
+
+    def __init__(self, capacidad: int | None = None):
+        self._capacidad = capacidad or obtener_configuracion().CAPACIDAD_IDS_RECIENTES
+        self._ids: OrderedDict[str, None] = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def contiene(self, message_id: str) -> bool:
+        with self._candado:
+            if message_id in self._ids:
+                self._ids.move_to_end(message_id)
+                self.aciertos += 1
+                return True
+            self.fallos += 1
+            return False
+
+    def agregar(self, message_id: str) -> None:
+        with self._candado:
+            self._ids[message_id] = None
+            self._ids.move_to_end(message_id)
+            if len(self._ids) > self._capacidad:
+                self._ids.popitem(last=False)
+
+    def descartar(self, message_id: str) -> None:
+        with self._candado:
+            self._ids.pop(message_id, None)
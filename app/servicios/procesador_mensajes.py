@@ -1,46 +1,57 @@
 from datetime import datetime, timezone
 
-from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeProcesado, MetadatosMensaje
+from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeRegistro
+from app.servicios.diccionario_palabras import DiccionarioPalabras, obtener_diccionario_palabras
 from app.servicios.filtro_contenido import FiltroContenido
 from app.excepciones.excepciones_api import ErrorFormatoInvalido
+from app.metricas import obtener_registro_metricas
+
+_ETAPA = "mensajes_etapa_duracion_segundos"
 
 
 class ProcesadorMensajes:
     """Pipeline de procesamiento: validar -> filtrar -> metadatos."""
 
-    def __init__(self, filtro: FiltroContenido | None = None):
-        self._filtro = filtro or FiltroContenido()
-
-    def procesar(self, mensaje: MensajeEntrada) -> MensajeProcesado:
-        self._validar_formato(mensaje)
-        contenido_limpio = self._filtrar_contenido(mensaje.content)
-        metadatos = self._generar_metadatos(contenido_limpio)
-
-        return MensajeProcesado(
-            message_id=mensaje.message_id,
-            session_id=mensaje.session_id,
-            content=contenido_limpio,
-            timestamp=mensaje.timestamp,
-            sender=mensaje.sender,
-            metadata=metadatos,
+    def __init__(self, filtro: FiltroContenido | None = None, diccionario: DiccionarioPalabras | None = None):
+        # Un filtro explicito queda fijo; si no, se usa la version vigente del diccionario
+        self._filtro = filtro
+        self._diccionario = diccionario or (None if filtro else obtener_diccionario_palabras())
+
+    def procesar(self, mensaje: MensajeEntrada) -> MensajeRegistro:
+        metricas = obtener_registro_metricas()
+        with metricas.medir(_ETAPA, etapa="validacion_formato"):
+            self._validar_formato(mensaje)
+        with metricas.medir(_ETAPA, etapa="filtrado"):
+            contenido_limpio = self._filtrar_contenido(mensaje.content)
+        with metricas.medir(_ETAPA, etapa="metadatos"):
+            # str.split() corre en C: contar con un regex que no arme la lista es mas lento
+            palabras = len(contenido_limpio.split())
+            procesado_en = datetime.now(timezone.utc).isoformat()
+
+        return MensajeRegistro(
+            mensaje.message_id,
+            mensaje.session_id,
+            contenido_limpio,
+            mensaje.timestamp,
+            mensaje.timestamp_us,
+            mensaje.sender,
+            palabras,
+            len(contenido_limpio),
+            procesado_en,
         )
 
     def _validar_formato(self, mensaje: MensajeEntrada) -> None:
-        if not mensaje.content.strip():
+        # isspace() no copia el texto como strip(); content nunca llega vacio (min_length=1)
+        if mensaje.content.isspace():
             raise ErrorFormatoInvalido(
                 "El contenido del mensaje no puede estar vacio o ser solo espacios"
             )
 
     def _filtrar_contenido(self, contenido: str) -> str:
         """Si hay palabras inapropiadas, las reemplaza con asteriscos."""
-        es_inapropiado, _ = self._filtro.contiene_contenido_inapropiado(contenido)
-        if es_inapropiado:
-            return self._filtro.filtrar_contenido(contenido)
-        return contenido
-
-    def _generar_metadatos(self, contenido: str) -> MetadatosMensaje:
-        return MetadatosMensaje(
-            word_count=len(contenido.split()),
-            character_count=len(contenido),
-            processed_at=datetime.now(timezone.utc).isoformat(),
-        )
+        if self._diccionario is None:
+            return self._filtro.analizar(contenido)[0]
+        contenido_limpio, encontradas = self._diccionario.filtro.analizar(contenido)
+        self._diccionario.registrar_coincidencias(encontradas)
+        return contenido_limpio
+
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from app.configuracion import obtener_configuracion
+from app.servicios.ids_recientes import IdsRecientes
+
+# Ids publicados por sesion que se recuerdan para no volver a repartirlos al leerlos de la base
+_IDS_PUBLICADOS = 1024
+
+
+class Suscripcion:
+    """Mensajes nuevos de una sesion pendientes de enviar a un suscriptor.
+
+    Vive en el loop de eventos que la creo; el publicador le entrega mensajes desde
+    cualquier hilo a traves de ese loop. Mientras no llega nada no consume CPU: solo
+    espera su evento.
+    """
+
+    def __init__(self, session_id: str, capacidad: int, loop: asyncio.AbstractEventLoop):
+        self.session_id = session_id
+        self.loop = loop
+        self._capacidad = capacidad
+        self._pendientes: deque[dict] = deque()
+        self._aviso = asyncio.Event()
+        # Un suscriptor que no alcanza a consumir se desborda: se corta y debe reanudar por cursor
+        self.desbordada = False
+
+    async def esperar(self, tiempo: float) -> list[dict]:
+        """Mensajes pendientes; lista vacia si pasan `tiempo` segundos sin novedades."""
+        if not self._pendientes and not self.desbordada:
+            try:
+                await asyncio.wait_for(self._aviso.wait(), tiempo)
+            except asyncio.TimeoutError:
+                pass
+        self._aviso.clear()
+        mensajes = list(self._pendientes)
+        self._pendientes.clear()
+        return mensajes
+
+    def entregar(self, mensajes: list[dict]) -> bool:
+        """Encola mensajes (en el hilo del loop). Retorna True si con esto se desbordo."""
+        if self.desbordada:
+            return False
+        self._pendientes.extend(mensajes)
+        if len(self._pendientes) > self._capacidad:
+            self.desbordada = True
+            self._pendientes.clear()
+        self._aviso.set()
+        return self.desbordada
+
+
+class RevisionSesion:
+    """Lectura de la base compartida por los suscriptores de una sesion en este proceso.
+
+    Recuerda hasta donde se leyo (`posicion`, `version`) y los ids ya publicados, asi
+    las escrituras de otros workers se buscan una vez por sesion y por latido, no una
+    vez por suscriptor ni por cada mensaje local.
+    """
+
+    def __init__(self):
+        self.iniciada = False
+        self.posicion: Optional[tuple[int, str]] = None
+        self.version: Optional[int] = None
+        self.publicados = IdsRecientes(_IDS_PUBLICADOS)
+        self.proxima = 0.0
+        self.en_curso = False
+
+
+class PublicadorMensajes:
+    """Reparte en el proceso los mensajes recien guardados a los suscriptores de su sesion.
+
+    `publicar` se llama desde los hilos que confirman escrituras y agenda una sola
+    entrega por loop de eventos, sin importar cuantos suscriptores tenga la sesion.
+    Solo ve las escrituras de este proceso; las de otros workers las busca en la base
+    un suscriptor por sesion y por latido (ver `reclamar_revision` y `flujo_sesion`) y
+    las reparte por aqui al resto.
+    """
+
+    def __init__(self, capacidad_cola: int | None = None):
+        self._capacidad = capacidad_cola or obtener_configuracion().CAPACIDAD_COLA_SUSCRIPTOR
+        self._candado = threading.Lock()
+        self._por_sesion: dict[str, set[Suscripcion]] = {}
+        self._revisiones: dict[str, RevisionSesion] = {}
+        self.publicados = 0
+        self.desbordes = 0
+
+    @property
+    def suscriptores(self) -> int:
+        with self._candado:
+            return sum(len(suscripciones) for suscripciones in self._por_sesion.values())
+
+    def suscribir(self, session_id: str) -> Suscripcion:
+        """Crea una suscripcion ligada al loop en ejecucion."""
+        suscripcion = Suscripcion(session_id, self._capacidad, asyncio.get_running_loop())
+        with self._candado:
+            self._por_sesion.setdefault(session_id, set()).add(suscripcion)
+            self._revisiones.setdefault(session_id, RevisionSesion())
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        with self._candado:
+            suscripciones = self._por_sesion.get(suscripcion.session_id)
+            if suscripciones is not None:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self._por_sesion[suscripcion.session_id]
+                    del self._revisiones[suscripcion.session_id]
+
+    def iniciar_revision(
+        self, session_id: str, posicion: Optional[tuple[int, str]], version: Optional[int], intervalo: float
+    ) -> None:
+        """Fija desde donde se revisa la base, con lo que leyo el primer suscriptor al ponerse al dia."""
+        with self._candado:
+            revision = self._revisiones.get(session_id)
+            if revision is not None and not revision.iniciada:
+                revision.iniciada = True
+                revision.posicion = posicion
+                revision.version = version
+                revision.proxima = time.monotonic() + intervalo
+
+    def reclamar_revision(self, session_id: str) -> Optional[RevisionSesion]:
+        """La revision de la sesion si ya toca y nadie la esta haciendo; quien la recibe la termina."""
+        with self._candado:
+            revision = self._revisiones.get(session_id)
+            if revision is None or not revision.iniciada or revision.en_curso:
+                return None
+            if time.monotonic() < revision.proxima:
+                return None
+            revision.en_curso = True
+            return revision
+
+    def terminar_revision(self, revision: RevisionSesion, intervalo: float) -> None:
+        with self._candado:
+            revision.en_curso = False
+            revision.proxima = time.monotonic() + intervalo
+
+    def publicar(self, session_id: str, mensajes: list[dict]) -> None:
+        """Entrega los mensajes a los suscriptores de la sesion. Se puede llamar desde cualquier hilo."""
+        with self._candado:
+            suscripciones = list(self._por_sesion.get(session_id, ()))
+            if not suscripciones or not mensajes:
+                return
+            self.publicados += len(mensajes)
+            revision = self._revisiones[session_id]
+        for mensaje in mensajes:
+            revision.publicados.agregar(mensaje["message_id"])
+
+        por_loop: dict[asyncio.AbstractEventLoop, list[Suscripcion]] = {}
+        for suscripcion in suscripciones:
+            por_loop.setdefault(suscripcion.loop, []).append(suscripcion)
+        for loop, grupo in por_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._entregar, grupo, mensajes)
+            except RuntimeError:
+                # El loop ya se cerro (apagado); sus suscriptores no esperan nada
+                pass
+
+    def _entregar(self, suscripciones: list[Suscripcion], mensajes: list[dict]) -> None:
+        for suscripcion in suscripciones:
+            if suscripcion.entregar(mensajes):
+                self.desbordes += 1
@@ -1,34 +1,141 @@
-from typing import Optional
+from typing import Any, Iterator, Optional
 
-from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from pydantic import ValidationError
+from pydantic_core import to_json
+
+from app.repositorios.repositorio_base import RepositorioMensajesBase
+from app.servicios.cache_paginas import CachePaginas, estimar_bytes_pagina
+from app.servicios.cursor_paginacion import (
+    codificar_cursor,
+    codificar_cursor_busqueda,
+    decodificar_cursor,
+    decodificar_cursor_busqueda,
+)
+from app.servicios.ids_recientes import IdsRecientes
 from app.servicios.procesador_mensajes import ProcesadorMensajes
-from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeProcesado
-from app.excepciones.excepciones_api import ErrorSesionNoEncontrada
+from app.servicios.publicador_mensajes import PublicadorMensajes
+from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeRegistro
+from app.excepciones.excepciones_api import (
+    ErrorAPI,
+    ErrorMensajeDuplicado,
+    ErrorSesionNoEncontrada,
+    ErrorValidacion,
+)
 
 
 class ServicioMensajes:
     """Servicio principal que orquesta procesamiento y persistencia."""
 
-    def __init__(self, repositorio: RepositorioMensajes, procesador: ProcesadorMensajes | None = None):
+    def __init__(
+        self,
+        repositorio: RepositorioMensajesBase,
+        procesador: ProcesadorMensajes | None = None,
+        cache: CachePaginas | None = None,
+        ids_recientes: IdsRecientes | None = None,
+        idempotente: bool = False,
+        publicador: PublicadorMensajes | None = None,
+        maximo_conteo_exacto: int = 0,
+    ):
         self._repositorio = repositorio
         self._procesador = procesador or ProcesadorMensajes()
+        self._cache = cache
+        self._ids_recientes = ids_recientes
+        # Con idempotente, un reintento del mismo mensaje devuelve el original en vez de 409
+        self._idempotente = idempotente
+        # Avisa a los suscriptores de la sesion (streams) de cada mensaje confirmado
+        self._publicador = publicador
+        # Filas que se cuentan en un rango de tiempo antes de estimar el total (0 = contar todas)
+        self._maximo_conteo_exacto = maximo_conteo_exacto
+
+    def crear_mensaje(self, mensaje: MensajeEntrada) -> MensajeRegistro:
+        return self.registrar_mensaje(mensaje)[0]
+
+    def registrar_mensaje(self, mensaje: MensajeEntrada) -> tuple[MensajeRegistro, bool]:
+        """Procesa y guarda el mensaje. Retorna (mensaje, creado).
+
+        Un message_id visto hace poco se resuelve antes de procesar, con una busqueda
+        por clave primaria. En modo idempotente un duplicado de la misma sesion
+        retorna el mensaje guardado con creado=False; si no, ErrorMensajeDuplicado.
+        """
+        existente = self._buscar_reintento(mensaje.message_id, mensaje.session_id)
+        if existente is not None:
+            return self._resolver_duplicado(existente, mensaje.message_id), False
 
-    def crear_mensaje(self, mensaje: MensajeEntrada) -> MensajeProcesado:
         mensaje_procesado = self._procesador.procesar(mensaje)
+        try:
+            self._repositorio.guardar_mensaje(mensaje_procesado.fila())
+        except ErrorMensajeDuplicado:
+            self._recordar(mensaje.message_id)
+            if not self._idempotente:
+                raise
+            existente = self._repositorio.obtener_mensaje(mensaje.message_id, mensaje.session_id)
+            if existente is None:
+                raise
+            return MensajeRegistro.desde_fila(existente), False
 
-        # Aplanar datos para guardar en BD
-        datos = {
-            "message_id": mensaje_procesado.message_id,
-            "session_id": mensaje_procesado.session_id,
-            "content": mensaje_procesado.content,
-            "timestamp": mensaje_procesado.timestamp,
-            "sender": mensaje_procesado.sender,
-            "word_count": mensaje_procesado.metadata.word_count,
-            "character_count": mensaje_procesado.metadata.character_count,
-            "processed_at": mensaje_procesado.metadata.processed_at,
-        }
-        self._repositorio.guardar_mensaje(datos)
-        return mensaje_procesado
+        self._recordar(mensaje.message_id)
+        if self._cache is not None:
+            self._cache.invalidar_sesion(mensaje_procesado.session_id)
+        if self._publicador is not None:
+            self._publicador.publicar(mensaje_procesado.session_id, [mensaje_procesado.respuesta()])
+        return mensaje_procesado, True
+
+    def crear_mensajes_lote(self, entradas: list[Any]) -> list[dict]:
+        """Valida, procesa y guarda un lote en una transaccion.
+
+        Cada elemento se resuelve por separado: uno invalido o duplicado no impide
+        guardar el resto. Retorna un resultado por elemento, en el mismo orden.
+        """
+        resultados: list[dict | None] = [None] * len(entradas)
+        pendientes: list[tuple[int, MensajeRegistro]] = []
+
+        for indice, entrada in enumerate(entradas):
+            try:
+                mensaje = MensajeEntrada.model_validate(entrada)
+                existente = self._buscar_reintento(mensaje.message_id, mensaje.session_id)
+                if existente is not None:
+                    resultados[indice] = self._resultado_existente(indice, existente)
+                    continue
+                pendientes.append((indice, self._procesador.procesar(mensaje)))
+            except ValidationError as exc:
+                error = ErrorValidacion.desde_errores(exc.errors())
+                resultados[indice] = self._resultado_error(indice, entrada, error)
+            except ErrorAPI as exc:
+                resultados[indice] = self._resultado_error(indice, entrada, exc)
+
+        duplicados = self._repositorio.guardar_mensajes_lote(
+            [procesado.fila() for _, procesado in pendientes]
+        )
+
+        if self._cache is not None:
+            for session_id in {procesado.session_id for _, procesado in pendientes}:
+                self._cache.invalidar_sesion(session_id)
+
+        for posicion, (indice, procesado) in enumerate(pendientes):
+            self._recordar(procesado.message_id)
+            if posicion in duplicados:
+                existente = (
+                    self._repositorio.obtener_mensaje(procesado.message_id, procesado.session_id)
+                    if self._idempotente
+                    else None
+                )
+                resultados[indice] = (
+                    self._resultado_existente(indice, existente)
+                    if existente is not None
+                    else self._resultado_error(indice, procesado.fila(), ErrorMensajeDuplicado(procesado.message_id))
+                )
+            else:
+                resultados[indice] = {
+                    "index": indice,
+                    "message_id": procesado.message_id,
+                    "status": "success",
+                    "http_status": 201,
+                    "data": procesado.respuesta(),
+                }
+
+        if self._publicador is not None:
+            self._publicar_creados([resultado for resultado in resultados if resultado["http_status"] == 201])
+        return resultados
 
     def obtener_mensajes_sesion(
         self,
@@ -36,31 +143,238 @@ class ServicioMensajes:
         limite: int = 50,
         desplazamiento: int = 0,
         remitente: Optional[str] = None,
-    ) -> tuple[list[dict], int]:
-        mensajes, total = self._repositorio.obtener_mensajes_por_sesion(
+        cursor: Optional[str] = None,
+        incluir_total: bool = True,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        version: Optional[int] = None,
+    ) -> tuple[list[dict], Optional[int], Optional[str], bool]:
+        """Retorna (mensajes, total, siguiente_cursor, total_exacto).
+
+        Si se pasa `cursor` se ignora `desplazamiento`. `siguiente_cursor` es None
+        cuando no quedan mas mensajes. `total` es None sin `incluir_total`; con un rango
+        de tiempo muy poblado puede ser una estimacion (`total_exacto` False). `desde_us`/`hasta_us` acotan la pagina a un
+        rango de tiempo en microsegundos UTC. Con `version` (la de
+        `obtener_version_sesion`) el cache no sirve paginas de una version anterior,
+        aunque la escritura se haya hecho en otro proceso.
+        """
+        argumentos = (session_id, limite, desplazamiento, remitente, cursor, incluir_total, desde_us, hasta_us)
+        if self._cache is None:
+            return self._consultar_pagina(*argumentos)
+
+        clave = (session_id, remitente, limite, desplazamiento, cursor, incluir_total, desde_us, hasta_us, version)
+        pagina = self._cache.obtener(clave)
+        if pagina is None:
+            generacion = self._cache.generacion(session_id)
+            pagina = self._consultar_pagina(*argumentos)
+            self._cache.guardar(clave, pagina, estimar_bytes_pagina(pagina[0]), generacion)
+        return pagina
+
+    def _consultar_pagina(
+        self,
+        session_id: str,
+        limite: int,
+        desplazamiento: int,
+        remitente: Optional[str],
+        cursor: Optional[str],
+        incluir_total: bool,
+        desde_us: Optional[int],
+        hasta_us: Optional[int],
+    ) -> tuple[list[dict], Optional[int], Optional[str], bool]:
+        despues_de = decodificar_cursor(cursor) if cursor else None
+        # Se pide una fila extra solo para saber si existe una pagina siguiente
+        mensajes, _ = self._repositorio.obtener_mensajes_por_sesion(
             session_id=session_id,
-            limite=limite,
-            desplazamiento=desplazamiento,
+            limite=limite + 1,
+            desplazamiento=0 if despues_de else desplazamiento,
             remitente=remitente,
+            despues_de=despues_de,
+            incluir_total=False,
+            desde_us=desde_us,
+            hasta_us=hasta_us,
         )
 
-        if total == 0 and desplazamiento == 0:
-            raise ErrorSesionNoEncontrada(session_id)
+        if not mensajes and desplazamiento == 0 and despues_de is None:
+            if not self._existe_con_rango(session_id, desde_us, hasta_us):
+                raise ErrorSesionNoEncontrada(session_id)
+
+        total, total_exacto = None, True
+        if incluir_total:
+            total, total_exacto = self._repositorio.contar_mensajes_sesion(
+                session_id,
+                remitente=remitente,
+                desde_us=desde_us,
+                hasta_us=hasta_us,
+                maximo_exacto=self._maximo_conteo_exacto,
+            )
+
+        siguiente_cursor = None
+        if len(mensajes) > limite:
+            mensajes = mensajes[:limite]
+            ultimo = mensajes[-1]
+            siguiente_cursor = codificar_cursor(ultimo["timestamp_us"], ultimo["message_id"])
 
         # Reestructurar filas planas a formato con metadata anidada
-        resultado = []
-        for msg in mensajes:
-            resultado.append({
-                "message_id": msg["message_id"],
-                "session_id": msg["session_id"],
-                "content": msg["content"],
-                "timestamp": msg["timestamp"],
-                "sender": msg["sender"],
-                "metadata": {
-                    "word_count": msg["word_count"],
-                    "character_count": msg["character_count"],
-                    "processed_at": msg["processed_at"],
-                },
-            })
-
-        return resultado, total
+        resultado = [self._anidar(msg) for msg in mensajes]
+
+        return resultado, total, siguiente_cursor, total_exacto
+
+    def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        cursor: Optional[str] = None,
+    ) -> tuple[list[dict], Optional[str]]:
+        """Busqueda de texto completo. Retorna (resultados, siguiente_cursor).
+
+        Cada resultado es el mensaje con `score` (relevancia bm25, mayor es mejor) y
+        `snippet` (fragmento del contenido con los terminos entre <mark>).
+        """
+        despues_de = decodificar_cursor_busqueda(cursor) if cursor else None
+        filas = self._repositorio.buscar_mensajes(
+            texto, session_id=session_id, remitente=remitente, limite=limite + 1, despues_de=despues_de
+        )
+        siguiente_cursor = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente_cursor = codificar_cursor_busqueda(filas[-1]["puntaje"], filas[-1]["rowid"])
+        resultados = [
+            {**self._anidar(fila), "score": -fila["puntaje"], "snippet": fila["fragmento_texto"]}
+            for fila in filas
+        ]
+        return resultados, siguiente_cursor
+
+    def obtener_cursor_final(self, session_id: str) -> Optional[str]:
+        """Cursor que apunta al ultimo mensaje de la sesion (None si no tiene mensajes)."""
+        posicion = self._repositorio.obtener_ultima_posicion(session_id)
+        return codificar_cursor(*posicion) if posicion is not None else None
+
+    def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        """Version actual de la sesion (una fila de `sesiones`); None si no existe."""
+        return self._repositorio.obtener_version_sesion(session_id)
+
+    def obtener_estadisticas_sesion(self, session_id: str) -> dict:
+        """Totales de la sesion leidos de la tabla de agregados (una fila, sin recorrer mensajes)."""
+        fila = self._repositorio.obtener_estadisticas_sesion(session_id)
+        if fila is None:
+            raise ErrorSesionNoEncontrada(session_id)
+        return {
+            "session_id": fila["session_id"],
+            "message_count": fila["total_mensajes"],
+            "sender_counts": {"user": fila["mensajes_user"], "system": fila["mensajes_system"]},
+            "total_words": fila["total_palabras"],
+            "total_characters": fila["total_caracteres"],
+            "first_timestamp": fila["primer_timestamp"],
+            "last_timestamp": fila["ultimo_timestamp"],
+        }
+
+    def exportar_mensajes(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        lineas_por_bloque: int = 200,
+    ) -> Iterator[bytes]:
+        """Exporta la sesion completa como NDJSON (un mensaje JSON por linea).
+
+        La primera fila se lee antes de devolver el iterador para poder responder 404
+        (una sesion existente con el rango vacio exporta cero lineas); el resto se produce en bloques de `lineas_por_bloque` lineas a medida que se
+        consume, con memoria constante sin importar el tamano de la sesion.
+        """
+        filas = self._repositorio.iterar_mensajes_sesion(
+            session_id=session_id, remitente=remitente, desde_us=desde_us, hasta_us=hasta_us
+        )
+        primera = next(filas, None)
+        if primera is None:
+            filas.close()
+            if not self._existe_con_rango(session_id, desde_us, hasta_us):
+                raise ErrorSesionNoEncontrada(session_id)
+            return iter(())
+        return self._bloques_ndjson(primera, filas, lineas_por_bloque)
+
+    def _existe_con_rango(self, session_id: str, desde_us: Optional[int], hasta_us: Optional[int]) -> bool:
+        """Con since/until, un resultado vacio no implica que la sesion no exista: se mira su fila en `sesiones`."""
+        if desde_us is None and hasta_us is None:
+            return False
+        return self._repositorio.obtener_estadisticas_sesion(session_id) is not None
+
+    def _bloques_ndjson(self, primera: dict, filas: Iterator[dict], lineas_por_bloque: int) -> Iterator[bytes]:
+        bloque = [to_json(self._anidar(primera))]
+        try:
+            for fila in filas:
+                bloque.append(to_json(self._anidar(fila)))
+                if len(bloque) >= lineas_por_bloque:
+                    yield b"\n".join(bloque) + b"\n"
+                    bloque = []
+            if bloque:
+                yield b"\n".join(bloque) + b"\n"
+        finally:
+            filas.close()
+
+    @staticmethod
+    def _anidar(msg: dict) -> dict:
+        """Convierte una fila plana al formato con metadata anidada."""
+        return {
+            "message_id": msg["message_id"],
+            "session_id": msg["session_id"],
+            "content": msg["content"],
+            "timestamp": msg["timestamp"],
+            "sender": msg["sender"],
+            "metadata": {
+                "word_count": msg["word_count"],
+                "character_count": msg["character_count"],
+                "processed_at": msg["processed_at"],
+            },
+        }
+
+    def _buscar_reintento(self, message_id: str, session_id: str) -> Optional[dict]:
+        """Fila guardada si el id esta entre los recientes y existe en la BD."""
+        if self._ids_recientes is None or not self._ids_recientes.contiene(message_id):
+            return None
+        existente = self._repositorio.obtener_mensaje(message_id, session_id)
+        if existente is None:
+            # Borrado desde entonces, o el id pertenece a otra sesion: que decida el INSERT
+            self._ids_recientes.descartar(message_id)
+        return existente
+
+    def _recordar(self, message_id: str) -> None:
+        if self._ids_recientes is not None:
+            self._ids_recientes.agregar(message_id)
+
+    def _publicar_creados(self, resultados: list[dict]) -> None:
+        por_sesion: dict[str, list[dict]] = {}
+        for resultado in resultados:
+            por_sesion.setdefault(resultado["data"]["session_id"], []).append(resultado["data"])
+        for session_id, mensajes in por_sesion.items():
+            self._publicador.publicar(session_id, mensajes)
+
+    def _resolver_duplicado(self, existente: dict, message_id: str) -> MensajeRegistro:
+        if not self._idempotente:
+            raise ErrorMensajeDuplicado(message_id)
+        return MensajeRegistro.desde_fila(existente)
+
+    def _resultado_existente(self, indice: int, existente: dict) -> dict:
+        if not self._idempotente:
+            error = ErrorMensajeDuplicado(existente["message_id"])
+            return self._resultado_error(indice, {"message_id": existente["message_id"]}, error)
+        return {
+            "index": indice,
+            "message_id": existente["message_id"],
+            "status": "success",
+            "http_status": 200,
+            "data": self._anidar(existente),
+        }
+
+    @staticmethod
+    def _resultado_error(indice: int, entrada: Any, error: ErrorAPI) -> dict:
+        message_id = entrada.get("message_id") if isinstance(entrada, dict) else None
+        return {
+            "index": indice,
+            "message_id": message_id,
+            "status": "error",
+            "http_status": error.codigo_http,
+            "error": error.como_dict(),
+        }
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import Executor
+from contextlib import ExitStack
+from functools import partial
+from typing import Any, Callable, ContextManager, Iterator, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeRegistro
+from app.servicios.servicio_mensajes import ServicioMensajes
+
+T = TypeVar("T")
+
+ProveedorServicio = Callable[[], ContextManager[ServicioMensajes]]
+
+
+class ServicioMensajesAsincrono:
+    """Variante asincrona de ServicioMensajes para los handlers `async def`.
+
+    Cada operacion corre completa (procesamiento + SQLite) en un hilo del ejecutor
+    dedicado; la conexion se toma del pool dentro de ese hilo y solo mientras dura
+    la operacion. Sin ejecutor se usa el threadpool por defecto de Starlette.
+    """
+
+    def __init__(self, proveedor: ProveedorServicio, ejecutor: Executor | None = None):
+        self._proveedor = proveedor
+        self._ejecutor = ejecutor
+
+    async def crear_mensaje(self, mensaje: MensajeEntrada) -> MensajeRegistro:
+        return await self._ejecutar(lambda servicio: servicio.crear_mensaje(mensaje))
+
+    async def registrar_mensaje(self, mensaje: MensajeEntrada) -> tuple[MensajeRegistro, bool]:
+        return await self._ejecutar(lambda servicio: servicio.registrar_mensaje(mensaje))
+
+    async def crear_mensajes_lote(self, entradas: list[Any]) -> list[dict]:
+        return await self._ejecutar(lambda servicio: servicio.crear_mensajes_lote(entradas))
+
+    async def obtener_mensajes_sesion(
+        self,
+        session_id: str,
+        limite: int = 50,
+        desplazamiento: int = 0,
+        remitente: Optional[str] = None,
+        cursor: Optional[str] = None,
+        incluir_total: bool = True,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+        version: Optional[int] = None,
+    ) -> tuple[list[dict], Optional[int], Optional[str], bool]:
+        return await self._ejecutar(
+            lambda servicio: servicio.obtener_mensajes_sesion(
+                session_id=session_id,
+                limite=limite,
+                desplazamiento=desplazamiento,
+                remitente=remitente,
+                cursor=cursor,
+                incluir_total=incluir_total,
+                desde_us=desde_us,
+                hasta_us=hasta_us,
+                version=version,
+            )
+        )
+
+    async def buscar_mensajes(
+        self,
+        texto: str,
+        session_id: Optional[str] = None,
+        remitente: Optional[str] = None,
+        limite: int = 20,
+        cursor: Optional[str] = None,
+    ) -> tuple[list[dict], Optional[str]]:
+        return await self._ejecutar(
+            lambda servicio: servicio.buscar_mensajes(texto, session_id, remitente, limite, cursor)
+        )
+
+    async def obtener_cursor_final(self, session_id: str) -> Optional[str]:
+        return await self._ejecutar(lambda servicio: servicio.obtener_cursor_final(session_id))
+
+    async def obtener_version_sesion(self, session_id: str) -> Optional[int]:
+        return await self._ejecutar(lambda servicio: servicio.obtener_version_sesion(session_id))
+
+    async def obtener_estadisticas_sesion(self, session_id: str) -> dict:
+        return await self._ejecutar(lambda servicio: servicio.obtener_estadisticas_sesion(session_id))
+
+    async def exportar_mensajes(
+        self,
+        session_id: str,
+        remitente: Optional[str] = None,
+        desde_us: Optional[int] = None,
+        hasta_us: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """Abre la exportacion en el ejecutor y retorna un iterador sincrono de bloques.
+
+        El iterador conserva su conexion del pool hasta agotarse o cerrarse, asi que
+        puede consumirse desde el threadpool de una StreamingResponse.
+        """
+
+        def _abrir() -> Iterator[bytes]:
+            pila = ExitStack()
+            try:
+                servicio = pila.enter_context(self._proveedor())
+                bloques = servicio.exportar_mensajes(session_id, remitente, desde_us, hasta_us)
+            except BaseException:
+                pila.close()
+                raise
+            return _iterar_y_liberar(bloques, pila)
+
+        return await self._en_ejecutor(_abrir)
+
+    async def _ejecutar(self, operacion: Callable[[ServicioMensajes], T]) -> T:
+        return await self._en_ejecutor(partial(self._con_servicio, operacion))
+
+    async def _en_ejecutor(self, tarea: Callable[[], T]) -> T:
+        if self._ejecutor is None:
+            return await run_in_threadpool(tarea)
+        return await asyncio.get_running_loop().run_in_executor(self._ejecutor, tarea)
+
+    def _con_servicio(self, operacion: Callable[[ServicioMensajes], T]) -> T:
+        with self._proveedor() as servicio:
+            return operacion(servicio)
+
+
+def _iterar_y_liberar(bloques: Iterator[bytes], pila: ExitStack) -> Iterator[bytes]:
+    with pila:
+        yield from bloques
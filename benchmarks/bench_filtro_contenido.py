@@ -0,0 +1,79 @@
+"""Compara el filtro por palabra (una regex por termino) contra el patron unico.
+
+Uso: python -m benchmarks.bench_filtro_contenido [--repeticiones 200]
+"""
+import argparse
+import random
+import re
+import string
+import timeit
+
+from app.servicios.filtro_contenido import FiltroContenido
+
+TAMANOS_DICCIONARIO = [10, 100, 1000, 5000]
+LARGO_TEXTO = 5000
+
+
+def _palabras_aleatorias(cantidad: int, semilla: int = 7) -> list[str]:
+    generador = random.Random(semilla)
+    palabras = set()
+    while len(palabras) < cantidad:
+        largo = generador.randint(4, 10)
+        palabras.add("".join(generador.choices(string.ascii_lowercase, k=largo)))
+    return sorted(palabras)
+
+
+def _texto_aleatorio(palabras_prohibidas: list[str], semilla: int = 11) -> str:
+    generador = random.Random(semilla)
+    trozos: list[str] = []
+    largo = 0
+    while largo < LARGO_TEXTO:
+        if generador.random() < 0.02:
+            trozo = generador.choice(palabras_prohibidas)
+        else:
+            trozo = "".join(generador.choices(string.ascii_lowercase, k=generador.randint(2, 9)))
+        trozos.append(trozo)
+        largo += len(trozo) + 1
+    return " ".join(trozos)[:LARGO_TEXTO]
+
+
+def _filtrar_por_palabra(palabras: list[str], texto: str) -> str:
+    """Implementacion anterior: detectar y luego enmascarar, una regex por palabra."""
+    texto_lower = texto.lower()
+    encontradas = [p for p in palabras if re.search(rf"\b{re.escape(p.lower())}\b", texto_lower)]
+    if not encontradas:
+        return texto
+    resultado = texto
+    for palabra in palabras:
+        patron = re.compile(rf"\b{re.escape(palabra)}\b", re.IGNORECASE)
+        resultado = patron.sub("*" * len(palabra), resultado)
+    return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'palabras':>9} {'por_palabra_us':>15} {'patron_unico_us':>16} {'compilar_ms':>12} {'mejora':>8}")
+    for tamano in TAMANOS_DICCIONARIO:
+        palabras = _palabras_aleatorias(tamano)
+        texto = _texto_aleatorio(palabras)
+
+        inicio = timeit.default_timer()
+        filtro = FiltroContenido(palabras_prohibidas=palabras)
+        compilar_ms = (timeit.default_timer() - inicio) * 1000
+        assert filtro.filtrar_contenido(texto) == _filtrar_por_palabra(palabras, texto)
+
+        # El metodo anterior es O(N) regex por mensaje: menos repeticiones con diccionarios grandes
+        repeticiones_antiguo = max(1, args.repeticiones * 10 // tamano)
+        antiguo = timeit.timeit(lambda: _filtrar_por_palabra(palabras, texto), number=repeticiones_antiguo)
+        nuevo = timeit.timeit(lambda: filtro.analizar(texto), number=args.repeticiones)
+
+        antiguo_us = antiguo / repeticiones_antiguo * 1e6
+        nuevo_us = nuevo / args.repeticiones * 1e6
+        print(f"{tamano:>9} {antiguo_us:>15.1f} {nuevo_us:>16.1f} {compilar_ms:>12.2f} {antiguo_us / nuevo_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
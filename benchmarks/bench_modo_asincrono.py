@@ -0,0 +1,57 @@
+"""Prueba de carga: threadpool por defecto de Starlette vs ejecutor de BD dedicado.
+
+Levanta la API con cada modo (HILOS_EJECUTOR_BD = 0 y N) sobre una BD temporal y
+mide una mezcla de POST y GET paginados con varios clientes concurrentes.
+
+Uso: python -m benchmarks.bench_modo_asincrono [--solicitudes 3000] [--concurrencia 64] [--hilos 8]
+"""
+import argparse
+import os
+import tempfile
+
+from app.configuracion import Configuracion
+from benchmarks.carga_http import ejecutar_carga, servidor_en_hilo
+
+
+def _generar(indice: int) -> tuple[str, str, object]:
+    sesion = f"sesion-{indice % 50}"
+    if indice % 4 == 3:
+        return "GET", f"/api/messages/{sesion}?limit=20", None
+    return "POST", "/api/messages", {
+        "message_id": f"msg-{indice}",
+        "session_id": sesion,
+        "content": "Hola, necesito ayuda con mi cuenta por favor",
+        "timestamp": "2023-06-15T14:30:00Z",
+        "sender": "user" if indice % 2 else "system",
+    }
+
+
+def _medir(hilos: int, args: argparse.Namespace) -> dict:
+    from app.principal import crear_aplicacion
+
+    with tempfile.TemporaryDirectory() as directorio:
+        Configuracion.RUTA_BASE_DATOS = os.path.join(directorio, "carga.db")
+        Configuracion.HILOS_EJECUTOR_BD = hilos
+        Configuracion.TAMANO_POOL_CONEXIONES = max(hilos, 40)
+        with servidor_en_hilo(crear_aplicacion()) as url:
+            return ejecutar_carga(url, args.solicitudes, args.concurrencia, _generar)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--solicitudes", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    parser.add_argument("--hilos", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'modo':<24} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+    for nombre, hilos in [("threadpool_por_defecto", 0), (f"ejecutor_dedicado_{args.hilos}", args.hilos)]:
+        resultado = _medir(hilos, args)
+        print(
+            f"{nombre:<24} {resultado['rendimiento_rps']:>8} {resultado['p50_ms']:>8} "
+            f"{resultado['p95_ms']:>8} {resultado['p99_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
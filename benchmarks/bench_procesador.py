@@ -0,0 +1,124 @@
+"""CPU y memoria por mensaje desde el procesamiento hasta la fila del INSERT y la respuesta.
+
+Compara el camino anterior (MetadatosMensaje + MensajeProcesado de Pydantic, aplanados
+a un dict para el INSERT y volcados con model_dump para la respuesta) con
+MensajeRegistro (dataclass con __slots__, fila() y respuesta()). La memoria se mide con
+tracemalloc: bloques y bytes que quedan vivos por cada mensaje procesado hasta su
+INSERT, y el pico de cada camino.
+
+Uso: python -m benchmarks.bench_procesador [--mensajes 20000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeProcesado, MensajeRegistro, MetadatosMensaje
+from app.metricas import obtener_registro_metricas
+from app.servicios.filtro_contenido import FiltroContenido
+from app.servicios.procesador_mensajes import _ETAPA, ProcesadorMensajes
+
+
+def _procesar_anterior(procesador: ProcesadorMensajes, mensaje: MensajeEntrada) -> MensajeProcesado:
+    metricas = obtener_registro_metricas()
+    with metricas.medir(_ETAPA, etapa="validacion_formato"):
+        if not mensaje.content.strip():
+            raise ValueError("contenido vacio")
+    with metricas.medir(_ETAPA, etapa="filtrado"):
+        contenido = procesador._filtrar_contenido(mensaje.content)
+    with metricas.medir(_ETAPA, etapa="metadatos"):
+        metadatos = MetadatosMensaje(
+            word_count=len(contenido.split()),
+            character_count=len(contenido),
+            processed_at=datetime.now(timezone.utc).isoformat(),
+        )
+    return MensajeProcesado(
+        message_id=mensaje.message_id,
+        session_id=mensaje.session_id,
+        content=contenido,
+        timestamp=mensaje.timestamp,
+        sender=mensaje.sender,
+        metadata=metadatos,
+    )
+
+
+def _salida_anterior(procesado: MensajeProcesado, mensaje: MensajeEntrada) -> tuple[dict, dict]:
+    fila = {
+        "message_id": procesado.message_id,
+        "session_id": procesado.session_id,
+        "content": procesado.content,
+        "timestamp": procesado.timestamp,
+        "timestamp_us": mensaje.timestamp_us,
+        "sender": procesado.sender,
+        "word_count": procesado.metadata.word_count,
+        "character_count": procesado.metadata.character_count,
+        "processed_at": procesado.metadata.processed_at,
+    }
+    return fila, procesado.model_dump()
+
+
+def _salida_registro(registro: MensajeRegistro, mensaje: MensajeEntrada) -> tuple[dict, dict]:
+    return registro.fila(), registro.respuesta()
+
+
+def _medir(
+    nombre: str,
+    procesar: Callable,
+    salida: Callable,
+    procesador: ProcesadorMensajes,
+    mensajes: list[MensajeEntrada],
+) -> None:
+    for mensaje in mensajes[:200]:
+        salida(procesar(procesador, mensaje), mensaje)
+
+    inicio = time.process_time()
+    for mensaje in mensajes:
+        salida(procesar(procesador, mensaje), mensaje)
+    cpu_us = (time.process_time() - inicio) / len(mensajes) * 1e6
+
+    # Lo que queda vivo por mensaje entre el procesamiento y el INSERT (p. ej. en un lote)
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    retenidos = [procesar(procesador, mensaje) for mensaje in mensajes]
+    despues = tracemalloc.take_snapshot()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    diferencia = despues.compare_to(antes, "filename")
+    bloques = sum(estadistica.count_diff for estadistica in diferencia)
+    memoria = sum(estadistica.size_diff for estadistica in diferencia)
+    del retenidos
+
+    print(
+        f"{nombre:10s} {cpu_us:7.2f} us/mensaje   {bloques / len(mensajes):5.1f} bloques/mensaje   "
+        f"{memoria / len(mensajes):7.0f} B/mensaje   pico {pico / 1024:8.0f} KiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mensajes", type=int, default=20000)
+    args = parser.parse_args()
+
+    procesador = ProcesadorMensajes(filtro=FiltroContenido())
+    mensajes = [
+        MensajeEntrada(
+            message_id=f"msg-{i}",
+            session_id=f"sesion-{i % 100}",
+            content="Hola, necesito ayuda con mi cuenta, el pago no aparece desde ayer",
+            timestamp="2023-06-15T14:30:00+02:00",
+            sender="user",
+        )
+        for i in range(args.mensajes)
+    ]
+    for mensaje in mensajes:
+        mensaje.timestamp_us  # el cache de MensajeEntrada no cuenta para ninguno de los dos
+
+    _medir("anterior", _procesar_anterior, _salida_anterior, procesador, mensajes)
+    _medir("registro", ProcesadorMensajes.procesar, _salida_registro, procesador, mensajes)
+
+
+if __name__ == "__main__":
+    main()
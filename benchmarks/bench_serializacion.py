@@ -0,0 +1,81 @@
+"""CPU por solicitud al serializar una pagina de 100 mensajes.
+
+Compara el camino anterior (validar el dict contra RespuestaListaMensajes y
+codificar con JSONResponse) con RespuestaJSONRapida (pydantic-core, una pasada).
+
+Uso: python -m benchmarks.bench_serializacion [--repeticiones 2000] [--mensajes 100]
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.controladores.respuesta_json import RespuestaJSONRapida
+from app.esquemas.esquema_respuesta import RespuestaListaMensajes
+
+
+def _pagina(cantidad: int) -> dict:
+    mensajes = [
+        {
+            "message_id": f"msg-{i}",
+            "session_id": "session-abcdef",
+            "content": "Hola, como puedo ayudarte hoy? " * 8,
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user" if i % 2 else "system",
+            "metadata": {
+                "word_count": 48,
+                "character_count": 248,
+                "processed_at": "2023-06-15T14:30:01.000000+00:00",
+            },
+        }
+        for i in range(cantidad)
+    ]
+    return {
+        "status": "success",
+        "data": mensajes,
+        "pagination": {"limit": cantidad, "offset": 0, "next_cursor": None},
+    }
+
+
+async def _camino_anterior(campo, contenido: dict) -> bytes:
+    serializado = await serialize_response(field=campo, response_content=contenido)
+    return JSONResponse(serializado).body
+
+
+def _camino_rapido(contenido: dict) -> bytes:
+    return RespuestaJSONRapida(contenido).body
+
+
+async def _medir(args: argparse.Namespace) -> None:
+    contenido = _pagina(args.mensajes)
+    campo = create_model_field(name="respuesta", type_=RespuestaListaMensajes, mode="serialization")
+    assert len(await _camino_anterior(campo, contenido)) == len(_camino_rapido(contenido))
+
+    inicio = time.process_time()
+    for _ in range(args.repeticiones):
+        await _camino_anterior(campo, contenido)
+    anterior_us = (time.process_time() - inicio) / args.repeticiones * 1e6
+
+    inicio = time.process_time()
+    for _ in range(args.repeticiones):
+        _camino_rapido(contenido)
+    rapido_us = (time.process_time() - inicio) / args.repeticiones * 1e6
+
+    print(f"mensajes por pagina: {args.mensajes}")
+    print(f"validacion + JSONResponse: {anterior_us:9.1f} us CPU/solicitud")
+    print(f"RespuestaJSONRapida:       {rapido_us:9.1f} us CPU/solicitud")
+    print(f"CPU ahorrada:              {anterior_us - rapido_us:9.1f} us ({anterior_us / rapido_us:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=2000)
+    parser.add_argument("--mensajes", type=int, default=100)
+    asyncio.run(_medir(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
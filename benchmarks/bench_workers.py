@@ -0,0 +1,71 @@
+"""Prueba de carga: rendimiento segun la cantidad de workers de `app.lanzador`.
+
+Para cada valor de --workers levanta el lanzador en un subproceso sobre una BD
+temporal y mide una mezcla de POST y GET paginados con varios clientes concurrentes.
+Con escrituras, el tope lo pone el candado de escritura de SQLite; combinar con
+MENSAJES_FRAGMENTOS_BASE_DATOS para repartirlo.
+
+Uso: python -m benchmarks.bench_workers [--workers 1 2 4] [--solicitudes 3000] [--concurrencia 64]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+
+from benchmarks.bench_modo_asincrono import _generar
+from benchmarks.carga_http import ejecutar_carga, puerto_libre
+
+
+@contextmanager
+def lanzador_en_subproceso(workers: int, ruta_bd: str, espera: float = 30.0) -> Iterator[str]:
+    """Ejecuta `python -m app.lanzador` y entrega la URL base cuando ya responde."""
+    puerto = puerto_libre()
+    entorno = dict(os.environ, MENSAJES_RUTA_BASE_DATOS=ruta_bd)
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "app.lanzador", "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(puerto)],
+        env=entorno,
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            try:
+                httpx.get(f"{url}/metrics", timeout=1)
+                break
+            except httpx.TransportError:
+                if proceso.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("El lanzador no llego a responder")
+                time.sleep(0.1)
+        yield url
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--solicitudes", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'workers':<8} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}  codigos")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as directorio:
+            with lanzador_en_subproceso(workers, os.path.join(directorio, "carga.db")) as url:
+                resultado = ejecutar_carga(url, args.solicitudes, args.concurrencia, _generar)
+        print(
+            f"{workers:<8} {resultado['rendimiento_rps']:>8} {resultado['p50_ms']:>8} "
+            f"{resultado['p95_ms']:>8} {resultado['p99_ms']:>8}  {resultado['codigos']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
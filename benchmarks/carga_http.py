@@ -0,0 +1,83 @@
+"""Utilidades para pruebas de carga HTTP contra la API levantada en el mismo proceso."""
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+# Construye la solicitud i-esima: (metodo, ruta, cuerpo_json | None)
+GeneradorSolicitud = Callable[[int], tuple[str, str, object]]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def servidor_en_hilo(app: FastAPI) -> Iterator[str]:
+    """Levanta uvicorn en un hilo y entrega la URL base; lo detiene al salir."""
+    puerto = puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{puerto}"
+    finally:
+        servidor.should_exit = True
+        hilo.join()
+
+
+def ejecutar_carga(url_base: str, solicitudes: int, concurrencia: int, generar: GeneradorSolicitud) -> dict:
+    """Envia `solicitudes` con `concurrencia` clientes simultaneos y resume latencias."""
+    return asyncio.run(_ejecutar_carga(url_base, solicitudes, concurrencia, generar))
+
+
+async def _ejecutar_carga(url_base: str, solicitudes: int, concurrencia: int, generar: GeneradorSolicitud) -> dict:
+    latencias: list[float] = []
+    codigos: dict[int, int] = {}
+    siguiente = iter(range(solicitudes))
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url_base, limits=limites, timeout=60) as cliente:
+        async def _trabajador():
+            for indice in siguiente:
+                metodo, ruta, cuerpo = generar(indice)
+                inicio = time.perf_counter()
+                respuesta = await cliente.request(metodo, ruta, json=cuerpo)
+                latencias.append(time.perf_counter() - inicio)
+                codigos[respuesta.status_code] = codigos.get(respuesta.status_code, 0) + 1
+
+        inicio_total = time.perf_counter()
+        await asyncio.gather(*(_trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio_total
+
+    return resumir_latencias(latencias, duracion) | {"codigos": codigos}
+
+
+def resumir_latencias(latencias: list[float], duracion: float) -> dict:
+    ordenadas = sorted(latencias)
+
+    def _percentil(p: float) -> float:
+        if not ordenadas:
+            return 0.0
+        return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))] * 1000
+
+    return {
+        "solicitudes": len(ordenadas),
+        "duracion_s": round(duracion, 3),
+        "rendimiento_rps": round(len(ordenadas) / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(_percentil(50), 3),
+        "p95_ms": round(_percentil(95), 3),
+        "p99_ms": round(_percentil(99), 3),
+        "media_ms": round(statistics.fmean(ordenadas) * 1000, 3) if ordenadas else 0.0,
+    }
@@ -0,0 +1,64 @@
+"""Compara dos archivos de `benchmarks.suite` y falla si hay regresiones.
+
+Una regresion es un p95 que sube, o un rendimiento que baja, mas que la tolerancia
+relativa. Sale con codigo 1 si encuentra alguna, para usarlo como paso de CI.
+
+Uso: python -m benchmarks.comparar base.json actual.json [--tolerancia 0.15]
+"""
+import argparse
+import json
+import sys
+
+# metrica -> True si un valor mas alto es peor
+METRICAS = {"p95_ms": True, "p99_ms": True, "rendimiento_rps": False}
+
+
+def comparar(base: dict, actual: dict, tolerancia: float, metricas: dict[str, bool] = METRICAS) -> list[str]:
+    """Retorna una linea por cada metrica que empeoro mas que `tolerancia`."""
+    regresiones: list[str] = []
+    for nombre, resumen_base in base["resultados"].items():
+        resumen_actual = actual["resultados"].get(nombre)
+        if resumen_actual is None:
+            continue
+        for metrica, mayor_es_peor in metricas.items():
+            anterior, nuevo = resumen_base.get(metrica), resumen_actual.get(metrica)
+            if not anterior or nuevo is None:
+                continue
+            cambio = (nuevo - anterior) / anterior
+            if (cambio if mayor_es_peor else -cambio) > tolerancia:
+                regresiones.append(f"{nombre}.{metrica}: {anterior} -> {nuevo} ({cambio:+.1%})")
+    return regresiones
+
+
+def main(argumentos: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("actual")
+    parser.add_argument("--tolerancia", type=float, default=0.15)
+    args = parser.parse_args(argumentos)
+
+    with open(args.base, encoding="utf-8") as archivo:
+        base = json.load(archivo)
+    with open(args.actual, encoding="utf-8") as archivo:
+        actual = json.load(archivo)
+
+    print(f"{'benchmark':<38} {'p95 base':>10} {'p95 actual':>11} {'ops/s base':>11} {'ops/s actual':>13}")
+    for nombre, resumen in actual["resultados"].items():
+        anterior = base["resultados"].get(nombre, {})
+        print(
+            f"{nombre:<38} {anterior.get('p95_ms', '-'):>10} {resumen['p95_ms']:>11} "
+            f"{anterior.get('rendimiento_rps', '-'):>11} {resumen['rendimiento_rps']:>13}"
+        )
+
+    regresiones = comparar(base, actual, args.tolerancia)
+    if regresiones:
+        print(f"\nRegresiones (tolerancia {args.tolerancia:.0%}):")
+        for linea in regresiones:
+            print(f"  {linea}")
+        return 1
+    print("\nSin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
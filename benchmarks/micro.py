@@ -0,0 +1,73 @@
+"""Utilidades para microbenchmarks: medir llamadas y poblar bases grandes."""
+import random
+import sqlite3
+import time
+from typing import Callable
+
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
+from app.repositorios.base_datos import inicializar_base_datos, obtener_conexion, reconstruir_tabla_sesiones
+from app.repositorios.repositorio_mensajes import CONSULTA_INSERTAR
+from benchmarks.carga_http import resumir_latencias
+
+# Primer timestamp de los datos sinteticos; cada mensaje avanza un segundo
+_INICIO_US = timestamp_a_epoch_us("2023-01-01T00:00:00Z")
+
+
+def medir_llamadas(funcion: Callable[[], object], repeticiones: int, calentamiento: int = 20) -> dict:
+    """Ejecuta `funcion` varias veces y resume la latencia de cada llamada (p50/p95/p99)."""
+    for _ in range(calentamiento):
+        funcion()
+    latencias: list[float] = []
+    inicio_total = time.perf_counter()
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        latencias.append(time.perf_counter() - inicio)
+    return resumir_latencias(latencias, time.perf_counter() - inicio_total)
+
+
+def poblar_base_datos(ruta: str, filas: int, sesiones: int, tamano_bloque: int = 50_000) -> int:
+    """Llena `ruta` con `filas` mensajes repartidos en `sesiones` sesiones.
+
+    Si la base ya tiene al menos `filas` mensajes no hace nada, asi se puede
+    reutilizar entre corridas. Retorna la cantidad de mensajes en la base.
+    """
+    inicializar_base_datos(ruta)
+    conexion = obtener_conexion(ruta)
+    try:
+        existentes = conexion.execute("SELECT COUNT(*) FROM mensajes").fetchone()[0]
+        if existentes >= filas:
+            return existentes
+        conexion.execute("PRAGMA synchronous=OFF")
+        generador = random.Random(3)
+        for inicio in range(existentes, filas, tamano_bloque):
+            bloque = [_fila_sintetica(i, sesiones, generador) for i in range(inicio, min(filas, inicio + tamano_bloque))]
+            with conexion:
+                conexion.executemany(CONSULTA_INSERTAR, bloque)
+        reconstruir_tabla_sesiones(conexion)
+        conexion.execute("ANALYZE")
+        return filas
+    except sqlite3.Error:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
+
+
+def _fila_sintetica(indice: int, sesiones: int, generador: random.Random) -> dict:
+    timestamp_us = _INICIO_US + indice * 1_000_000
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp_us // 1_000_000))
+    palabras = generador.randint(3, 40)
+    # Un termino poco frecuente (1 de cada 997 mensajes) para medir la busqueda de texto
+    contenido = "hola " * palabras + f"ticket{indice % 997}"
+    return {
+        "message_id": f"msg-{indice:09d}",
+        "session_id": f"sesion-{indice % sesiones:05d}",
+        "content": contenido,
+        "timestamp": timestamp,
+        "timestamp_us": timestamp_us,
+        "sender": "user" if indice % 2 else "system",
+        "word_count": palabras + 1,
+        "character_count": len(contenido),
+        "processed_at": timestamp,
+    }
@@ -0,0 +1,190 @@
+"""Suite de rendimiento: microbenchmarks + carga HTTP, con resultados en JSON.
+
+Mide latencia por llamada (p50/p95/p99) y rendimiento de:
+- FiltroContenido.analizar con un diccionario grande
+- ProcesadorMensajes.procesar
+- consultas de RepositorioMensajes sobre una base con millones de filas
+- la API completa (crear_aplicacion) con mezclas de POST y GET paginados
+
+El JSON resultante se compara con `python -m benchmarks.comparar`.
+
+Uso: python -m benchmarks.suite [--salida resultados.json] [--filas 1000000] [--bd ruta.db] [--grupos micro repositorio http]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from app.configuracion import Configuracion
+from app.esquemas.esquema_mensaje import MensajeEntrada
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from app.servicios.filtro_contenido import FiltroContenido
+from app.servicios.procesador_mensajes import ProcesadorMensajes
+from benchmarks.bench_filtro_contenido import _palabras_aleatorias, _texto_aleatorio
+from benchmarks.bench_modo_asincrono import _generar
+from benchmarks.carga_http import ejecutar_carga, servidor_en_hilo
+from benchmarks.micro import _fila_sintetica, medir_llamadas, poblar_base_datos
+
+GRUPOS = ("micro", "repositorio", "http")
+
+
+def _micro(args: argparse.Namespace) -> dict:
+    palabras = _palabras_aleatorias(1000)
+    texto = _texto_aleatorio(palabras)
+    filtro = FiltroContenido(palabras_prohibidas=palabras)
+
+    procesador = ProcesadorMensajes()
+    mensaje = MensajeEntrada(
+        message_id="msg-bench",
+        session_id="sesion-bench",
+        content="Hola, necesito ayuda con mi cuenta, el pago no aparece desde ayer " * 4,
+        timestamp="2023-06-15T14:30:00+02:00",
+        sender="user",
+    )
+    return {
+        "filtro_contenido_1000_palabras": medir_llamadas(lambda: filtro.analizar(texto), args.repeticiones),
+        "procesador_procesar": medir_llamadas(lambda: procesador.procesar(mensaje), args.repeticiones * 10),
+    }
+
+
+def _repositorio(args: argparse.Namespace, ruta_bd: str) -> dict:
+    inicio = time.perf_counter()
+    filas = poblar_base_datos(ruta_bd, args.filas, args.sesiones)
+    print(f"  base con {filas} mensajes lista en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    por_sesion = filas // args.sesiones
+    generador = random.Random(5)
+    conexion = obtener_conexion(ruta_bd)
+    repositorio = RepositorioMensajes(conexion)
+
+    def _sesion() -> str:
+        return f"sesion-{generador.randrange(args.sesiones):05d}"
+
+    # Posicion de la penultima pagina de cada sesion, calculada fuera de la medicion
+    posiciones = {}
+    for numero in range(args.sesiones):
+        session_id = f"sesion-{numero:05d}"
+        fila = conexion.execute(
+            "SELECT timestamp_us, message_id FROM mensajes WHERE session_id = ? "
+            "ORDER BY timestamp_us DESC, message_id DESC LIMIT 1 OFFSET 100",
+            (session_id,),
+        ).fetchone()
+        if fila is not None:
+            posiciones[session_id] = (fila["timestamp_us"], fila["message_id"])
+    sesiones_con_cursor = list(posiciones)
+
+    siguientes_ids = iter(range(filas, filas + 10 * args.repeticiones))
+    try:
+        return {
+            "repositorio_pagina_inicial": medir_llamadas(
+                lambda: repositorio.obtener_mensajes_por_sesion(_sesion(), limite=50, incluir_total=False),
+                args.repeticiones,
+            ),
+            "repositorio_pagina_offset_profundo": medir_llamadas(
+                lambda: repositorio.obtener_mensajes_por_sesion(
+                    _sesion(), limite=50, desplazamiento=max(0, por_sesion - 100), incluir_total=False
+                ),
+                args.repeticiones,
+            ),
+            "repositorio_pagina_cursor_profundo": medir_llamadas(
+                lambda: repositorio.obtener_mensajes_por_sesion(
+                    session_id := generador.choice(sesiones_con_cursor),
+                    limite=50,
+                    despues_de=posiciones[session_id],
+                    incluir_total=False,
+                ),
+                args.repeticiones,
+            ),
+            "repositorio_pagina_con_total": medir_llamadas(
+                lambda: repositorio.obtener_mensajes_por_sesion(_sesion(), limite=50, incluir_total=True),
+                args.repeticiones,
+            ),
+            "repositorio_busqueda_termino_raro": medir_llamadas(
+                lambda: repositorio.buscar_mensajes(f"ticket{generador.randrange(997)}", limite=20),
+                args.repeticiones,
+            ),
+            "repositorio_busqueda_en_sesion": medir_llamadas(
+                lambda: repositorio.buscar_mensajes("hola", session_id=_sesion(), limite=20),
+                args.repeticiones,
+            ),
+            "repositorio_guardar_mensaje": medir_llamadas(
+                lambda: repositorio.guardar_mensaje(_fila_sintetica(next(siguientes_ids), args.sesiones, generador)),
+                args.repeticiones,
+                calentamiento=5,
+            ),
+        }
+    finally:
+        conexion.close()
+
+
+def _http(args: argparse.Namespace) -> dict:
+    from app.principal import crear_aplicacion
+
+    def _generar_get(indice: int) -> tuple[str, str, object]:
+        return "GET", f"/api/messages/sesion-{indice % 50}?limit=20&offset={indice % 3 * 20}", None
+
+    with tempfile.TemporaryDirectory() as directorio:
+        Configuracion.RUTA_BASE_DATOS = os.path.join(directorio, "carga.db")
+        with servidor_en_hilo(crear_aplicacion()) as url:
+            mixto = ejecutar_carga(url, args.solicitudes, args.concurrencia, _generar)
+            solo_get = ejecutar_carga(url, args.solicitudes, args.concurrencia, _generar_get)
+    return {"http_post_get_mixto": mixto, "http_get_paginado": solo_get}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--salida", default="resultados_benchmarks.json")
+    parser.add_argument("--grupos", nargs="+", choices=GRUPOS, default=list(GRUPOS))
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--sesiones", type=int, default=1000)
+    parser.add_argument("--bd", default=None, help="Base a reutilizar entre corridas (se puebla si hace falta)")
+    parser.add_argument("--repeticiones", type=int, default=500)
+    parser.add_argument("--solicitudes", type=int, default=3000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    args = parser.parse_args()
+
+    resultados: dict[str, dict] = {}
+    if "micro" in args.grupos:
+        print("micro...", file=sys.stderr)
+        resultados.update(_micro(args))
+    if "repositorio" in args.grupos:
+        print("repositorio...", file=sys.stderr)
+        if args.bd:
+            resultados.update(_repositorio(args, args.bd))
+        else:
+            with tempfile.TemporaryDirectory() as directorio:
+                resultados.update(_repositorio(args, os.path.join(directorio, "grande.db")))
+    if "http" in args.grupos:
+        print("http...", file=sys.stderr)
+        resultados.update(_http(args))
+
+    informe = {
+        "metadatos": {
+            "fecha": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "procesadores": os.cpu_count(),
+            "argumentos": vars(args),
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+
+    print(f"{'benchmark':<38} {'ops/s':>10} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for nombre, resumen in resultados.items():
+        print(
+            f"{nombre:<38} {resumen['rendimiento_rps']:>10} {resumen['p50_ms']:>9} "
+            f"{resumen['p95_ms']:>9} {resumen['p99_ms']:>9}"
+        )
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 import sqlite3
+from contextlib import nullcontext
+
 import pytest
 from fastapi.testclient import TestClient
 
+from app.configuracion import Configuracion
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
 from app.principal import crear_aplicacion
 from app.repositorios.base_datos import ESQUEMA_SQL
 from app.repositorios.repositorio_mensajes import RepositorioMensajes
 from app.servicios.servicio_mensajes import ServicioMensajes
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
 from app.servicios.procesador_mensajes import ProcesadorMensajes
 from app.servicios.filtro_contenido import FiltroContenido
 from app.dependencias import obtener_servicio_mensajes
@@ -42,7 +47,15 @@ def servicio(repositorio, procesador):
 
 
 @pytest.fixture
-def cliente(conexion_bd):
+def base_datos_aplicacion(tmp_path, monkeypatch):
+    """Base temporal para el ciclo de vida de la app (pools, escritores), fuera de la raiz del repo."""
+    ruta = str(tmp_path / "mensajes.db")
+    monkeypatch.setattr(Configuracion, "RUTA_BASE_DATOS", ruta)
+    return ruta
+
+
+@pytest.fixture
+def cliente(conexion_bd, base_datos_aplicacion):
     """Cliente HTTP con dependencias sobreescritas para usar BD en memoria."""
     app = crear_aplicacion()
 
@@ -50,7 +63,8 @@ def cliente(conexion_bd):
         repo = RepositorioMensajes(conexion_bd)
         filtro = FiltroContenido(palabras_prohibidas=["idiota", "mierda", "estupido"])
         proc = ProcesadorMensajes(filtro=filtro)
-        return ServicioMensajes(repositorio=repo, procesador=proc)
+        servicio = ServicioMensajes(repositorio=repo, procesador=proc)
+        return ServicioMensajesAsincrono(lambda: nullcontext(servicio))
 
     app.dependency_overrides[obtener_servicio_mensajes] = _servicio_test
     with TestClient(app) as c:
@@ -68,3 +82,28 @@ def mensaje_valido():
         "timestamp": "2023-06-15T14:30:00Z",
         "sender": "system",
     }
+
+
+@pytest.fixture
+def fila_mensaje():
+    """Fabrica de filas de `mensajes` ya procesadas (MensajeRegistro.fila()) para los repositorios."""
+    def _fila(
+        message_id: str = "msg-001",
+        session_id: str = "session-001",
+        timestamp: str = "2023-06-15T14:30:00Z",
+        sender: str = "user",
+        content: str = "Hola mundo",
+    ) -> dict:
+        return {
+            "message_id": message_id,
+            "session_id": session_id,
+            "content": content,
+            "timestamp": timestamp,
+            "timestamp_us": timestamp_a_epoch_us(timestamp),
+            "sender": sender,
+            "word_count": len(content.split()),
+            "character_count": len(content),
+            "processed_at": "2023-06-15T14:30:01Z",
+        }
+
+    return _fila
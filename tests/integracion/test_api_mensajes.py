@@ -1,3 +1,18 @@
+import json
+from contextlib import nullcontext
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.configuracion import Configuracion
+from app.dependencias import obtener_servicio_mensajes
+from app.principal import crear_aplicacion
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from app.servicios.ids_recientes import IdsRecientes
+from app.servicios.servicio_mensajes import ServicioMensajes
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+
+
 class TestPostMensajes:
     def test_crear_mensaje_201(self, cliente, mensaje_valido):
         resp = cliente.post("/api/messages", json=mensaje_valido)
@@ -53,12 +68,15 @@ class TestPostMensajes:
 
 
 class TestGetMensajes:
-    def _insertar_mensaje(self, cliente, message_id="msg-001", session_id="session-001", sender="user"):
+    def _insertar_mensaje(
+        self, cliente, message_id="msg-001", session_id="session-001", sender="user",
+        timestamp="2023-06-15T14:30:00Z",
+    ):
         return cliente.post("/api/messages", json={
             "message_id": message_id,
             "session_id": session_id,
             "content": "Mensaje de prueba",
-            "timestamp": "2023-06-15T14:30:00Z",
+            "timestamp": timestamp,
             "sender": sender,
         })
 
@@ -90,7 +108,7 @@ class TestGetMensajes:
     def test_filtro_sender(self, cliente):
         self._insertar_mensaje(cliente, message_id="msg-001", sender="user")
         self._insertar_mensaje(cliente, message_id="msg-002", sender="system")
-        resp = cliente.get("/api/messages/session-001?sender=system")
+        resp = cliente.get("/api/messages/session-001?sender=system&include_total=true")
         datos = resp.json()
         assert datos["pagination"]["total"] == 1
         assert datos["data"][0]["sender"] == "system"
@@ -98,12 +116,63 @@ class TestGetMensajes:
     def test_paginacion_metadata(self, cliente):
         for i in range(3):
             self._insertar_mensaje(cliente, message_id=f"msg-{i}")
-        resp = cliente.get("/api/messages/session-001?limit=2&offset=0")
+        resp = cliente.get("/api/messages/session-001?limit=2&offset=0&include_total=true")
         pag = resp.json()["pagination"]
         assert pag["total"] == 3
+        assert pag["total_exact"] is True
         assert pag["limit"] == 2
         assert pag["offset"] == 0
 
+    def test_total_es_opcional(self, cliente):
+        self._insertar_mensaje(cliente)
+        pag = cliente.get("/api/messages/session-001").json()["pagination"]
+        assert "total" not in pag
+        assert "total_exact" not in pag
+        assert pag["next_cursor"] is None
+
+    def test_paginacion_por_cursor(self, cliente):
+        for i in range(5):
+            self._insertar_mensaje(cliente, message_id=f"msg-{i}")
+        primera = cliente.get("/api/messages/session-001?limit=3").json()
+        cursor = primera["pagination"]["next_cursor"]
+        assert cursor is not None
+        segunda = cliente.get(f"/api/messages/session-001?limit=3&cursor={cursor}").json()
+        ids = [m["message_id"] for m in primera["data"] + segunda["data"]]
+        assert ids == [f"msg-{i}" for i in range(5)]
+        assert segunda["pagination"]["next_cursor"] is None
+
+    def test_orden_cronologico_y_rango(self, cliente):
+        self._insertar_mensaje(cliente, message_id="msg-a", timestamp="2023-06-15T14:00:00Z")
+        self._insertar_mensaje(cliente, message_id="msg-b", timestamp="2023-06-15T15:00:00+02:00")
+        self._insertar_mensaje(cliente, message_id="msg-c", timestamp="2023-06-15T14:30:00Z")
+        resp = cliente.get("/api/messages/session-001")
+        assert [m["message_id"] for m in resp.json()["data"]] == ["msg-b", "msg-a", "msg-c"]
+
+        resp = cliente.get("/api/messages/session-001", params={"since": "2023-06-15T14:00:00Z"})
+        assert [m["message_id"] for m in resp.json()["data"]] == ["msg-a", "msg-c"]
+
+    def test_rango_vacio_de_sesion_existente_200(self, cliente):
+        self._insertar_mensaje(cliente, message_id="msg-a", timestamp="2023-06-15T14:00:00Z")
+        resp = cliente.get("/api/messages/session-001", params={"since": "2023-06-16T00:00:00Z", "include_total": True})
+        assert resp.status_code == 200
+        assert resp.json()["data"] == []
+        assert resp.json()["pagination"]["total"] == 0
+
+        resp = cliente.get("/api/messages/no-existe", params={"since": "2023-06-16T00:00:00Z"})
+        assert resp.status_code == 404
+
+    def test_rango_invalido_400(self, cliente):
+        self._insertar_mensaje(cliente)
+        resp = cliente.get("/api/messages/session-001?until=manana")
+        assert resp.status_code == 400
+        assert resp.json()["error"]["code"] == "INVALID_FORMAT"
+
+    def test_cursor_invalido_400(self, cliente):
+        self._insertar_mensaje(cliente)
+        resp = cliente.get("/api/messages/session-001?cursor=%%%")
+        assert resp.status_code == 400
+        assert resp.json()["error"]["code"] == "INVALID_CURSOR"
+
     def test_respuesta_tiene_metadata_anidada(self, cliente):
         self._insertar_mensaje(cliente)
         resp = cliente.get("/api/messages/session-001")
@@ -119,3 +188,265 @@ class TestGetMensajes:
         assert "code" in error["error"]
         assert "message" in error["error"]
         assert "details" in error["error"]
+
+
+class TestGetCondicional:
+    def _insertar(self, cliente, message_id, content="Mensaje de prueba"):
+        return cliente.post("/api/messages", json={
+            "message_id": message_id,
+            "session_id": "session-001",
+            "content": content,
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user",
+        })
+
+    def test_etag_y_304(self, cliente):
+        self._insertar(cliente, "msg-1")
+        resp = cliente.get("/api/messages/session-001")
+        etag = resp.headers["etag"]
+        assert etag.startswith('W/"')
+
+        no_modificado = cliente.get("/api/messages/session-001", headers={"If-None-Match": etag})
+        assert no_modificado.status_code == 304
+        assert no_modificado.content == b""
+        assert no_modificado.headers["etag"] == etag
+
+    def test_escritura_cambia_el_etag(self, cliente):
+        self._insertar(cliente, "msg-1")
+        etag = cliente.get("/api/messages/session-001").headers["etag"]
+        self._insertar(cliente, "msg-2")
+        resp = cliente.get("/api/messages/session-001", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert len(resp.json()["data"]) == 2
+        assert resp.headers["etag"] != etag
+
+    def test_cada_pagina_tiene_su_etag(self, cliente):
+        for i in range(3):
+            self._insertar(cliente, f"msg-{i}")
+        primera = cliente.get("/api/messages/session-001", params={"limit": 2})
+        etag = primera.headers["etag"]
+
+        segunda = cliente.get(
+            "/api/messages/session-001",
+            params={"limit": 2, "cursor": primera.json()["pagination"]["next_cursor"]},
+            headers={"If-None-Match": etag},
+        )
+        assert segunda.status_code == 200
+        assert [m["message_id"] for m in segunda.json()["data"]] == ["msg-2"]
+        assert segunda.headers["etag"] != etag
+
+        for params in ({"limit": 2, "offset": 1}, {"limit": 2, "sender": "user"}, {"limit": 2, "include_total": True}):
+            resp = cliente.get("/api/messages/session-001", params=params, headers={"If-None-Match": etag})
+            assert resp.status_code == 200
+
+        repetida = cliente.get("/api/messages/session-001", params={"limit": 2}, headers={"If-None-Match": etag})
+        assert repetida.status_code == 304
+
+    def test_sesion_inexistente_no_responde_304(self, cliente):
+        resp = cliente.get("/api/messages/no-existe", headers={"If-None-Match": "*"})
+        assert resp.status_code == 404
+
+    def test_pagina_grande_se_comprime(self, cliente):
+        for i in range(20):
+            self._insertar(cliente, f"msg-{i}", content="texto repetido " * 50)
+        resp = cliente.get("/api/messages/session-001", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert len(resp.json()["data"]) == 20
+
+
+class TestBuscarMensajes:
+    def _insertar(self, cliente, message_id, content, session_id="session-001"):
+        cliente.post("/api/messages", json={
+            "message_id": message_id,
+            "session_id": session_id,
+            "content": content,
+            "timestamp": "2023-06-15T14:30:00Z",
+            "sender": "user",
+        })
+
+    def test_buscar_200(self, cliente):
+        self._insertar(cliente, "msg-1", "No puedo entrar a mi cuenta")
+        self._insertar(cliente, "msg-2", "Gracias", session_id="session-002")
+        resp = cliente.get("/api/messages/search", params={"q": "cuenta"})
+        assert resp.status_code == 200
+        datos = resp.json()
+        assert [m["message_id"] for m in datos["data"]] == ["msg-1"]
+        assert datos["data"][0]["snippet"] == "No puedo entrar a mi <mark>cuenta</mark>"
+        assert datos["pagination"]["next_cursor"] is None
+
+    def test_buscar_filtrado_por_sesion(self, cliente):
+        self._insertar(cliente, "msg-1", "cuenta bloqueada")
+        self._insertar(cliente, "msg-2", "cuenta nueva", session_id="session-002")
+        resp = cliente.get("/api/messages/search", params={"q": "cuenta", "session_id": "session-002"})
+        assert [m["message_id"] for m in resp.json()["data"]] == ["msg-2"]
+
+    def test_sin_resultados(self, cliente):
+        resp = cliente.get("/api/messages/search", params={"q": "inexistente"})
+        assert resp.status_code == 200
+        assert resp.json()["data"] == []
+
+    def test_q_obligatorio_400(self, cliente):
+        resp = cliente.get("/api/messages/search")
+        assert resp.status_code == 400
+
+    def test_cursor_invalido_400(self, cliente):
+        resp = cliente.get("/api/messages/search", params={"q": "hola", "cursor": "xx"})
+        assert resp.status_code == 400
+        assert resp.json()["error"]["code"] == "INVALID_CURSOR"
+
+
+class TestPostLoteMensajes:
+    def test_lote_exitoso(self, cliente, mensaje_valido):
+        lote = [{**mensaje_valido, "message_id": f"msg-{i}"} for i in range(3)]
+        resp = cliente.post("/api/messages/batch", json=lote)
+        assert resp.status_code == 200
+        datos = resp.json()
+        assert datos["summary"] == {"total": 3, "created": 3, "failed": 0}
+        assert all(r["http_status"] == 201 for r in datos["data"])
+
+    def test_lote_con_errores_parciales(self, cliente, mensaje_valido):
+        cliente.post("/api/messages", json=mensaje_valido)
+        lote = [
+            {**mensaje_valido, "message_id": "msg-nuevo"},
+            mensaje_valido,
+            {**mensaje_valido, "message_id": "msg-sin-fecha", "timestamp": "ayer"},
+        ]
+        resp = cliente.post("/api/messages/batch", json=lote)
+        assert resp.status_code == 200
+        datos = resp.json()
+        assert datos["summary"] == {"total": 3, "created": 1, "failed": 2}
+        assert [r["http_status"] for r in datos["data"]] == [201, 409, 400]
+
+        resp = cliente.get(f"/api/messages/{mensaje_valido['session_id']}")
+        assert len(resp.json()["data"]) == 2
+
+    def test_lote_vacio_400(self, cliente):
+        resp = cliente.post("/api/messages/batch", json=[])
+        assert resp.status_code == 400
+        assert resp.json()["error"]["code"] == "INVALID_FORMAT"
+
+    def test_lote_no_es_lista_400(self, cliente, mensaje_valido):
+        resp = cliente.post("/api/messages/batch", json=mensaje_valido)
+        assert resp.status_code == 400
+
+
+class TestModoIdempotente:
+    @pytest.fixture
+    def cliente_idempotente(self, conexion_bd, procesador, monkeypatch, base_datos_aplicacion):
+        monkeypatch.setattr(Configuracion, "MODO_IDEMPOTENTE", True)
+        servicio = ServicioMensajes(
+            repositorio=RepositorioMensajes(conexion_bd),
+            procesador=procesador,
+            ids_recientes=IdsRecientes(100),
+            idempotente=True,
+        )
+        app = crear_aplicacion()
+        app.dependency_overrides[obtener_servicio_mensajes] = lambda: ServicioMensajesAsincrono(
+            lambda: nullcontext(servicio)
+        )
+        with TestClient(app) as cliente:
+            yield cliente
+
+    def test_reintento_responde_200_con_el_original(self, cliente_idempotente, mensaje_valido):
+        primero = cliente_idempotente.post("/api/messages", json=mensaje_valido)
+        assert primero.status_code == 201
+        reintento = cliente_idempotente.post("/api/messages", json={**mensaje_valido, "content": "cambiado"})
+        assert reintento.status_code == 200
+        assert reintento.json()["data"] == primero.json()["data"]
+
+    def test_lote_reporta_existentes(self, cliente_idempotente, mensaje_valido):
+        cliente_idempotente.post("/api/messages", json=mensaje_valido)
+        lote = [mensaje_valido, {**mensaje_valido, "message_id": "msg-nuevo"}]
+        datos = cliente_idempotente.post("/api/messages/batch", json=lote).json()
+        assert datos["summary"] == {"total": 2, "created": 1, "failed": 0, "existing": 1}
+
+
+class TestExportarMensajes:
+    def _insertar(self, cliente, message_id, sender="user", timestamp="2023-06-15T14:30:00Z"):
+        cliente.post("/api/messages", json={
+            "message_id": message_id,
+            "session_id": "session-001",
+            "content": "Mensaje de prueba",
+            "timestamp": timestamp,
+            "sender": sender,
+        })
+
+    def test_exportar_ndjson(self, cliente):
+        for i in range(3):
+            self._insertar(cliente, f"msg-{i}", sender="user" if i % 2 else "system")
+        resp = cliente.get("/api/messages/session-001/export")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        lineas = [json.loads(linea) for linea in resp.text.splitlines()]
+        assert [m["message_id"] for m in lineas] == ["msg-0", "msg-1", "msg-2"]
+
+    def test_exportar_filtrado_por_sender(self, cliente):
+        for i in range(3):
+            self._insertar(cliente, f"msg-{i}", sender="user" if i % 2 else "system")
+        resp = cliente.get("/api/messages/session-001/export?sender=user")
+        assert [json.loads(linea)["message_id"] for linea in resp.text.splitlines()] == ["msg-1"]
+
+    def test_exportar_sesion_no_existente_404(self, cliente):
+        resp = cliente.get("/api/messages/no-existe/export")
+        assert resp.status_code == 404
+        assert resp.json()["error"]["code"] == "SESSION_NOT_FOUND"
+
+    def test_exportar_rango_con_offset(self, cliente):
+        for i in range(4):
+            self._insertar(cliente, f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
+        resp = cliente.get(
+            "/api/messages/session-001/export",
+            params={"since": "2023-06-15T16:31:00+02:00", "until": "2023-06-15T14:33:00Z"},
+        )
+        assert [json.loads(linea)["message_id"] for linea in resp.text.splitlines()] == ["msg-1", "msg-2"]
+
+    def test_exportar_rango_vacio_200(self, cliente):
+        self._insertar(cliente, "msg-0", timestamp="2023-06-15T14:30:00Z")
+        resp = cliente.get("/api/messages/session-001/export", params={"until": "2023-06-15T14:00:00Z"})
+        assert resp.status_code == 200
+        assert resp.text == ""
+
+    def test_exportar_rango_invalido_400(self, cliente):
+        self._insertar(cliente, "msg-0")
+        resp = cliente.get("/api/messages/session-001/export?since=ayer")
+        assert resp.status_code == 400
+
+
+class TestEstadisticasSesion:
+    def test_estadisticas_200(self, cliente, mensaje_valido):
+        cliente.post("/api/messages", json=mensaje_valido)
+        cliente.post("/api/messages", json={**mensaje_valido, "message_id": "msg-2", "sender": "user"})
+        resp = cliente.get("/api/sessions/session-abcdef/stats")
+        assert resp.status_code == 200
+        datos = resp.json()["data"]
+        assert datos["message_count"] == 2
+        assert datos["sender_counts"] == {"user": 1, "system": 1}
+        assert datos["first_timestamp"] == datos["last_timestamp"] == "2023-06-15T14:30:00Z"
+
+    def test_estadisticas_sesion_no_existente_404(self, cliente):
+        resp = cliente.get("/api/sessions/no-existe/stats")
+        assert resp.status_code == 404
+        assert resp.json()["error"]["code"] == "SESSION_NOT_FOUND"
+
+
+class TestStreamSesion:
+    def test_cursor_invalido_400(self, cliente):
+        resp = cliente.get("/api/sessions/session-001/stream", params={"cursor": "no-es-un-cursor"})
+        assert resp.status_code == 400
+        assert resp.json()["error"]["code"] == "INVALID_CURSOR"
+
+
+class TestMetricas:
+    def test_metricas_por_etapa_y_codigo(self, cliente, mensaje_valido):
+        cliente.post("/api/messages", json=mensaje_valido)
+        cliente.post("/api/messages", json=mensaje_valido)
+        resp = cliente.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        texto = resp.text
+        for etapa in ("validacion_timestamp", "validacion_formato", "filtrado", "metadatos"):
+            assert f'mensajes_etapa_duracion_segundos_count{{etapa="{etapa}"}}' in texto
+        assert 'repositorio_operacion_duracion_segundos_count{operacion="guardar_mensaje"}' in texto
+        assert 'http_respuestas_total{codigo="201",metodo="POST",ruta="/api/messages"}' in texto
+        assert 'http_respuestas_total{codigo="409",metodo="POST",ruta="/api/messages"}' in texto
+        assert 'api_errores_total{code="DUPLICATE_MESSAGE"}' in texto
@@ -0,0 +1,61 @@
+from app.servicios.cache_paginas import CachePaginas
+
+
+class RelojFalso:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+class TestCachePaginas:
+    def setup_method(self):
+        self.reloj = RelojFalso()
+        self.cache = CachePaginas(max_entradas=3, max_bytes=1000, ttl_segundos=10, reloj=self.reloj)
+
+    def _guardar(self, clave, valor="pagina", tamano=10):
+        self.cache.guardar(clave, valor, tamano, self.cache.generacion(clave[0]))
+
+    def test_acierto_y_fallo(self):
+        assert self.cache.obtener(("s1", 1)) is None
+        self._guardar(("s1", 1))
+        assert self.cache.obtener(("s1", 1)) == "pagina"
+        stats = self.cache.estadisticas()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_expira_por_ttl(self):
+        self._guardar(("s1", 1))
+        self.reloj.ahora = 11
+        assert self.cache.obtener(("s1", 1)) is None
+        assert self.cache.estadisticas()["entries"] == 0
+
+    def test_desaloja_la_menos_usada(self):
+        for i in range(3):
+            self._guardar(("s1", i))
+        self.cache.obtener(("s1", 0))
+        self._guardar(("s1", 3))
+        assert self.cache.obtener(("s1", 1)) is None
+        assert self.cache.obtener(("s1", 0)) == "pagina"
+        assert self.cache.estadisticas()["evictions"] == 1
+
+    def test_limite_de_bytes(self):
+        self._guardar(("s1", 1), tamano=600)
+        self._guardar(("s1", 2), tamano=600)
+        stats = self.cache.estadisticas()
+        assert stats["entries"] == 1
+        assert stats["bytes"] == 600
+
+    def test_invalidar_solo_la_sesion(self):
+        self._guardar(("s1", 1))
+        self._guardar(("s2", 1))
+        self.cache.invalidar_sesion("s1")
+        assert self.cache.obtener(("s1", 1)) is None
+        assert self.cache.obtener(("s2", 1)) == "pagina"
+
+    def test_lectura_anterior_a_la_escritura_no_se_guarda(self):
+        generacion = self.cache.generacion("s1")
+        self.cache.invalidar_sesion("s1")
+        self.cache.guardar(("s1", 1), "vieja", 10, generacion)
+        assert self.cache.obtener(("s1", 1)) is None
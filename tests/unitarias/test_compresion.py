@@ -0,0 +1,82 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.controladores import compresion
+from app.controladores.compresion import MiddlewareCompresion, elegir_codificacion
+
+
+class TestElegirCodificacion:
+    def test_gzip(self, monkeypatch):
+        monkeypatch.setattr(compresion, "brotli", None)
+        assert elegir_codificacion("gzip, deflate") == "gzip"
+        assert elegir_codificacion("br, gzip") == "gzip"
+
+    def test_respeta_q_cero_y_comodin(self, monkeypatch):
+        monkeypatch.setattr(compresion, "brotli", None)
+        assert elegir_codificacion("gzip;q=0, deflate") is None
+        assert elegir_codificacion("*") == "gzip"
+        assert elegir_codificacion("*, gzip; q=0") is None
+        assert elegir_codificacion("") is None
+
+    def test_prefiere_brotli_si_esta_instalado(self, monkeypatch):
+        monkeypatch.setattr(compresion, "brotli", object())
+        assert elegir_codificacion("gzip, br") == "br"
+        assert elegir_codificacion("gzip, br;q=0") == "gzip"
+
+
+@pytest.fixture
+def cliente_comprimido(monkeypatch):
+    monkeypatch.setattr(compresion, "brotli", None)
+    app = FastAPI()
+    app.add_middleware(MiddlewareCompresion, tamano_minimo=100)
+
+    @app.get("/grande")
+    def _grande():
+        return Response(b'{"x": "' + b"a" * 5000 + b'"}', media_type="application/json")
+
+    @app.get("/chica")
+    def _chica():
+        return Response(b'{"x": 1}', media_type="application/json")
+
+    @app.get("/stream")
+    def _stream():
+        return StreamingResponse((b'{"n": %d}\n' % i for i in range(50)), media_type="application/x-ndjson")
+
+    @app.get("/eventos")
+    def _eventos():
+        return StreamingResponse(iter([b"data: x\n\n"] * 100), media_type="text/event-stream")
+
+    with TestClient(app) as cliente:
+        yield cliente
+
+
+class TestMiddlewareCompresion:
+    def test_comprime_respuesta_grande(self, cliente_comprimido):
+        resp = cliente_comprimido.get("/grande", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["vary"]
+        assert int(resp.headers["content-length"]) < 5000
+        assert len(resp.json()["x"]) == 5000
+
+    def test_no_comprime_respuesta_chica(self, cliente_comprimido):
+        resp = cliente_comprimido.get("/chica", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
+
+    def test_sin_accept_encoding(self, cliente_comprimido):
+        resp = cliente_comprimido.get("/grande", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in resp.headers
+        assert len(resp.content) > 5000
+
+    def test_comprime_stream_por_bloques(self, cliente_comprimido):
+        with cliente_comprimido.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as resp:
+            crudo = b"".join(resp.iter_raw())
+        assert resp.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(crudo).splitlines()[-1] == b'{"n": 49}'
+
+    def test_no_comprime_eventos(self, cliente_comprimido):
+        resp = cliente_comprimido.get("/eventos", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in resp.headers
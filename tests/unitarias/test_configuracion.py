@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from app.configuracion import Configuracion
+from app.principal import motor_base_datos, preparar_bases_datos
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.directorio_ids import ruta_directorio
+
+
+class TestConfiguracionDesdeEntorno:
+    def test_valores_por_defecto(self):
+        config = Configuracion()
+        assert config.FRAGMENTOS_BASE_DATOS == 1
+        assert config.PREPARAR_ESQUEMA_AL_INICIAR is True
+        assert config.ID_UNICO_ENTRE_FRAGMENTOS is False
+
+    def test_sobreescribe_con_tipos(self, monkeypatch):
+        monkeypatch.setenv("MENSAJES_RUTA_BASE_DATOS", "/tmp/otra.db")
+        monkeypatch.setenv("MENSAJES_FRAGMENTOS_BASE_DATOS", "4")
+        monkeypatch.setenv("MENSAJES_ESPERA_POOL_SEGUNDOS", "0.5")
+        monkeypatch.setenv("MENSAJES_PREPARAR_ESQUEMA_AL_INICIAR", "0")
+        monkeypatch.setenv("MENSAJES_PALABRAS_PROHIBIDAS", "foo, bar")
+        config = Configuracion()
+        assert config.RUTA_BASE_DATOS == "/tmp/otra.db"
+        assert config.FRAGMENTOS_BASE_DATOS == 4
+        assert config.ESPERA_POOL_SEGUNDOS == 0.5
+        assert config.PREPARAR_ESQUEMA_AL_INICIAR is False
+        assert config.PALABRAS_PROHIBIDAS == ["foo", "bar"]
+
+    def test_no_modifica_la_clase(self, monkeypatch):
+        monkeypatch.setenv("MENSAJES_FRAGMENTOS_BASE_DATOS", "4")
+        Configuracion()
+        assert Configuracion.FRAGMENTOS_BASE_DATOS == 1
+
+
+class TestAjustesSqlite:
+    def test_pragmas_para_varios_procesos(self, tmp_path):
+        conexion = obtener_conexion(str(tmp_path / "pragmas.db"))
+        try:
+            assert conexion.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conexion.execute("PRAGMA busy_timeout").fetchone()[0] == Configuracion.ESPERA_BLOQUEO_SQLITE_MS
+            # 1 = NORMAL
+            assert conexion.execute("PRAGMA synchronous").fetchone()[0] == 1
+        finally:
+            conexion.close()
+
+    def test_sincronizacion_invalida(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Configuracion, "SINCRONIZACION_SQLITE", "RAPIDO; DROP TABLE x")
+        with pytest.raises(ValueError):
+            obtener_conexion(str(tmp_path / "pragmas.db"))
+
+
+class TestMotorBaseDatos:
+    def test_motor_desconocido(self, monkeypatch):
+        monkeypatch.setattr(Configuracion, "MOTOR_BASE_DATOS", "mysql")
+        with pytest.raises(ValueError):
+            motor_base_datos()
+
+
+class TestPrepararBasesDatos:
+    def test_fragmentos_sin_directorio_de_ids_por_defecto(self, monkeypatch, tmp_path):
+        ruta = str(tmp_path / "mensajes.db")
+        monkeypatch.setattr(Configuracion, "RUTA_BASE_DATOS", ruta)
+        monkeypatch.setattr(Configuracion, "FRAGMENTOS_BASE_DATOS", 2)
+        assert len(preparar_bases_datos()) == 2
+        assert not os.path.exists(ruta_directorio(ruta))
+
+    def test_id_unico_entre_fragmentos_crea_el_directorio(self, monkeypatch, tmp_path):
+        ruta = str(tmp_path / "mensajes.db")
+        monkeypatch.setattr(Configuracion, "RUTA_BASE_DATOS", ruta)
+        monkeypatch.setattr(Configuracion, "FRAGMENTOS_BASE_DATOS", 2)
+        monkeypatch.setattr(Configuracion, "ID_UNICO_ENTRE_FRAGMENTOS", True)
+        preparar_bases_datos()
+        assert os.path.exists(ruta_directorio(ruta))
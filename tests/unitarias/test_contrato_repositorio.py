@@ -0,0 +1,280 @@
+"""Contrato de RepositorioMensajesBase: las mismas pruebas contra cada motor.
+
+PostgreSQL corre cuando MENSAJES_PRUEBAS_URL_POSTGRES apunta a una base (p. ej. la de
+`docker run -e POSTGRES_PASSWORD=clave -p 5432:5432 postgres:16`); en CI la levanta el
+servicio de `.github/workflows/pruebas.yml`. Con la URL definida, `psycopg` es obligatorio.
+Cada prueba usa un esquema propio que se borra al terminar.
+"""
+import os
+import uuid
+
+import pytest
+
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado
+from app.repositorios.base_datos import inicializar_base_datos
+from app.repositorios.directorio_ids import DirectorioIds, inicializar_directorio
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_base import RepositorioMensajesBase
+from app.repositorios.repositorio_fragmentado import RepositorioMensajesFragmentado, indice_fragmento
+from app.repositorios.repositorio_postgres import (
+    RepositorioMensajesPostgres,
+    conexion_postgres,
+    crear_pool_postgres,
+    expresion_tsquery,
+    inicializar_postgres,
+)
+
+URL_POSTGRES = os.environ.get("MENSAJES_PRUEBAS_URL_POSTGRES", "")
+FRAGMENTOS = 3
+# Sesion que cae en otro fragmento que "session-001"
+SESION_OTRO_FRAGMENTO = next(
+    sesion
+    for sesion in (f"sesion-{i}" for i in range(100))
+    if indice_fragmento(sesion, FRAGMENTOS) != indice_fragmento("session-001", FRAGMENTOS)
+)
+
+
+def _segundo(segundo: int) -> str:
+    return f"2023-06-15T14:30:{segundo:02d}Z"
+
+
+@pytest.fixture(params=["sqlite", "fragmentado", "postgres"])
+def repositorio_contrato(request, repositorio, tmp_path):
+    if request.param == "sqlite":
+        yield repositorio
+    elif request.param == "fragmentado":
+        pools = []
+        for indice in range(FRAGMENTOS):
+            ruta = str(tmp_path / f"mensajes.{indice}.db")
+            inicializar_base_datos(ruta)
+            pools.append(PoolConexiones(ruta))
+        ruta_ids = str(tmp_path / "mensajes.ids.db")
+        inicializar_directorio(ruta_ids)
+        directorio = DirectorioIds(PoolConexiones(ruta_ids))
+        yield RepositorioMensajesFragmentado(pools, directorio=directorio)
+        directorio.cerrar()
+        for pool in pools:
+            pool.cerrar()
+    else:
+        if not URL_POSTGRES:
+            pytest.skip("MENSAJES_PRUEBAS_URL_POSTGRES no esta definida")
+        # Con la URL definida (como en CI) que falte psycopg es un error, no un skip
+        import psycopg
+        from psycopg.rows import dict_row
+
+        esquema = f"contrato_{uuid.uuid4().hex[:12]}"
+        conexion = psycopg.connect(URL_POSTGRES, autocommit=True, row_factory=dict_row)
+        conexion.execute(f"CREATE SCHEMA {esquema}")
+        conexion.execute(f"SET search_path TO {esquema}")
+        inicializar_postgres(conexion)
+        try:
+            yield RepositorioMensajesPostgres(conexion)
+        finally:
+            conexion.execute(f"DROP SCHEMA {esquema} CASCADE")
+            conexion.close()
+
+
+class TestContratoRepositorio:
+    def test_implementa_la_interfaz(self, repositorio_contrato):
+        assert isinstance(repositorio_contrato, RepositorioMensajesBase)
+
+    def test_guardar_y_obtener(self, repositorio_contrato, fila_mensaje):
+        datos = fila_mensaje("msg-1")
+        repositorio_contrato.guardar_mensaje(datos)
+
+        assert repositorio_contrato.obtener_mensaje("msg-1", "session-001") == datos
+        assert repositorio_contrato.obtener_mensaje("msg-1", "session-002") is None
+
+    def test_guardar_duplicado(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensaje(fila_mensaje("msg-1"))
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio_contrato.guardar_mensaje(fila_mensaje("msg-1", content="otro"))
+
+        assert repositorio_contrato.obtener_mensaje("msg-1", "session-001")["content"] == "Hola mundo"
+        assert repositorio_contrato.obtener_estadisticas_sesion("session-001")["total_mensajes"] == 1
+
+    def test_message_id_es_unico_entre_sesiones(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensaje(fila_mensaje("msg-1"))
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio_contrato.guardar_mensaje(fila_mensaje("msg-1", SESION_OTRO_FRAGMENTO))
+
+        duplicados = repositorio_contrato.guardar_mensajes_lote(
+            [fila_mensaje("msg-2", SESION_OTRO_FRAGMENTO), fila_mensaje("msg-1", SESION_OTRO_FRAGMENTO)]
+        )
+
+        assert duplicados == {1}
+        assert repositorio_contrato.obtener_mensaje("msg-1", SESION_OTRO_FRAGMENTO) is None
+        assert repositorio_contrato.obtener_estadisticas_sesion(SESION_OTRO_FRAGMENTO)["total_mensajes"] == 1
+
+    def test_lote_reporta_duplicados(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensaje(fila_mensaje("msg-0"))
+
+        duplicados = repositorio_contrato.guardar_mensajes_lote(
+            [
+                fila_mensaje("msg-1"),
+                fila_mensaje("msg-0"),
+                fila_mensaje("msg-2", "session-002"),
+                fila_mensaje("msg-1", content="repetido"),
+            ]
+        )
+
+        assert duplicados == {1, 3}
+        assert repositorio_contrato.obtener_mensaje("msg-1", "session-001")["content"] == "Hola mundo"
+        assert repositorio_contrato.obtener_estadisticas_sesion("session-001")["total_mensajes"] == 2
+        assert repositorio_contrato.guardar_mensajes_lote([]) == set()
+
+    def test_pagina_ordenada_con_total_y_cursor(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote(
+            [fila_mensaje(f"msg-{i}", timestamp=_segundo(10 - i)) for i in range(5)]
+            + [fila_mensaje("msg-b", timestamp=_segundo(8)), fila_mensaje("msg-otra", "session-002")]
+        )
+
+        pagina, total = repositorio_contrato.obtener_mensajes_por_sesion("session-001", limite=3)
+        assert total == 6
+        assert [m["message_id"] for m in pagina] == ["msg-4", "msg-3", "msg-2"]
+
+        ultimo = pagina[-1]
+        siguiente, total = repositorio_contrato.obtener_mensajes_por_sesion(
+            "session-001", limite=3, despues_de=(ultimo["timestamp_us"], ultimo["message_id"]), incluir_total=False
+        )
+        assert total is None
+        assert [m["message_id"] for m in siguiente] == ["msg-b", "msg-1", "msg-0"]
+
+    def test_filtros_de_remitente_rango_y_desplazamiento(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote(
+            [fila_mensaje(f"msg-{i}", timestamp=_segundo(i), sender="user" if i % 2 else "system") for i in range(8)]
+        )
+
+        usuario, total = repositorio_contrato.obtener_mensajes_por_sesion("session-001", remitente="user")
+        assert total == 4
+        assert {m["sender"] for m in usuario} == {"user"}
+
+        rango, total = repositorio_contrato.obtener_mensajes_por_sesion(
+            "session-001", desde_us=timestamp_a_epoch_us(_segundo(2)), hasta_us=timestamp_a_epoch_us(_segundo(5))
+        )
+        assert total == 3
+        assert [m["message_id"] for m in rango] == ["msg-2", "msg-3", "msg-4"]
+
+        desplazada, _ = repositorio_contrato.obtener_mensajes_por_sesion("session-001", limite=2, desplazamiento=6)
+        assert [m["message_id"] for m in desplazada] == ["msg-6", "msg-7"]
+
+    def test_sesion_sin_mensajes(self, repositorio_contrato):
+        assert repositorio_contrato.obtener_mensajes_por_sesion("no-existe") == ([], 0)
+        assert repositorio_contrato.obtener_estadisticas_sesion("no-existe") is None
+        assert repositorio_contrato.obtener_version_sesion("no-existe") is None
+        assert repositorio_contrato.obtener_ultima_posicion("no-existe") is None
+
+    def test_iterar_en_orden_por_bloques(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote([fila_mensaje(f"msg-{i}", timestamp=_segundo(i)) for i in range(7)])
+
+        filas = list(repositorio_contrato.iterar_mensajes_sesion("session-001", tamano_bloque=2))
+
+        assert [m["message_id"] for m in filas] == [f"msg-{i}" for i in range(7)]
+        assert filas[0] == fila_mensaje("msg-0", timestamp=_segundo(0))
+
+    def test_iterador_cerrado_antes_de_terminar(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote([fila_mensaje(f"msg-{i}", timestamp=_segundo(i)) for i in range(5)])
+
+        filas = repositorio_contrato.iterar_mensajes_sesion("session-001", tamano_bloque=2)
+        assert next(filas)["message_id"] == "msg-0"
+        filas.close()
+
+        # La conexion queda lista para otras operaciones
+        repositorio_contrato.guardar_mensaje(fila_mensaje("msg-9", timestamp=_segundo(9)))
+        assert repositorio_contrato.obtener_ultima_posicion("session-001")[1] == "msg-9"
+
+    def test_agregados_y_version(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensaje(fila_mensaje("msg-1", timestamp=_segundo(5), sender="system"))
+        version = repositorio_contrato.obtener_version_sesion("session-001")
+        repositorio_contrato.guardar_mensajes_lote(
+            [
+                fila_mensaje("msg-2", timestamp=_segundo(1), content="uno dos tres"),
+                fila_mensaje("msg-3", timestamp=_segundo(9)),
+            ]
+        )
+
+        estadisticas = repositorio_contrato.obtener_estadisticas_sesion("session-001")
+        assert estadisticas["total_mensajes"] == 3
+        assert (estadisticas["mensajes_user"], estadisticas["mensajes_system"]) == (2, 1)
+        assert estadisticas["total_palabras"] == 7
+        assert estadisticas["primer_timestamp"] == _segundo(1)
+        assert estadisticas["ultimo_timestamp"] == _segundo(9)
+        assert repositorio_contrato.obtener_version_sesion("session-001") > version
+        assert repositorio_contrato.obtener_ultima_posicion("session-001") == (
+            timestamp_a_epoch_us(_segundo(9)),
+            "msg-3",
+        )
+
+    def test_contar_con_contadores_y_estimacion(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote(
+            [
+                fila_mensaje(f"msg-{i}", timestamp=_segundo(i), sender="system" if i % 4 == 0 else "user")
+                for i in range(20)
+            ]
+        )
+        rango = {"desde_us": timestamp_a_epoch_us(_segundo(5)), "hasta_us": timestamp_a_epoch_us(_segundo(15))}
+
+        assert repositorio_contrato.contar_mensajes_sesion("session-001", remitente="system") == (5, True)
+        assert repositorio_contrato.contar_mensajes_sesion("session-001", maximo_exacto=10, **rango) == (10, True)
+        assert repositorio_contrato.contar_mensajes_sesion("session-001", maximo_exacto=4, **rango) == (11, False)
+        assert repositorio_contrato.contar_mensajes_sesion("no-existe", maximo_exacto=4, **rango) == (0, True)
+
+    def test_buscar_por_prefijo_y_filtros(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote(
+            [
+                fila_mensaje("msg-1", content="necesito ayuda con mi pago"),
+                fila_mensaje("msg-2", content="el pago ya aparece", sender="system"),
+                fila_mensaje("msg-3", "session-002", content="pagos pendientes"),
+                fila_mensaje("msg-4", content="otra cosa"),
+            ]
+        )
+
+        assert {f["message_id"] for f in repositorio_contrato.buscar_mensajes("pago")} == {"msg-1", "msg-2"}
+        assert {f["message_id"] for f in repositorio_contrato.buscar_mensajes("pag*")} == {"msg-1", "msg-2", "msg-3"}
+        filtradas = repositorio_contrato.buscar_mensajes("pago", session_id="session-001", remitente="user")
+        assert [f["message_id"] for f in filtradas] == ["msg-1"]
+        assert "<mark>pago</mark>" in filtradas[0]["fragmento_texto"]
+        assert repositorio_contrato.buscar_mensajes("pago AND OR ayuda") == []
+        assert repositorio_contrato.buscar_mensajes("  ") == []
+
+    def test_buscar_ordena_por_relevancia_y_pagina(self, repositorio_contrato, fila_mensaje):
+        repositorio_contrato.guardar_mensajes_lote(
+            [fila_mensaje(f"msg-{i}", content="pago " * (i % 3 + 1) + "relleno " * 5) for i in range(9)]
+        )
+
+        todas = repositorio_contrato.buscar_mensajes("pago", limite=20)
+        claves = [(f["puntaje"], f["rowid"]) for f in todas]
+        assert len(todas) == 9 and claves == sorted(claves)
+
+        paginas, despues_de = [], None
+        while True:
+            pagina = repositorio_contrato.buscar_mensajes("pago", limite=4, despues_de=despues_de)
+            if not pagina:
+                break
+            paginas.extend(f["message_id"] for f in pagina)
+            despues_de = (pagina[-1]["puntaje"], pagina[-1]["rowid"])
+        assert paginas == [f["message_id"] for f in todas]
+
+
+@pytest.mark.skipif(not URL_POSTGRES, reason="MENSAJES_PRUEBAS_URL_POSTGRES no esta definida")
+class TestPoolPostgres:
+    def test_pool_abierto_entrega_conexiones(self):
+        pool = crear_pool_postgres(URL_POSTGRES)
+        try:
+            with conexion_postgres(pool) as conexion:
+                assert conexion.execute("SELECT 1 AS uno").fetchone() == {"uno": 1}
+            assert pool.get_stats()["pool_size"] >= 1
+        finally:
+            pool.close()
+
+
+class TestExpresionTsquery:
+    def test_terminos_literales_y_prefijo(self):
+        assert expresion_tsquery("hola  pag*") == "'hola' & 'pag':*"
+
+    def test_escapa_sintaxis_de_tsquery(self):
+        assert expresion_tsquery("o'neil a&b !x \\") == "'o''neil' & 'a&b' & '!x' & '\\\\'"
+
+    def test_vacia(self):
+        assert expresion_tsquery(" * ") == ""
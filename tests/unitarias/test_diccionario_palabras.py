@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+from app.esquemas.esquema_mensaje import MensajeEntrada
+from app.servicios.diccionario_palabras import DiccionarioPalabras, compilar_version
+from app.servicios.procesador_mensajes import ProcesadorMensajes
+
+
+def _escribir(ruta, contenido: str) -> None:
+    ruta.write_text(contenido, encoding="utf-8")
+    # Asegura un mtime distinto aunque el sistema de archivos tenga poca resolucion
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+
+
+class TestDiccionarioPalabras:
+    @pytest.fixture
+    def archivo(self, tmp_path):
+        ruta = tmp_path / "palabras.txt"
+        _escribir(ruta, "# palabras prohibidas\nidiota\n\nmierda\n")
+        return ruta
+
+    def test_carga_desde_archivo(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        assert diccionario.actual.palabras == 2
+        assert diccionario.filtro.filtrar_contenido("Eres un idiota") == "Eres un ******"
+
+    def test_version_depende_solo_de_las_palabras(self):
+        assert compilar_version(["b", "A"]).version == compilar_version(["a", "b"]).version
+        assert compilar_version(["a"]).version != compilar_version(["a", "b"]).version
+
+    def test_recarga_cuando_cambia_el_archivo(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        anterior = diccionario.actual
+        assert diccionario.recargar_si_cambio() is False
+
+        _escribir(archivo, "idiota\nmierda\nzopenco\n")
+        assert diccionario.recargar_si_cambio() is True
+        assert diccionario.actual.version != anterior.version
+        assert diccionario.filtro.filtrar_contenido("zopenco") == "*******"
+        # La version anterior sigue intacta para quien ya la estaba usando
+        assert anterior.filtro.filtrar_contenido("zopenco") == "zopenco"
+
+    def test_mismo_contenido_no_publica_version_nueva(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        _escribir(archivo, "mierda\nidiota\n")
+        assert diccionario.recargar_si_cambio() is False
+        assert diccionario.recargas == 0
+
+    def test_archivo_vacio_no_filtra_nada(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        _escribir(archivo, "# sin palabras por ahora\n")
+        assert diccionario.recargar_si_cambio() is True
+        assert diccionario.actual.palabras == 0
+        assert diccionario.filtro.filtrar_contenido("Eres un idiota") == "Eres un idiota"
+
+    def test_archivo_borrado_conserva_version(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        version = diccionario.actual.version
+        os.remove(archivo)
+        assert diccionario.recargar_si_cambio() is False
+        assert diccionario.actual.version == version
+        assert diccionario.recargas_fallidas == 1
+
+    def test_hilo_vigila_el_archivo(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo), intervalo=0.01)
+        diccionario.iniciar()
+        try:
+            _escribir(archivo, "zopenco\n")
+            limite = time.monotonic() + 2
+            while diccionario.recargas == 0 and time.monotonic() < limite:
+                time.sleep(0.01)
+        finally:
+            diccionario.detener()
+        assert diccionario.filtro.filtrar_contenido("zopenco") == "*******"
+
+    def test_sin_archivo_usa_lista_fija(self):
+        diccionario = DiccionarioPalabras(palabras=["tonto"])
+        diccionario.iniciar()
+        diccionario.detener()
+        assert diccionario.recargar_si_cambio() is False
+        assert diccionario.filtro.filtrar_contenido("tonto") == "*****"
+
+    def test_cuenta_coincidencias_por_palabra(self, archivo):
+        diccionario = DiccionarioPalabras(ruta=str(archivo))
+        procesador = ProcesadorMensajes(diccionario=diccionario)
+        for contenido in ("Eres un idiota", "IDIOTA y mierda", "Hola"):
+            procesador.procesar(MensajeEntrada(
+                message_id="msg-1",
+                session_id="session-1",
+                content=contenido,
+                timestamp="2023-06-15T14:30:00Z",
+                sender="user",
+            ))
+        assert diccionario.coincidencias() == {"idiota": 2, "mierda": 1}
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado, ErrorServicioNoDisponible
+from app.repositorios.base_datos import inicializar_base_datos, obtener_conexion
+from app.repositorios.escritor_agrupado import EscritorAgrupado
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+
+
+class TestEscritorAgrupado:
+    @pytest.fixture
+    def ruta_bd(self, tmp_path):
+        ruta = str(tmp_path / "escritor.db")
+        inicializar_base_datos(ruta)
+        return ruta
+
+    @pytest.fixture
+    def escritor(self, ruta_bd):
+        escritor = EscritorAgrupado(ruta_bd=ruta_bd, tamano_lote=64, intervalo_ms=20)
+        escritor.iniciar()
+        yield escritor
+        escritor.detener()
+
+    def _contar(self, ruta_bd: str) -> int:
+        conexion = obtener_conexion(ruta_bd)
+        try:
+            return conexion.execute("SELECT COUNT(*) FROM mensajes").fetchone()[0]
+        finally:
+            conexion.close()
+
+    def test_agrupa_escrituras_concurrentes(self, escritor, ruta_bd, fila_mensaje):
+        hilos = [threading.Thread(target=escritor.guardar, args=(fila_mensaje(f"msg-{i}"),)) for i in range(40)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert self._contar(ruta_bd) == 40
+        assert escritor.mensajes_confirmados == 40
+        assert escritor.lotes_confirmados < 40
+
+    def test_duplicado_se_reporta_al_llamador(self, escritor, fila_mensaje):
+        escritor.guardar(fila_mensaje("msg-001"))
+        with pytest.raises(ErrorMensajeDuplicado):
+            escritor.guardar(fila_mensaje("msg-001"))
+
+    def test_lote_a_traves_del_repositorio(self, escritor, ruta_bd, fila_mensaje):
+        conexion = obtener_conexion(ruta_bd)
+        repositorio = RepositorioMensajes(conexion, escritor=escritor)
+        duplicados = repositorio.guardar_mensajes_lote([fila_mensaje("a"), fila_mensaje("b"), fila_mensaje("a")])
+        conexion.close()
+        assert duplicados == {2}
+        assert self._contar(ruta_bd) == 2
+
+    def test_cola_llena_aplica_contrapresion(self, ruta_bd, fila_mensaje):
+        escritor = EscritorAgrupado(ruta_bd=ruta_bd, capacidad_cola=1, espera_encolar=0.01)
+        escritor.encolar(fila_mensaje("msg-001"))
+        with pytest.raises(ErrorServicioNoDisponible):
+            escritor.encolar(fila_mensaje("msg-002"))
+
+    def test_detener_confirma_pendientes(self, ruta_bd, fila_mensaje):
+        escritor = EscritorAgrupado(ruta_bd=ruta_bd, intervalo_ms=1000)
+        pendiente = escritor.encolar(fila_mensaje("msg-001"))
+        escritor.iniciar()
+        escritor.detener()
+        pendiente.resultado()
+        assert self._contar(ruta_bd) == 1
+
+    def test_falla_al_abrir_la_base_completa_los_pendientes(self, tmp_path, fila_mensaje):
+        escritor = EscritorAgrupado(ruta_bd=str(tmp_path / "no-existe" / "escritor.db"))
+        pendientes = [escritor.encolar(fila_mensaje(f"msg-{i}")) for i in range(3)]
+        escritor.iniciar()
+        escritor.detener()
+
+        for pendiente in pendientes:
+            with pytest.raises(ErrorServicioNoDisponible):
+                pendiente.resultado(espera=1)
+        with pytest.raises(ErrorServicioNoDisponible):
+            escritor.guardar(fila_mensaje("msg-nuevo"))
+
+    def test_espera_de_confirmacion_acotada(self, ruta_bd, fila_mensaje):
+        # Sin iniciar el hilo nada se confirma
+        escritor = EscritorAgrupado(ruta_bd=ruta_bd, espera_confirmacion=0.01)
+        with pytest.raises(ErrorServicioNoDisponible):
+            escritor.guardar(fila_mensaje("msg-001"))
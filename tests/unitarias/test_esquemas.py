@@ -64,3 +64,19 @@ class TestMensajeEntrada:
         mensaje_valido["timestamp"] = "2023-06-15T14:30:00+05:00"
         mensaje = MensajeEntrada(**mensaje_valido)
         assert mensaje.timestamp == "2023-06-15T14:30:00+05:00"
+
+    def test_timestamp_se_interpreta_una_vez(self, mensaje_valido, monkeypatch):
+        from app.esquemas import esquema_mensaje
+
+        llamadas = []
+        original = esquema_mensaje.timestamp_a_epoch_us
+
+        def contar(valor):
+            llamadas.append(valor)
+            return original(valor)
+
+        monkeypatch.setattr(esquema_mensaje, "timestamp_a_epoch_us", contar)
+        mensaje_valido["timestamp"] = "2023-06-15T14:30:00+05:00"
+        mensaje = MensajeEntrada(**mensaje_valido)
+        assert mensaje.timestamp_us == original("2023-06-15T09:30:00Z")
+        assert len(llamadas) == 1
@@ -38,3 +38,26 @@ class TestFiltroContenido:
         texto = "Hola, todo bien"
         resultado = self.filtro.filtrar_contenido(texto)
         assert resultado == texto
+
+    def test_filtrar_varias_palabras_en_una_pasada(self):
+        resultado = self.filtro.filtrar_contenido("Idiota, MIERDA y estupido")
+        assert resultado == "******, ****** y ********"
+
+    def test_analizar_detecta_y_enmascara(self):
+        resultado, encontradas = self.filtro.analizar("eres idiota, muy idiota")
+        assert resultado == "eres ******, muy ******"
+        assert encontradas == ["idiota"]
+
+    def test_palabras_con_prefijo_comun(self):
+        filtro = FiltroContenido(palabras_prohibidas=["put", "puta", "putas"])
+        resultado, encontradas = filtro.analizar("put puta putas putamente")
+        assert resultado == "*** **** ***** putamente"
+        assert encontradas == ["put", "puta", "putas"]
+
+    def test_muchas_palabras_prohibidas(self):
+        palabras = [f"palabra{i}" for i in range(2000)]
+        filtro = FiltroContenido(palabras_prohibidas=palabras)
+        es_inapropiado, encontradas = filtro.contiene_contenido_inapropiado("hola palabra1999 y palabra7")
+        assert es_inapropiado is True
+        assert encontradas == ["palabra1999", "palabra7"]
+        assert filtro.filtrar_contenido("palabra20000") == "palabra20000"
@@ -0,0 +1,66 @@
+import pytest
+
+from app.herramientas.fragmentar_base_datos import fragmentar_base_datos
+from app.repositorios.base_datos import obtener_conexion
+from app.repositorios.directorio_ids import ruta_directorio
+from app.repositorios.repositorio_fragmentado import indice_fragmento, rutas_fragmentos
+
+
+def _crear_origen(ruta: str, cantidad: int) -> None:
+    conexion = obtener_conexion(ruta)
+    conexion.executescript("""
+        CREATE TABLE mensajes (
+            message_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            sender TEXT NOT NULL CHECK(sender IN ('user', 'system')),
+            word_count INTEGER NOT NULL,
+            character_count INTEGER NOT NULL,
+            processed_at TEXT NOT NULL
+        );
+    """)
+    conexion.executemany(
+        "INSERT INTO mensajes VALUES (?, ?, 'hola', '2023-06-15T14:30:00Z', 'user', 1, 4, 'x')",
+        [(f"msg-{i}", f"sesion-{i % 10}") for i in range(cantidad)],
+    )
+    conexion.commit()
+    conexion.close()
+
+
+class TestFragmentarBaseDatos:
+    def test_reparte_cada_sesion_en_su_fragmento(self, tmp_path):
+        origen = str(tmp_path / "mensajes.db")
+        _crear_origen(origen, 100)
+
+        copiados = fragmentar_base_datos(origen, 3, tamano_bloque=7)
+
+        assert sum(copiados) == 100
+        for indice, ruta in enumerate(rutas_fragmentos(origen, 3)):
+            conexion = obtener_conexion(ruta)
+            sesiones = [fila[0] for fila in conexion.execute("SELECT DISTINCT session_id FROM mensajes")]
+            agregadas = {fila[0] for fila in conexion.execute("SELECT session_id FROM sesiones")}
+            conexion.close()
+            assert all(indice_fragmento(sesion, 3) == indice for sesion in sesiones)
+            assert agregadas == set(sesiones)
+
+    def test_registra_los_ids_en_el_directorio(self, tmp_path):
+        origen = str(tmp_path / "mensajes.db")
+        _crear_origen(origen, 30)
+
+        fragmentar_base_datos(origen, 3, directorio_ids=True)
+
+        conexion = obtener_conexion(ruta_directorio(origen))
+        filas = dict(conexion.execute("SELECT message_id, fragmento FROM ids_mensajes").fetchall())
+        conexion.close()
+        assert filas == {f"msg-{i}": indice_fragmento(f"sesion-{i % 10}", 3) for i in range(30)}
+
+    def test_se_puede_repetir(self, tmp_path):
+        origen = str(tmp_path / "mensajes.db")
+        _crear_origen(origen, 20)
+        fragmentar_base_datos(origen, 2)
+        assert fragmentar_base_datos(origen, 2) == [0, 0]
+
+    def test_requiere_al_menos_dos_fragmentos(self, tmp_path):
+        with pytest.raises(ValueError):
+            fragmentar_base_datos(str(tmp_path / "mensajes.db"), 1)
@@ -0,0 +1,27 @@
+from app.servicios.ids_recientes import IdsRecientes
+
+
+class TestIdsRecientes:
+    def test_contiene_lo_agregado(self):
+        ids = IdsRecientes(capacidad=10)
+        ids.agregar("msg-1")
+        assert ids.contiene("msg-1") is True
+        assert ids.contiene("msg-2") is False
+        assert (ids.aciertos, ids.fallos) == (1, 1)
+
+    def test_desaloja_el_menos_usado(self):
+        ids = IdsRecientes(capacidad=2)
+        ids.agregar("msg-1")
+        ids.agregar("msg-2")
+        ids.contiene("msg-1")
+        ids.agregar("msg-3")
+        assert len(ids) == 2
+        assert ids.contiene("msg-2") is False
+        assert ids.contiene("msg-1") is True
+
+    def test_descartar(self):
+        ids = IdsRecientes(capacidad=10)
+        ids.agregar("msg-1")
+        ids.descartar("msg-1")
+        ids.descartar("no-existe")
+        assert ids.contiene("msg-1") is False
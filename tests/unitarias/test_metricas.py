@@ -0,0 +1,44 @@
+from app.metricas import RegistroMetricas
+
+
+class TestRegistroMetricas:
+    def setup_method(self):
+        self.registro = RegistroMetricas()
+
+    def test_contador_con_etiquetas(self):
+        self.registro.describir("solicitudes_total", "Solicitudes")
+        self.registro.incrementar("solicitudes_total", codigo="201")
+        self.registro.incrementar("solicitudes_total", codigo="201")
+        self.registro.incrementar("solicitudes_total", codigo="409")
+        texto = self.registro.exportar_prometheus()
+        assert "# HELP solicitudes_total Solicitudes" in texto
+        assert "# TYPE solicitudes_total counter" in texto
+        assert 'solicitudes_total{codigo="201"} 2' in texto
+        assert 'solicitudes_total{codigo="409"} 1' in texto
+
+    def test_histograma_acumulativo(self):
+        self.registro.observar("latencia_segundos", 0.0002, etapa="filtrado")
+        self.registro.observar("latencia_segundos", 0.003, etapa="filtrado")
+        texto = self.registro.exportar_prometheus()
+        assert "# TYPE latencia_segundos histogram" in texto
+        assert 'latencia_segundos_bucket{etapa="filtrado",le="0.00025"} 1' in texto
+        assert 'latencia_segundos_bucket{etapa="filtrado",le="0.005"} 2' in texto
+        assert 'latencia_segundos_bucket{etapa="filtrado",le="+Inf"} 2' in texto
+        assert 'latencia_segundos_count{etapa="filtrado"} 2' in texto
+
+    def test_medir_registra_duracion(self):
+        with self.registro.medir("operacion_segundos", operacion="guardar"):
+            pass
+        assert 'operacion_segundos_count{operacion="guardar"} 1' in self.registro.exportar_prometheus()
+
+    def test_recolector_se_lee_al_exportar(self):
+        valores = {"entradas": 1}
+        self.registro.registrar_recolector("cache", lambda: [("cache_entradas", "gauge", valores["entradas"], {})])
+        valores["entradas"] = 7
+        texto = self.registro.exportar_prometheus()
+        assert "# TYPE cache_entradas gauge" in texto
+        assert "cache_entradas 7" in texto
+
+    def test_escapa_valores_de_etiquetas(self):
+        self.registro.incrementar("errores_total", detalle='con "comillas"')
+        assert 'errores_total{detalle="con \\"comillas\\""} 1' in self.registro.exportar_prometheus()
@@ -0,0 +1,98 @@
+"""Regresion de planes: cada consulta del repositorio usa un indice y ninguna ordena en un B-tree temporal."""
+import pytest
+
+from app.repositorios.retencion import CONSULTA_MAS_ANTIGUOS, CONSULTA_SESIONES_EXCEDIDAS, CONSULTA_SESIONES_VENCIDAS
+
+
+def _instante(indice: int) -> str:
+    """Timestamp del mensaje `indice`: 2023-06-15T14:30:00Z mas `indice` microsegundos."""
+    return f"2023-06-15T14:30:00.{indice:06d}Z"
+
+
+# Operacion -> llamada al repositorio (recibe tambien la fabrica `fila_mensaje`).
+# Cada consulta que ejecute se revisa con EXPLAIN QUERY PLAN.
+OPERACIONES = {
+    "pagina": lambda r, fila: r.obtener_mensajes_por_sesion("session-001"),
+    "pagina_por_sender": lambda r, fila: r.obtener_mensajes_por_sesion("session-001", remitente="system"),
+    "pagina_por_cursor": lambda r, fila: r.obtener_mensajes_por_sesion(
+        "session-001", despues_de=(1686839400000001, "msg-1"), incluir_total=False
+    ),
+    "pagina_por_sender_y_cursor": lambda r, fila: r.obtener_mensajes_por_sesion(
+        "session-001", remitente="user", despues_de=(1686839400000001, "msg-1")
+    ),
+    "pagina_por_rango": lambda r, fila: r.obtener_mensajes_por_sesion(
+        "session-001", remitente="user", desde_us=1686839400000000, hasta_us=1686839400000005
+    ),
+    "conteo_por_rango": lambda r, fila: r.contar_mensajes_sesion(
+        "session-001", remitente="user", desde_us=1686839400000002, maximo_exacto=2
+    ),
+    "exportacion": lambda r, fila: list(r.iterar_mensajes_sesion("session-001")),
+    "exportacion_por_sender": lambda r, fila: list(r.iterar_mensajes_sesion("session-001", remitente="user")),
+    "mensaje": lambda r, fila: r.obtener_mensaje("msg-1", "session-001"),
+    "estadisticas": lambda r, fila: r.obtener_estadisticas_sesion("session-001"),
+    "version": lambda r, fila: r.obtener_version_sesion("session-001"),
+    "ultima_posicion": lambda r, fila: r.obtener_ultima_posicion("session-001"),
+    "lote": lambda r, fila: r.guardar_mensajes_lote(
+        [fila("msg-100", timestamp=_instante(100)), fila("msg-1", timestamp=_instante(1))]
+    ),
+    "busqueda": lambda r, fila: r.buscar_mensajes("hola", session_id="session-001", remitente="user"),
+}
+
+# Ordenar por relevancia obliga a ordenar las coincidencias; FTS5 haria el mismo orden por dentro
+CON_ORDEN_PERMITIDO = {"busqueda"}
+
+
+class TestPlanesConsulta:
+    @pytest.fixture
+    def ejecutadas(self, conexion_bd, repositorio, fila_mensaje):
+        repositorio.guardar_mensajes_lote([
+            fila_mensaje(
+                f"msg-{i}", timestamp=_instante(i), sender="user" if i % 2 else "system", content=f"hola numero {i}"
+            )
+            for i in range(10)
+        ])
+        consultas: list[str] = []
+        conexion_bd.set_trace_callback(consultas.append)
+        yield consultas
+        conexion_bd.set_trace_callback(None)
+
+    def _plan(self, conexion_bd, consulta: str) -> list[str]:
+        return [fila[3] for fila in conexion_bd.execute("EXPLAIN QUERY PLAN " + consulta)]
+
+    @pytest.mark.parametrize("operacion", sorted(OPERACIONES))
+    def test_consultas_usan_indice_sin_ordenar(self, operacion, conexion_bd, repositorio, ejecutadas, fila_mensaje):
+        OPERACIONES[operacion](repositorio, fila_mensaje)
+        lecturas = [consulta for consulta in ejecutadas if consulta.lstrip().upper().startswith("SELECT")]
+        assert lecturas
+
+        for consulta in lecturas:
+            plan = self._plan(conexion_bd, consulta)
+            assert not [paso for paso in plan if paso.startswith("SCAN mensajes") and "VIRTUAL" not in paso], plan
+            if operacion not in CON_ORDEN_PERMITIDO:
+                assert not [paso for paso in plan if "TEMP B-TREE" in paso], plan
+
+    @pytest.mark.parametrize(
+        "operacion", ["pagina_por_sender", "pagina_por_sender_y_cursor", "conteo_por_rango", "exportacion_por_sender"]
+    )
+    def test_filtro_por_sender_usa_indice_compuesto(
+        self, operacion, conexion_bd, repositorio, ejecutadas, fila_mensaje
+    ):
+        OPERACIONES[operacion](repositorio, fila_mensaje)
+        # Los totales salen de la fila de `sesiones`; aqui importan las lecturas de `mensajes`
+        for consulta in [consulta for consulta in ejecutadas if "FROM mensajes" in consulta]:
+            plan = " ".join(self._plan(conexion_bd, consulta))
+            assert "idx_sesion_remitente_tiempo (session_id=? AND sender=?" in plan
+
+    def test_consultas_de_retencion(self, conexion_bd):
+        for consulta, parametros in (
+            (CONSULTA_MAS_ANTIGUOS, ("session-001", 0, 10)),
+            (CONSULTA_SESIONES_VENCIDAS, (0,)),
+            (CONSULTA_SESIONES_EXCEDIDAS, {"maximo": 10}),
+        ):
+            plan = [fila[3] for fila in conexion_bd.execute("EXPLAIN QUERY PLAN " + consulta, parametros)]
+            assert not [paso for paso in plan if "TEMP B-TREE" in paso or paso.startswith("SCAN mensajes")], plan
+
+    def test_esquema_sin_indices_de_baja_selectividad(self, conexion_bd):
+        indices = {fila[1] for fila in conexion_bd.execute("PRAGMA index_list(mensajes)")}
+        assert {"idx_sender", "idx_timestamp", "idx_session_id"}.isdisjoint(indices)
+        assert {"idx_sesion_tiempo", "idx_sesion_remitente_tiempo"} <= indices
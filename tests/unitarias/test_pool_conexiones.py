@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from app.excepciones.excepciones_api import ErrorServicioNoDisponible
+from app.repositorios.base_datos import inicializar_base_datos
+from app.repositorios.pool_conexiones import PoolConexiones
+
+
+class TestPoolConexiones:
+    @pytest.fixture
+    def pool(self, tmp_path):
+        ruta = str(tmp_path / "pool.db")
+        inicializar_base_datos(ruta)
+        pool = PoolConexiones(ruta_bd=ruta, tamano=2, tiempo_espera=0.05)
+        yield pool
+        pool.cerrar()
+
+    def test_reutiliza_conexion_devuelta(self, pool):
+        primera = pool.obtener()
+        pool.devolver(primera)
+        segunda = pool.obtener()
+        assert segunda is primera
+        assert pool.conexiones_creadas == 1
+
+    def test_crea_hasta_el_tamano_maximo(self, pool):
+        a = pool.obtener()
+        b = pool.obtener()
+        assert a is not b
+        assert pool.conexiones_creadas == 2
+
+    def test_pool_agotado_lanza_error(self, pool):
+        pool.obtener()
+        pool.obtener()
+        with pytest.raises(ErrorServicioNoDisponible):
+            pool.obtener()
+
+    def test_espera_conexion_de_otro_hilo(self, pool):
+        a = pool.obtener()
+        pool.obtener()
+        hilo = threading.Timer(0.01, pool.devolver, args=(a,))
+        hilo.start()
+        pool._tiempo_espera = 1.0
+        assert pool.obtener() is a
+        hilo.join()
+
+    def test_devolver_descarta_transaccion_abierta(self, pool):
+        conexion = pool.obtener()
+        conexion.execute(
+            "INSERT INTO mensajes VALUES ('m1', 's1', 'hola', '2023-06-15T14:30:00Z', 1686839400000000, 'user', 1, 4, 'x')"
+        )
+        assert conexion.in_transaction
+        pool.devolver(conexion)
+        with pool.conexion() as otra:
+            assert otra.execute("SELECT COUNT(*) FROM mensajes").fetchone()[0] == 0
+
+    def test_reemplaza_conexion_rota(self, pool):
+        conexion = pool.obtener()
+        conexion.close()
+        pool.devolver(conexion)
+        nueva = pool.obtener()
+        assert nueva is not conexion
+        assert nueva.execute("SELECT 1").fetchone()[0] == 1
+
+    def test_context_manager_devuelve_conexion(self, pool):
+        with pool.conexion() as conexion:
+            pass
+        assert pool.obtener() is conexion
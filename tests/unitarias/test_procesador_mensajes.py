@@ -1,7 +1,7 @@
 import pytest
 from datetime import datetime
 
-from app.esquemas.esquema_mensaje import MensajeEntrada
+from app.esquemas.esquema_mensaje import MensajeEntrada, MensajeProcesado
 from app.servicios.procesador_mensajes import ProcesadorMensajes
 from app.servicios.filtro_contenido import FiltroContenido
 from app.excepciones.excepciones_api import ErrorFormatoInvalido
@@ -28,23 +28,23 @@ class TestProcesadorMensajes:
         resultado = self.procesador.procesar(mensaje)
         assert resultado.message_id == "msg-001"
         assert resultado.content == "Hola mundo"
-        assert resultado.metadata is not None
+        assert resultado.timestamp_us == 1686839400000000
 
     def test_metadatos_conteo_palabras(self):
         mensaje = self._crear_mensaje(content="una dos tres cuatro")
         resultado = self.procesador.procesar(mensaje)
-        assert resultado.metadata.word_count == 4
+        assert resultado.word_count == 4
 
     def test_metadatos_conteo_caracteres(self):
         mensaje = self._crear_mensaje(content="Hola")
         resultado = self.procesador.procesar(mensaje)
-        assert resultado.metadata.character_count == 4
+        assert resultado.character_count == 4
 
     def test_processed_at_formato_iso(self):
         mensaje = self._crear_mensaje()
         resultado = self.procesador.procesar(mensaje)
         # Verificar que se puede parsear como ISO
-        datetime.fromisoformat(resultado.metadata.processed_at)
+        datetime.fromisoformat(resultado.processed_at)
 
     def test_contenido_solo_espacios_rechazado(self):
         mensaje = self._crear_mensaje(content="   ")
@@ -63,3 +63,10 @@ class TestProcesadorMensajes:
         assert resultado.session_id == "session-001"
         assert resultado.timestamp == "2023-06-15T14:30:00Z"
         assert resultado.sender == "user"
+
+    def test_respuesta_tiene_formato_de_la_api(self):
+        resultado = self.procesador.procesar(self._crear_mensaje(content="Eres un idiota"))
+        respuesta = MensajeProcesado.model_validate(resultado.respuesta())
+        assert respuesta.metadata.word_count == 3
+        assert respuesta.content == "Eres un ******"
+        assert resultado.fila()["timestamp_us"] == resultado.timestamp_us
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from contextlib import nullcontext
+
+import pytest
+
+from app.esquemas.esquema_mensaje import MensajeEntrada, timestamp_a_epoch_us
+from app.servicios.cursor_paginacion import codificar_cursor, decodificar_cursor
+from app.servicios.flujo_sesion import eventos_sesion
+from app.servicios.publicador_mensajes import PublicadorMensajes
+from app.servicios.servicio_mensajes import ServicioMensajes
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+
+
+def _entrada(message_id: str, minuto: int = 30, session_id: str = "session-001") -> MensajeEntrada:
+    return MensajeEntrada(
+        message_id=message_id,
+        session_id=session_id,
+        content="Hola mundo",
+        timestamp=f"2023-06-15T14:{minuto:02d}:00Z",
+        sender="user",
+    )
+
+
+def _ids_eventos(eventos: list[bytes]) -> list[str]:
+    """message_id de cada evento `message`, en orden (ignora latidos)."""
+    return [
+        decodificar_cursor(evento.split(b"\n")[0].removeprefix(b"id: ").decode())[1]
+        for evento in eventos
+        if evento.startswith(b"id: ")
+    ]
+
+
+class TestPublicadorMensajes:
+    def test_entrega_desde_otro_hilo(self):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("s1")
+            otra = publicador.suscribir("s2")
+            hilo = threading.Thread(target=publicador.publicar, args=("s1", [{"message_id": "m1"}]))
+            hilo.start()
+            recibidos = await suscripcion.esperar(1.0)
+            hilo.join()
+            return recibidos, await otra.esperar(0.01)
+
+        recibidos, otros = asyncio.run(_flujo())
+        assert recibidos == [{"message_id": "m1"}]
+        assert otros == []
+        assert publicador.publicados == 1
+
+    def test_desborde_corta_la_suscripcion(self):
+        publicador = PublicadorMensajes(capacidad_cola=2)
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("s1")
+            publicador.publicar("s1", [{"message_id": f"m{i}"} for i in range(3)])
+            await asyncio.sleep(0)
+            return suscripcion
+
+        suscripcion = asyncio.run(_flujo())
+        assert suscripcion.desbordada is True
+        assert publicador.desbordes == 1
+
+    def test_cancelar(self):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("s1")
+            assert publicador.suscriptores == 1
+            publicador.cancelar(suscripcion)
+
+        asyncio.run(_flujo())
+        assert publicador.suscriptores == 0
+        publicador.publicar("s1", [{"message_id": "m1"}])
+        assert publicador.publicados == 0
+
+
+class TestEventosSesion:
+    @pytest.fixture
+    def lecturas(self, repositorio, monkeypatch):
+        """Cuenta las lecturas de mensajes y de version que llegan al repositorio."""
+        contadas = {"obtener_mensajes_por_sesion": 0, "obtener_version_sesion": 0}
+        for nombre in contadas:
+            original = getattr(repositorio, nombre)
+
+            def _contar(*args, _nombre=nombre, _original=original, **kwargs):
+                contadas[_nombre] += 1
+                return _original(*args, **kwargs)
+
+            monkeypatch.setattr(repositorio, nombre, _contar)
+        return contadas
+
+    def test_reanuda_desde_cursor_y_sigue_en_vivo(self, repositorio, procesador):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, publicador=publicador)
+        for i in range(3):
+            servicio.crear_mensaje(_entrada(f"msg-{i}", minuto=30 + i))
+        asincrono = ServicioMensajesAsincrono(lambda: nullcontext(servicio))
+        cursor = codificar_cursor(timestamp_a_epoch_us("2023-06-15T14:30:00Z"), "msg-0")
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("session-001")
+            eventos = eventos_sesion(asincrono, publicador, suscripcion, cursor, latido=5.0)
+            recibidos = [await anext(eventos), await anext(eventos)]
+            await asincrono.crear_mensaje(_entrada("msg-vivo", minuto=10))
+            recibidos.append(await anext(eventos))
+            await eventos.aclose()
+            return recibidos
+
+        eventos = asyncio.run(_flujo())
+        assert _ids_eventos(eventos) == ["msg-1", "msg-2", "msg-vivo"]
+        assert b'"content":"Hola mundo"' in eventos[-1]
+
+    def test_latido_recupera_escrituras_de_otro_proceso(self, repositorio, procesador):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, publicador=publicador)
+        servicio.crear_mensaje(_entrada("msg-0"))
+        # Escribe sin publicador, como lo haria otro worker
+        otro_proceso = ServicioMensajes(repositorio=repositorio, procesador=procesador)
+        asincrono = ServicioMensajesAsincrono(lambda: nullcontext(servicio))
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("session-001")
+            cursor = servicio.obtener_cursor_final("session-001")
+            eventos = eventos_sesion(asincrono, publicador, suscripcion, cursor, latido=0.01)
+            otro_proceso.crear_mensaje(_entrada("msg-1", minuto=31))
+            primero = await anext(eventos)
+            await eventos.aclose()
+            return primero
+
+        assert _ids_eventos([asyncio.run(_flujo())]) == ["msg-1"]
+
+    def test_mensajes_locales_no_ocultan_los_de_otro_proceso(self, repositorio, procesador):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, publicador=publicador)
+        servicio.crear_mensaje(_entrada("msg-0"))
+        otro_proceso = ServicioMensajes(repositorio=repositorio, procesador=procesador)
+        asincrono = ServicioMensajesAsincrono(lambda: nullcontext(servicio))
+
+        async def _flujo():
+            suscripcion = publicador.suscribir("session-001")
+            # Lo de otro worker se busca en la base recien al cumplirse el latido
+            cursor = servicio.obtener_cursor_final("session-001")
+            eventos = eventos_sesion(asincrono, publicador, suscripcion, cursor, latido=0.3)
+            primero = asyncio.ensure_future(anext(eventos))
+            await asyncio.sleep(0.2)
+            # El mensaje de otro worker tiene un timestamp anterior al local que llega despues
+            otro_proceso.crear_mensaje(_entrada("msg-remoto", minuto=40))
+            await asincrono.crear_mensaje(_entrada("msg-local", minuto=50))
+            recibidos = [await asyncio.wait_for(primero, 1), await asyncio.wait_for(anext(eventos), 1)]
+            await eventos.aclose()
+            return recibidos
+
+        assert _ids_eventos(asyncio.run(_flujo())) == ["msg-local", "msg-remoto"]
+
+    def test_mensaje_local_no_lee_la_base(self, repositorio, procesador, lecturas):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, publicador=publicador)
+        servicio.crear_mensaje(_entrada("msg-0"))
+        asincrono = ServicioMensajesAsincrono(lambda: nullcontext(servicio))
+
+        async def _flujo():
+            cursor = servicio.obtener_cursor_final("session-001")
+            flujos = [
+                eventos_sesion(asincrono, publicador, publicador.suscribir("session-001"), cursor, latido=5.0)
+                for _ in range(3)
+            ]
+            pendientes = [asyncio.ensure_future(anext(eventos)) for eventos in flujos]
+            await asyncio.sleep(0.1)
+            # Ya se pusieron al dia: desde aqui ninguna lectura
+            lecturas.update(dict.fromkeys(lecturas, 0))
+            await asincrono.crear_mensaje(_entrada("msg-local", minuto=31))
+            recibidos = [await asyncio.wait_for(pendiente, 1) for pendiente in pendientes]
+            for eventos in flujos:
+                await eventos.aclose()
+            return recibidos
+
+        assert _ids_eventos(asyncio.run(_flujo())) == ["msg-local"] * 3
+        assert lecturas == {"obtener_mensajes_por_sesion": 0, "obtener_version_sesion": 0}
+
+    def test_una_revision_por_sesion(self, repositorio, procesador, lecturas):
+        publicador = PublicadorMensajes(capacidad_cola=10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, publicador=publicador)
+        servicio.crear_mensaje(_entrada("msg-0"))
+        otro_proceso = ServicioMensajes(repositorio=repositorio, procesador=procesador)
+        asincrono = ServicioMensajesAsincrono(lambda: nullcontext(servicio))
+
+        async def _flujo():
+            cursor = servicio.obtener_cursor_final("session-001")
+            flujos = [
+                eventos_sesion(asincrono, publicador, publicador.suscribir("session-001"), cursor, latido=0.05)
+                for _ in range(3)
+            ]
+            pendientes = [asyncio.ensure_future(anext(eventos)) for eventos in flujos]
+            await asyncio.sleep(0.02)
+            lecturas.update(dict.fromkeys(lecturas, 0))
+            otro_proceso.crear_mensaje(_entrada("msg-remoto", minuto=31))
+            recibidos = []
+            for eventos, pendiente in zip(flujos, pendientes):
+                evento = await asyncio.wait_for(pendiente, 1)
+                while evento.startswith(b": latido"):
+                    evento = await asyncio.wait_for(anext(eventos), 1)
+                recibidos.append(evento)
+            for eventos in flujos:
+                await eventos.aclose()
+            return recibidos
+
+        assert _ids_eventos(asyncio.run(_flujo())) == ["msg-remoto"] * 3
+        # Un solo suscriptor leyo los mensajes nuevos y los repartio a los demas
+        assert lecturas["obtener_mensajes_por_sesion"] == 1
@@ -0,0 +1,161 @@
+import pytest
+
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado
+from app.repositorios.base_datos import inicializar_base_datos
+from app.repositorios.directorio_ids import DirectorioIds, inicializar_directorio, ruta_directorio
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_fragmentado import (
+    RepositorioMensajesFragmentado,
+    indice_fragmento,
+    rutas_fragmentos,
+)
+
+FRAGMENTOS = 4
+# Sesion que cae en otro fragmento que "session-001"
+OTRA_SESION = next(
+    sesion
+    for sesion in (f"sesion-{i}" for i in range(100))
+    if indice_fragmento(sesion, FRAGMENTOS) != indice_fragmento("session-001", FRAGMENTOS)
+)
+
+
+def _contar(pool: PoolConexiones) -> int:
+    with pool.conexion() as conexion:
+        return conexion.execute("SELECT COUNT(*) FROM mensajes").fetchone()[0]
+
+
+class TestRutasFragmentos:
+    def test_un_fragmento_usa_la_ruta_base(self):
+        assert rutas_fragmentos("datos/mensajes.db", 1) == ["datos/mensajes.db"]
+
+    def test_varios_fragmentos(self):
+        assert rutas_fragmentos("datos/mensajes.db", 3) == [
+            "datos/mensajes.0.db", "datos/mensajes.1.db", "datos/mensajes.2.db",
+        ]
+
+    def test_indice_estable_y_en_rango(self):
+        indices = {indice_fragmento(f"sesion-{i}", FRAGMENTOS) for i in range(200)}
+        assert indices == set(range(FRAGMENTOS))
+        assert indice_fragmento("sesion-7", FRAGMENTOS) == indice_fragmento("sesion-7", FRAGMENTOS)
+
+
+class TestRepositorioMensajesFragmentado:
+    @pytest.fixture
+    def pools(self, tmp_path):
+        pools = []
+        for ruta in rutas_fragmentos(str(tmp_path / "mensajes.db"), FRAGMENTOS):
+            inicializar_base_datos(ruta)
+            pools.append(PoolConexiones(ruta_bd=ruta, tamano=2))
+        yield pools
+        for pool in pools:
+            pool.cerrar()
+
+    @pytest.fixture
+    def directorio(self, tmp_path):
+        ruta = ruta_directorio(str(tmp_path / "mensajes.db"))
+        inicializar_directorio(ruta)
+        directorio = DirectorioIds(PoolConexiones(ruta_bd=ruta, tamano=2))
+        yield directorio
+        directorio.cerrar()
+
+    @pytest.fixture
+    def repositorio(self, pools, directorio):
+        return RepositorioMensajesFragmentado(pools, directorio=directorio)
+
+    def test_sesion_vive_en_un_solo_fragmento(self, repositorio, pools, fila_mensaje):
+        for i in range(5):
+            repositorio.guardar_mensaje(fila_mensaje(f"msg-{i}"))
+        esperado = indice_fragmento("session-001", FRAGMENTOS)
+        assert [_contar(pool) for pool in pools] == [5 if i == esperado else 0 for i in range(FRAGMENTOS)]
+
+        mensajes, total = repositorio.obtener_mensajes_por_sesion("session-001", limite=3)
+        assert total == 5
+        assert [m["message_id"] for m in mensajes] == ["msg-0", "msg-1", "msg-2"]
+
+    def test_duplicado_en_el_mismo_fragmento(self, repositorio, fila_mensaje):
+        repositorio.guardar_mensaje(fila_mensaje("msg-001"))
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio.guardar_mensaje(fila_mensaje("msg-001"))
+
+    def test_lote_reparte_y_reporta_posiciones_originales(self, repositorio, pools, fila_mensaje):
+        sesiones = [f"sesion-{i}" for i in range(8)]
+        repositorio.guardar_mensaje(fila_mensaje("existente", session_id=sesiones[3]))
+        lote = [fila_mensaje(f"msg-{i}", session_id=sesion) for i, sesion in enumerate(sesiones)]
+        lote.append(fila_mensaje("existente", session_id=sesiones[3]))
+        lote.append(fila_mensaje("msg-5", session_id=sesiones[5]))
+
+        assert repositorio.guardar_mensajes_lote(lote) == {8, 9}
+        assert sum(_contar(pool) for pool in pools) == 9
+
+    def test_iterar_devuelve_la_conexion_al_terminar(self, repositorio, pools, fila_mensaje):
+        for i in range(3):
+            repositorio.guardar_mensaje(fila_mensaje(f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z"))
+        filas = repositorio.iterar_mensajes_sesion(
+            "session-001", desde_us=timestamp_a_epoch_us("2023-06-15T14:31:00Z")
+        )
+        assert [fila["message_id"] for fila in filas] == ["msg-1", "msg-2"]
+        # Ambas conexiones del pool del fragmento siguen disponibles
+        pool = pools[indice_fragmento("session-001", FRAGMENTOS)]
+        with pool.conexion(), pool.conexion():
+            pass
+
+    def test_busqueda_mezcla_fragmentos_y_pagina_sin_repetir(self, repositorio, fila_mensaje):
+        for i in range(12):
+            datos = fila_mensaje(f"msg-{i}", session_id=f"sesion-{i}")
+            datos["content"] = "hola " * (1 + i % 3) + "mundo"
+            repositorio.guardar_mensaje(datos)
+
+        vistos = []
+        despues_de = None
+        while True:
+            filas = repositorio.buscar_mensajes("hola", limite=5, despues_de=despues_de)
+            vistos.extend(fila["message_id"] for fila in filas)
+            if len(filas) < 5:
+                break
+            despues_de = (filas[-1]["puntaje"], filas[-1]["rowid"])
+        assert sorted(vistos) == sorted(f"msg-{i}" for i in range(12))
+
+        solo_una = repositorio.buscar_mensajes("hola", session_id="sesion-3")
+        assert [fila["message_id"] for fila in solo_una] == ["msg-3"]
+
+    def test_duplicado_en_otro_fragmento(self, repositorio, pools, fila_mensaje):
+        repositorio.guardar_mensaje(fila_mensaje("msg-001"))
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio.guardar_mensaje(fila_mensaje("msg-001", session_id=OTRA_SESION))
+
+        assert repositorio.guardar_mensajes_lote([fila_mensaje("msg-001", session_id=OTRA_SESION)]) == {0}
+        assert sum(_contar(pool) for pool in pools) == 1
+
+    def test_sin_directorio_el_id_es_unico_por_fragmento(self, pools, fila_mensaje):
+        repositorio = RepositorioMensajesFragmentado(pools)
+        repositorio.guardar_mensaje(fila_mensaje("msg-001"))
+        repositorio.guardar_mensaje(fila_mensaje("msg-001", session_id=OTRA_SESION))
+        assert sum(_contar(pool) for pool in pools) == 2
+
+    def test_libera_la_reserva_si_falla_la_escritura(self, repositorio, pools, fila_mensaje):
+        pool = pools[indice_fragmento("session-001", FRAGMENTOS)]
+        with pool.conexion() as conexion:
+            conexion.execute("DROP TABLE mensajes_fts")
+        with pytest.raises(Exception):
+            repositorio.guardar_mensaje(fila_mensaje("msg-001"))
+        with pytest.raises(Exception):
+            repositorio.guardar_mensajes_lote([fila_mensaje("msg-002")])
+
+        repositorio.guardar_mensaje(fila_mensaje("msg-001", session_id=OTRA_SESION))
+        assert repositorio.guardar_mensajes_lote([fila_mensaje("msg-002", session_id=OTRA_SESION)]) == set()
+
+    def test_directorio_nuevo_registra_ids_existentes(self, pools, tmp_path, fila_mensaje):
+        RepositorioMensajesFragmentado(pools).guardar_mensaje(fila_mensaje("msg-001"))
+        ruta = str(tmp_path / "otro.ids.db")
+
+        assert inicializar_directorio(ruta, rutas_fragmentos(str(tmp_path / "mensajes.db"), FRAGMENTOS)) == 1
+        directorio = DirectorioIds(PoolConexiones(ruta_bd=ruta, tamano=1))
+        repositorio = RepositorioMensajesFragmentado(pools, directorio=directorio)
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio.guardar_mensaje(fila_mensaje("msg-001", session_id=OTRA_SESION))
+        directorio.cerrar()
+
+    def test_escritores_deben_coincidir_con_pools(self, pools):
+        with pytest.raises(ValueError):
+            RepositorioMensajesFragmentado(pools, escritores=[object()])
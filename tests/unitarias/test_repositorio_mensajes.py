@@ -1,6 +1,8 @@
 import pytest
 
-from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from app.esquemas.esquema_mensaje import timestamp_a_epoch_us
+from app.repositorios.base_datos import MIGRACIONES, inicializar_base_datos, obtener_conexion, reconstruir_tabla_sesiones
+from app.repositorios.repositorio_mensajes import RepositorioMensajes, expresion_busqueda
 from app.excepciones.excepciones_api import ErrorMensajeDuplicado
 
 
@@ -17,6 +19,7 @@ class TestRepositorioMensajes:
             "processed_at": "2023-06-15T14:30:01Z",
         }
         datos.update(kwargs)
+        datos["timestamp_us"] = timestamp_a_epoch_us(datos["timestamp"])
         return datos
 
     def test_guardar_mensaje(self, repositorio):
@@ -82,3 +85,300 @@ class TestRepositorioMensajes:
         mensajes, _ = repositorio.obtener_mensajes_por_sesion("session-001")
         assert mensajes[0]["message_id"] == "msg-001"
         assert mensajes[1]["message_id"] == "msg-002"
+
+    def test_orden_cronologico_con_offsets_mixtos(self, repositorio):
+        # 15:00+02:00 es 13:00 UTC: va antes que 14:00Z aunque como texto ordene despues
+        repositorio.guardar_mensaje(
+            self._datos_mensaje(message_id="msg-a", timestamp="2023-06-15T14:00:00Z")
+        )
+        repositorio.guardar_mensaje(
+            self._datos_mensaje(message_id="msg-b", timestamp="2023-06-15T15:00:00+02:00")
+        )
+        mensajes, _ = repositorio.obtener_mensajes_por_sesion("session-001")
+        assert [m["message_id"] for m in mensajes] == ["msg-b", "msg-a"]
+
+    def test_rango_de_tiempo(self, repositorio):
+        for i in range(5):
+            repositorio.guardar_mensaje(
+                self._datos_mensaje(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
+            )
+        mensajes, total = repositorio.obtener_mensajes_por_sesion(
+            "session-001",
+            desde_us=timestamp_a_epoch_us("2023-06-15T14:31:00Z"),
+            hasta_us=timestamp_a_epoch_us("2023-06-15T16:33:00+02:00"),
+        )
+        assert [m["message_id"] for m in mensajes] == ["msg-1", "msg-2"]
+        assert total == 2
+
+    def test_total_sin_rango_sale_de_los_contadores(self, repositorio, conexion_bd):
+        repositorio.guardar_mensajes_lote(
+            [self._datos_mensaje(message_id=f"msg-{i}", sender="system" if i == 0 else "user") for i in range(4)]
+        )
+        consultas: list[str] = []
+        conexion_bd.set_trace_callback(consultas.append)
+        try:
+            _, total = repositorio.obtener_mensajes_por_sesion("session-001", remitente="user")
+            abarca = repositorio.contar_mensajes_sesion(
+                "session-001",
+                desde_us=timestamp_a_epoch_us("2023-06-15T14:00:00Z"),
+                hasta_us=timestamp_a_epoch_us("2023-06-15T15:00:00Z"),
+                maximo_exacto=1,
+            )
+        finally:
+            conexion_bd.set_trace_callback(None)
+        assert total == 3
+        assert abarca == (4, True)
+        assert not [consulta for consulta in consultas if "COUNT" in consulta]
+        assert repositorio.contar_mensajes_sesion("no-existe") == (0, True)
+
+    def test_total_con_rango_se_estima_pasado_el_tope(self, repositorio):
+        repositorio.guardar_mensajes_lote(
+            [self._datos_mensaje(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:30:{i:02d}Z") for i in range(20)]
+        )
+        rango = {
+            "desde_us": timestamp_a_epoch_us("2023-06-15T14:30:05Z"),
+            "hasta_us": timestamp_a_epoch_us("2023-06-15T14:30:15Z"),
+        }
+        assert repositorio.contar_mensajes_sesion("session-001", maximo_exacto=10, **rango) == (10, True)
+        assert repositorio.contar_mensajes_sesion("session-001", **rango) == (10, True)
+
+        # 20 mensajes repartidos en 19 s; el rango cubre 10 s
+        assert repositorio.contar_mensajes_sesion("session-001", maximo_exacto=4, **rango) == (11, False)
+
+    def test_guardar_lote(self, repositorio):
+        lote = [self._datos_mensaje(message_id=f"msg-{i}") for i in range(3)]
+        duplicados = repositorio.guardar_mensajes_lote(lote)
+        assert duplicados == set()
+        _, total = repositorio.obtener_mensajes_por_sesion("session-001")
+        assert total == 3
+
+    def test_guardar_lote_reporta_duplicados(self, repositorio):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-existente"))
+        lote = [
+            self._datos_mensaje(message_id="msg-nuevo"),
+            self._datos_mensaje(message_id="msg-existente"),
+            self._datos_mensaje(message_id="msg-nuevo"),
+        ]
+        duplicados = repositorio.guardar_mensajes_lote(lote)
+        assert duplicados == {1, 2}
+        _, total = repositorio.obtener_mensajes_por_sesion("session-001")
+        assert total == 2
+
+    def test_estadisticas_se_actualizan_al_guardar(self, repositorio):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1", timestamp="2023-06-15T14:30:00Z"))
+        repositorio.guardar_mensajes_lote([
+            self._datos_mensaje(message_id="msg-2", timestamp="2023-06-15T14:00:00Z", sender="system"),
+            self._datos_mensaje(message_id="msg-3", timestamp="2023-06-15T16:15:00+02:00"),
+            self._datos_mensaje(message_id="msg-1"),
+        ])
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-2"))
+
+        estadisticas = repositorio.obtener_estadisticas_sesion("session-001")
+        assert estadisticas["total_mensajes"] == 3
+        assert (estadisticas["mensajes_user"], estadisticas["mensajes_system"]) == (2, 1)
+        assert (estadisticas["total_palabras"], estadisticas["total_caracteres"]) == (6, 30)
+        assert estadisticas["primer_timestamp"] == "2023-06-15T14:00:00Z"
+        assert estadisticas["ultimo_timestamp"] == "2023-06-15T14:30:00Z"
+
+    def test_version_sube_con_cada_escritura(self, repositorio):
+        assert repositorio.obtener_version_sesion("session-001") is None
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1"))
+        assert repositorio.obtener_version_sesion("session-001") == 1
+        repositorio.guardar_mensajes_lote([self._datos_mensaje(message_id="msg-2")])
+        assert repositorio.obtener_version_sesion("session-001") == 2
+        with pytest.raises(ErrorMensajeDuplicado):
+            repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-2"))
+        assert repositorio.obtener_version_sesion("session-001") == 2
+
+    def test_reconstruir_conserva_y_sube_la_version(self, repositorio, conexion_bd):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1"))
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-2"))
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-3", session_id="session-002"))
+        conexion_bd.execute("DELETE FROM mensajes WHERE session_id = 'session-002'")
+        conexion_bd.commit()
+
+        assert reconstruir_tabla_sesiones(conexion_bd) == 1
+        assert repositorio.obtener_version_sesion("session-001") == 3
+        # La sesion vaciada conserva su fila en 0, asi que la version sigue subiendo
+        assert repositorio.obtener_estadisticas_sesion("session-002") is None
+        assert repositorio.obtener_version_sesion("session-002") == 2
+
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-4", session_id="session-002"))
+        estadisticas = repositorio.obtener_estadisticas_sesion("session-002")
+        assert estadisticas["total_mensajes"] == 1
+        assert estadisticas["version"] == 3
+        assert estadisticas["primer_timestamp_us"] == estadisticas["ultimo_timestamp_us"]
+
+    def test_buscar_sin_tildes_ni_mayusculas(self, repositorio):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1", content="Cómo cambio mi CONTRASEÑA"))
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-2", content="Hola mundo"))
+        filas = repositorio.buscar_mensajes("como contrasena")
+        assert [fila["message_id"] for fila in filas] == ["msg-1"]
+        assert "<mark>CONTRASEÑA</mark>" in filas[0]["fragmento_texto"]
+
+    def test_buscar_por_prefijo_y_filtros(self, repositorio):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1", content="transferencia fallida"))
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-2", content="transferir dinero", sender="system"))
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-3", session_id="otra", content="transferir"))
+        assert len(repositorio.buscar_mensajes("transfer*")) == 3
+        assert [f["message_id"] for f in repositorio.buscar_mensajes("transfer*", remitente="system")] == ["msg-2"]
+        assert len(repositorio.buscar_mensajes("transfer*", session_id="session-001")) == 2
+        assert repositorio.buscar_mensajes("transfer*", session_id="session") == []
+
+    def test_buscar_ordena_por_relevancia_y_pagina(self, repositorio):
+        for i, contenido in enumerate(["saldo", "saldo saldo saldo", "saldo y otras cosas mas largas", "nada"]):
+            repositorio.guardar_mensaje(self._datos_mensaje(message_id=f"msg-{i}", content=contenido))
+        primera = repositorio.buscar_mensajes("saldo", limite=2)
+        assert primera[0]["message_id"] == "msg-1"
+        segunda = repositorio.buscar_mensajes(
+            "saldo", limite=2, despues_de=(primera[-1]["puntaje"], primera[-1]["rowid"])
+        )
+        assert [f["message_id"] for f in primera + segunda] == ["msg-1", "msg-0", "msg-2"]
+
+    def test_indice_de_busqueda_sigue_los_borrados(self, repositorio, conexion_bd):
+        repositorio.guardar_mensaje(self._datos_mensaje(message_id="msg-1", content="borrame"))
+        conexion_bd.execute("DELETE FROM mensajes WHERE message_id = 'msg-1'")
+        conexion_bd.commit()
+        assert repositorio.buscar_mensajes("borrame") == []
+
+    def test_expresion_busqueda_no_admite_sintaxis_fts(self, repositorio):
+        repositorio.guardar_mensaje(self._datos_mensaje(content='dice "hola" OR NEAR content: x'))
+        assert expresion_busqueda('hola OR "x') == '"hola" "OR" """x"'
+        # Los operadores se buscan como palabras comunes, sin error de sintaxis
+        assert len(repositorio.buscar_mensajes('content: hola OR NEAR(')) == 1
+        assert repositorio.buscar_mensajes('hola AND chau') == []
+        assert repositorio.buscar_mensajes("* ** ") == []
+
+    def test_estadisticas_sesion_inexistente(self, repositorio):
+        assert repositorio.obtener_estadisticas_sesion("no-existe") is None
+
+    def test_guardar_lote_vacio(self, repositorio):
+        assert repositorio.guardar_mensajes_lote([]) == set()
+
+
+def _crear_base_antigua(ruta: str) -> None:
+    """Base con el esquema original: sin timestamp_us ni tabla sesiones."""
+    conexion = obtener_conexion(ruta)
+    conexion.executescript("""
+        CREATE TABLE mensajes (
+            message_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            sender TEXT NOT NULL CHECK(sender IN ('user', 'system')),
+            word_count INTEGER NOT NULL,
+            character_count INTEGER NOT NULL,
+            processed_at TEXT NOT NULL
+        );
+        CREATE INDEX idx_sesion_timestamp ON mensajes(session_id, timestamp);
+        INSERT INTO mensajes VALUES ('m1', 's1', 'hola', '2023-06-15T15:00:00+02:00', 'user', 1, 4, 'x');
+        INSERT INTO mensajes VALUES ('m2', 's1', 'hola', '2023-06-15T14:00:00Z', 'system', 2, 9, 'x');
+    """)
+    conexion.close()
+
+
+class TestMigracionBaseAntigua:
+    def test_migra_base_sin_timestamp_us(self, tmp_path):
+        ruta = str(tmp_path / "antigua.db")
+        _crear_base_antigua(ruta)
+
+        inicializar_base_datos(ruta)
+
+        conexion = obtener_conexion(ruta)
+        try:
+            filas = conexion.execute("SELECT message_id, timestamp_us FROM mensajes ORDER BY message_id").fetchall()
+            assert [tuple(f) for f in filas] == [
+                ("m1", timestamp_a_epoch_us("2023-06-15T13:00:00Z")),
+                ("m2", timestamp_a_epoch_us("2023-06-15T14:00:00Z")),
+            ]
+            indices = {f[1] for f in conexion.execute("PRAGMA index_list(mensajes)")}
+            assert "idx_sesion_tiempo" in indices
+            assert "idx_sesion_timestamp" not in indices
+        finally:
+            conexion.close()
+
+    def test_calcula_sesiones_desde_mensajes(self, tmp_path):
+        ruta = str(tmp_path / "antigua.db")
+        _crear_base_antigua(ruta)
+
+        inicializar_base_datos(ruta)
+
+        conexion = obtener_conexion(ruta)
+        try:
+            estadisticas = RepositorioMensajes(conexion).obtener_estadisticas_sesion("s1")
+        finally:
+            conexion.close()
+        assert estadisticas["total_mensajes"] == 2
+        assert (estadisticas["mensajes_user"], estadisticas["mensajes_system"]) == (1, 1)
+        assert (estadisticas["total_palabras"], estadisticas["total_caracteres"]) == (3, 13)
+        assert estadisticas["primer_timestamp"] == "2023-06-15T15:00:00+02:00"
+        assert estadisticas["ultimo_timestamp"] == "2023-06-15T14:00:00Z"
+
+    def test_agrega_version_a_sesiones_existentes(self, tmp_path):
+        ruta = str(tmp_path / "antigua.db")
+        _crear_base_antigua(ruta)
+        conexion = obtener_conexion(ruta)
+        conexion.execute("CREATE TABLE sesiones (session_id TEXT PRIMARY KEY, total_mensajes INTEGER NOT NULL)")
+        conexion.commit()
+        conexion.close()
+
+        inicializar_base_datos(ruta)
+
+        conexion = obtener_conexion(ruta)
+        try:
+            columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(sesiones)")}
+        finally:
+            conexion.close()
+        assert "version" in columnas
+
+    def test_indexa_mensajes_existentes_para_busqueda(self, tmp_path):
+        ruta = str(tmp_path / "antigua.db")
+        _crear_base_antigua(ruta)
+
+        inicializar_base_datos(ruta)
+
+        conexion = obtener_conexion(ruta)
+        try:
+            filas = RepositorioMensajes(conexion).buscar_mensajes("hola", session_id="s1")
+        finally:
+            conexion.close()
+        assert sorted(fila["message_id"] for fila in filas) == ["m1", "m2"]
+
+    def test_migraciones_quitan_indices_de_baja_selectividad(self, tmp_path):
+        ruta = str(tmp_path / "antigua.db")
+        _crear_base_antigua(ruta)
+        conexion = obtener_conexion(ruta)
+        conexion.executescript("""
+            CREATE INDEX idx_session_id ON mensajes(session_id);
+            CREATE INDEX idx_sender ON mensajes(sender);
+            CREATE INDEX idx_timestamp ON mensajes(timestamp);
+        """)
+        conexion.close()
+
+        inicializar_base_datos(ruta)
+        inicializar_base_datos(ruta)
+
+        conexion = obtener_conexion(ruta)
+        try:
+            version = conexion.execute("PRAGMA user_version").fetchone()[0]
+            indices = {f[1] for f in conexion.execute("PRAGMA index_list(mensajes)")}
+            mensajes, total = RepositorioMensajes(conexion).obtener_mensajes_por_sesion("s1", remitente="user")
+        finally:
+            conexion.close()
+        assert version == MIGRACIONES[-1][0]
+        assert {"idx_session_id", "idx_sender", "idx_timestamp"}.isdisjoint(indices)
+        assert "idx_sesion_remitente_tiempo" in indices
+        assert total == 1 and mensajes[0]["message_id"] == "m1"
+
+    def test_base_al_dia_no_vuelve_a_migrar(self, tmp_path, monkeypatch):
+        ruta = str(tmp_path / "nueva.db")
+        inicializar_base_datos(ruta)
+
+        def _no_deberia_correr(_):
+            raise AssertionError("migracion repetida")
+
+        monkeypatch.setattr(
+            "app.repositorios.base_datos.MIGRACIONES", [(version, _no_deberia_correr) for version, _ in MIGRACIONES]
+        )
+        inicializar_base_datos(ruta)
@@ -0,0 +1,24 @@
+import json
+
+from app.controladores.respuesta_json import RespuestaJSONRapida
+from app.esquemas.esquema_mensaje import MensajeProcesado, MetadatosMensaje
+
+
+class TestRespuestaJSONRapida:
+    def test_serializa_modelos_anidados(self):
+        mensaje = MensajeProcesado(
+            message_id="msg-001",
+            session_id="session-001",
+            content="Cañón ñandú",
+            timestamp="2023-06-15T14:30:00Z",
+            sender="user",
+            metadata=MetadatosMensaje(word_count=2, character_count=11, processed_at="x"),
+        )
+        respuesta = RespuestaJSONRapida({"status": "success", "data": mensaje}, status_code=201)
+        assert respuesta.status_code == 201
+        assert respuesta.headers["content-type"] == "application/json"
+        assert json.loads(respuesta.body) == {"status": "success", "data": mensaje.model_dump()}
+
+    def test_no_escapa_caracteres_unicode(self):
+        respuesta = RespuestaJSONRapida({"content": "ñandú"})
+        assert "ñandú".encode() in respuesta.body
@@ -0,0 +1,211 @@
+import gzip
+import json
+import time
+from functools import partial
+
+import pytest
+
+from app.configuracion import Configuracion
+from app.herramientas.aplicar_retencion import main as aplicar_retencion
+from app.repositorios.base_datos import inicializar_base_datos, obtener_conexion
+from app.repositorios.directorio_ids import DirectorioIds, inicializar_directorio, ruta_directorio
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.repositorios.repositorio_fragmentado import RepositorioMensajesFragmentado, indice_fragmento, rutas_fragmentos
+from app.repositorios.repositorio_mensajes import RepositorioMensajes
+from app.repositorios.retencion import Retencion
+
+DIA_US = 86_400_000_000
+# 2023-06-15T00:00:00Z
+BASE_US = 1686787200000000
+
+
+class TestRetencion:
+    @pytest.fixture
+    def datos(self, fila_mensaje):
+        """Mensaje `indice` de la sesion, `dias` despues del 2023-06-15 (mas `indice` microsegundos)."""
+        def _datos(indice: int, session_id: str = "session-001", dias: int = 0, sender: str = "user") -> dict:
+            return fila_mensaje(
+                f"msg-{session_id}-{indice}",
+                session_id,
+                timestamp=f"2023-06-{15 + dias:02d}T00:00:00.{indice:06d}Z",
+                sender=sender,
+                content=f"mensaje numero {indice}",
+            )
+
+        return _datos
+
+    @pytest.fixture
+    def ruta_bd(self, tmp_path):
+        ruta = str(tmp_path / "mensajes.db")
+        inicializar_base_datos(ruta)
+        return ruta
+
+    @pytest.fixture
+    def repositorio(self, ruta_bd):
+        repositorio = RepositorioMensajes(obtener_conexion(ruta_bd))
+        yield repositorio
+        repositorio.cerrar()
+
+    def _retencion(self, ruta_bd, tmp_path, **kwargs) -> Retencion:
+        opciones = {"dias": 0, "maximo_por_sesion": 0, "tamano_lote": 3, "pausa_ms": 0}
+        opciones.update(kwargs)
+        return Retencion(ruta_bd, directorio_archivo=str(tmp_path / "archivo"), **opciones)
+
+    def _archivados(self, tmp_path) -> list[dict]:
+        filas = []
+        for ruta in sorted((tmp_path / "archivo").glob("*.ndjson.gz")):
+            with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+                filas.extend(json.loads(linea) for linea in archivo)
+        return filas
+
+    def test_borra_por_antiguedad_y_archiva(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(7)] + [datos(i, dias=9) for i in range(7, 9)])
+        retencion = self._retencion(ruta_bd, tmp_path, dias=5)
+
+        resultado = retencion.ejecutar(ahora_us=BASE_US + 10 * DIA_US)
+
+        assert resultado["borrados"] == 7
+        restantes, _ = repositorio.obtener_mensajes_por_sesion("session-001")
+        assert [m["message_id"] for m in restantes] == ["msg-session-001-7", "msg-session-001-8"]
+        archivados = self._archivados(tmp_path)
+        assert sorted(fila["message_id"] for fila in archivados) == [f"msg-session-001-{i}" for i in range(7)]
+        assert "rowid" not in archivados[0]
+
+    def test_actualiza_agregados_y_version(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote(
+            [datos(0, sender="system"), datos(1)] + [datos(i, dias=9) for i in range(2, 5)]
+        )
+        version = repositorio.obtener_version_sesion("session-001")
+
+        self._retencion(ruta_bd, tmp_path, dias=5).ejecutar(ahora_us=BASE_US + 10 * DIA_US)
+
+        estadisticas = repositorio.obtener_estadisticas_sesion("session-001")
+        assert estadisticas["total_mensajes"] == 3
+        assert estadisticas["mensajes_system"] == 0
+        assert estadisticas["total_palabras"] == 9
+        assert estadisticas["primer_timestamp_us"] == BASE_US + 9 * DIA_US + 2
+        assert repositorio.obtener_version_sesion("session-001") > version
+
+    def test_sesion_vaciada_conserva_version(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(4)])
+        self._retencion(ruta_bd, tmp_path, dias=1).ejecutar(ahora_us=BASE_US + 10 * DIA_US)
+
+        assert repositorio.obtener_estadisticas_sesion("session-001") is None
+        version = repositorio.obtener_version_sesion("session-001")
+        assert version is not None
+
+        repositorio.guardar_mensaje(datos(50, dias=10))
+        estadisticas = repositorio.obtener_estadisticas_sesion("session-001")
+        assert estadisticas["total_mensajes"] == 1
+        assert estadisticas["primer_timestamp_us"] == estadisticas["ultimo_timestamp_us"] == BASE_US + 10 * DIA_US + 50
+        assert repositorio.obtener_version_sesion("session-001") == version + 1
+
+    def test_maximo_por_sesion_borra_los_mas_antiguos(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(10)] + [datos(i, "session-002") for i in range(2)])
+
+        resultado = self._retencion(ruta_bd, tmp_path, maximo_por_sesion=4).ejecutar()
+
+        assert resultado["borrados"] == 6
+        restantes, total = repositorio.obtener_mensajes_por_sesion("session-001")
+        assert total == 4
+        assert [m["message_id"] for m in restantes] == [f"msg-session-001-{i}" for i in range(6, 10)]
+        assert repositorio.obtener_estadisticas_sesion("session-002")["total_mensajes"] == 2
+
+    def test_borrado_sale_del_indice_de_busqueda(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(3)])
+        self._retencion(ruta_bd, tmp_path, maximo_por_sesion=1).ejecutar()
+
+        assert len(repositorio.buscar_mensajes("mensaje")) == 1
+
+    def test_sin_directorio_no_archiva(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(3)])
+        retencion = Retencion(ruta_bd, maximo_por_sesion=1, directorio_archivo="", pausa_ms=0)
+
+        assert retencion.ejecutar()["borrados"] == 2
+        assert not (tmp_path / "archivo").exists()
+
+    def test_libera_paginas_con_vacuum_incremental(self, ruta_bd, repositorio, tmp_path, datos):
+        repositorio.guardar_mensajes_lote([{**datos(i), "content": "x" * 2000} for i in range(200)])
+        conexion = obtener_conexion(ruta_bd)
+        try:
+            assert conexion.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        finally:
+            conexion.close()
+
+        resultado = self._retencion(ruta_bd, tmp_path, maximo_por_sesion=1, tamano_lote=100).ejecutar()
+
+        assert resultado["borrados"] == 199
+        assert resultado["paginas_liberadas"] > 0
+
+    def test_sin_politica_no_inicia_hilo(self, ruta_bd, tmp_path):
+        retencion = self._retencion(ruta_bd, tmp_path)
+        retencion.iniciar()
+        assert not retencion.activa
+        assert retencion._hilo is None
+        retencion.detener()
+
+    def test_error_inesperado_no_detiene_el_hilo(self, ruta_bd, tmp_path, monkeypatch):
+        retencion = self._retencion(ruta_bd, tmp_path, dias=1, intervalo=0.01)
+        pasadas = []
+
+        def _ejecutar():
+            pasadas.append(1)
+            raise ValueError("fila invalida")
+
+        monkeypatch.setattr(retencion, "ejecutar", _ejecutar)
+        retencion.iniciar()
+        limite = time.monotonic() + 5
+        while len(pasadas) < 3 and time.monotonic() < limite:
+            time.sleep(0.01)
+        vivo = retencion._hilo.is_alive()
+        retencion.detener()
+
+        assert vivo
+        assert retencion.errores >= 3
+        assert retencion.ultimo_error == "fila invalida"
+
+    def test_modo_checkpoint_invalido(self, ruta_bd, monkeypatch):
+        monkeypatch.setattr(Configuracion, "MODO_CHECKPOINT_RETENCION", "NADA; DROP")
+        with pytest.raises(ValueError):
+            Retencion(ruta_bd)
+
+    def test_herramienta(self, ruta_bd, repositorio, tmp_path, capsys, datos):
+        repositorio.guardar_mensajes_lote([datos(i) for i in range(5)])
+
+        aplicar_retencion([ruta_bd, "--maximo-por-sesion", "2", "--directorio-archivo", str(tmp_path / "archivo")])
+
+        assert "3 mensajes borrados" in capsys.readouterr().out
+        assert len(self._archivados(tmp_path)) == 3
+
+
+class TestRetencionConDirectorioIds:
+    @pytest.fixture
+    def fragmentado(self, tmp_path):
+        base = str(tmp_path / "mensajes.db")
+        rutas = rutas_fragmentos(base, 2)
+        for ruta in rutas:
+            inicializar_base_datos(ruta)
+        inicializar_directorio(ruta_directorio(base))
+        pools = [PoolConexiones(ruta_bd=ruta, tamano=1) for ruta in rutas]
+        directorio = DirectorioIds(PoolConexiones(ruta_bd=ruta_directorio(base), tamano=1))
+        yield rutas, directorio, RepositorioMensajesFragmentado(pools, directorio=directorio)
+        for pool in pools:
+            pool.cerrar()
+        directorio.cerrar()
+
+    def test_reinsertar_un_id_borrado(self, fragmentado, fila_mensaje):
+        rutas, directorio, repositorio = fragmentado
+        otra = next(f"sesion-{i}" for i in range(100) if indice_fragmento(f"sesion-{i}", 2) == 1)
+        primera = next(f"sesion-{i}" for i in range(100) if indice_fragmento(f"sesion-{i}", 2) == 0)
+        repositorio.guardar_mensaje(fila_mensaje("msg-viejo", primera, timestamp="2023-06-15T00:00:00Z"))
+        repositorio.guardar_mensaje(fila_mensaje("msg-reciente", primera, timestamp="2023-06-30T00:00:00Z"))
+
+        retencion = Retencion(
+            rutas[0], dias=5, maximo_por_sesion=0, directorio_archivo="", pausa_ms=0,
+            al_borrar_ids=partial(directorio.liberar, fragmento=0),
+        )
+        assert retencion.ejecutar(ahora_us=BASE_US + 15 * DIA_US)["borrados"] == 1
+
+        # El id borrado vuelve a estar libre, tambien en otro fragmento; el que sigue no
+        repositorio.guardar_mensaje(fila_mensaje("msg-viejo", otra))
+        assert repositorio.guardar_mensajes_lote([fila_mensaje("msg-reciente", otra)]) == {0}
@@ -1,7 +1,12 @@
+import json
+
 import pytest
 
-from app.esquemas.esquema_mensaje import MensajeEntrada
-from app.excepciones.excepciones_api import ErrorSesionNoEncontrada, ErrorMensajeDuplicado
+from app.esquemas.esquema_mensaje import MensajeEntrada, timestamp_a_epoch_us
+from app.excepciones.excepciones_api import ErrorCursorInvalido, ErrorSesionNoEncontrada, ErrorMensajeDuplicado
+from app.servicios.cache_paginas import CachePaginas
+from app.servicios.ids_recientes import IdsRecientes
+from app.servicios.servicio_mensajes import ServicioMensajes
 
 
 class TestServicioMensajes:
@@ -20,13 +25,13 @@ class TestServicioMensajes:
         entrada = self._crear_entrada()
         resultado = servicio.crear_mensaje(entrada)
         assert resultado.message_id == "msg-001"
-        assert resultado.metadata is not None
+        assert resultado.processed_at
 
     def test_crear_mensaje_tiene_metadatos(self, servicio):
         entrada = self._crear_entrada(content="una dos tres")
         resultado = servicio.crear_mensaje(entrada)
-        assert resultado.metadata.word_count == 3
-        assert resultado.metadata.character_count == 12
+        assert resultado.word_count == 3
+        assert resultado.character_count == 12
 
     def test_crear_mensaje_duplicado(self, servicio):
         entrada = self._crear_entrada()
@@ -36,7 +41,7 @@ class TestServicioMensajes:
 
     def test_obtener_mensajes_exitoso(self, servicio):
         servicio.crear_mensaje(self._crear_entrada())
-        mensajes, total = servicio.obtener_mensajes_sesion("session-001")
+        mensajes, total, _, _ = servicio.obtener_mensajes_sesion("session-001")
         assert total == 1
         assert "metadata" in mensajes[0]
         assert mensajes[0]["metadata"]["word_count"] == 2
@@ -50,13 +55,227 @@ class TestServicioMensajes:
             servicio.crear_mensaje(
                 self._crear_entrada(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
             )
-        mensajes, total = servicio.obtener_mensajes_sesion("session-001", limite=2)
+        mensajes, total, _, _ = servicio.obtener_mensajes_sesion("session-001", limite=2)
         assert len(mensajes) == 2
         assert total == 5
 
     def test_obtener_con_filtro_remitente(self, servicio):
         servicio.crear_mensaje(self._crear_entrada(message_id="msg-001", sender="user"))
         servicio.crear_mensaje(self._crear_entrada(message_id="msg-002", sender="system"))
-        mensajes, total = servicio.obtener_mensajes_sesion("session-001", remitente="system")
+        mensajes, total, _, _ = servicio.obtener_mensajes_sesion("session-001", remitente="system")
         assert total == 1
         assert mensajes[0]["sender"] == "system"
+
+    def test_crear_lote_resultados_por_elemento(self, servicio):
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-existente"))
+        base = self._crear_entrada().model_dump()
+        entradas = [
+            {**base, "message_id": "msg-a", "content": "Eres un idiota"},
+            {**base, "message_id": "msg-existente"},
+            {**base, "message_id": "msg-b", "sender": "bot"},
+            {**base, "message_id": "msg-c", "content": "   "},
+            "no es un objeto",
+        ]
+        resultados = servicio.crear_mensajes_lote(entradas)
+
+        assert [r["index"] for r in resultados] == [0, 1, 2, 3, 4]
+        assert resultados[0]["status"] == "success"
+        assert "idiota" not in resultados[0]["data"]["content"]
+        assert resultados[1]["error"]["code"] == "DUPLICATE_MESSAGE"
+        assert resultados[1]["http_status"] == 409
+        assert resultados[2]["error"]["code"] == "VALIDATION_ERROR"
+        assert resultados[3]["error"]["code"] == "INVALID_FORMAT"
+        assert resultados[4]["message_id"] is None
+
+        _, total, _, _ = servicio.obtener_mensajes_sesion("session-001")
+        assert total == 2
+
+    def test_paginacion_por_cursor_recorre_todo(self, servicio):
+        for i in range(5):
+            servicio.crear_mensaje(
+                self._crear_entrada(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
+            )
+        vistos = []
+        cursor = None
+        while True:
+            mensajes, total, cursor, _ = servicio.obtener_mensajes_sesion(
+                "session-001", limite=2, cursor=cursor, incluir_total=False
+            )
+            assert total is None
+            vistos.extend(m["message_id"] for m in mensajes)
+            if cursor is None:
+                break
+        assert vistos == [f"msg-{i}" for i in range(5)]
+
+    def test_total_estimado_en_rangos_grandes(self, repositorio, procesador):
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, maximo_conteo_exacto=2)
+        for i in range(6):
+            servicio.crear_mensaje(self._crear_entrada(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z"))
+
+        _, total, _, exacto = servicio.obtener_mensajes_sesion("session-001")
+        assert (total, exacto) == (6, True)
+        _, total, _, exacto = servicio.obtener_mensajes_sesion(
+            "session-001", desde_us=timestamp_a_epoch_us("2023-06-15T14:31:00Z")
+        )
+        assert exacto is False
+        assert 3 <= total <= 6
+        _, total, _, exacto = servicio.obtener_mensajes_sesion("session-001", incluir_total=False)
+        assert (total, exacto) == (None, True)
+
+    def test_cursor_desempata_por_message_id(self, servicio):
+        for message_id in ["msg-b", "msg-a", "msg-c"]:
+            servicio.crear_mensaje(self._crear_entrada(message_id=message_id))
+        primera, _, cursor, _ = servicio.obtener_mensajes_sesion("session-001", limite=2)
+        segunda, _, fin, _ = servicio.obtener_mensajes_sesion("session-001", limite=2, cursor=cursor)
+        assert [m["message_id"] for m in primera + segunda] == ["msg-a", "msg-b", "msg-c"]
+        assert fin is None
+
+    def test_cursor_invalido(self, servicio):
+        servicio.crear_mensaje(self._crear_entrada())
+        with pytest.raises(ErrorCursorInvalido):
+            servicio.obtener_mensajes_sesion("session-001", cursor="no-es-un-cursor")
+
+    def test_reintento_reciente_no_se_procesa(self, repositorio, procesador, monkeypatch):
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, ids_recientes=IdsRecientes(10))
+        servicio.crear_mensaje(self._crear_entrada())
+
+        def _no_deberia_procesar(_):
+            raise AssertionError("un duplicado conocido no debe pasar por el pipeline")
+
+        monkeypatch.setattr(procesador, "procesar", _no_deberia_procesar)
+        with pytest.raises(ErrorMensajeDuplicado):
+            servicio.crear_mensaje(self._crear_entrada())
+
+    def test_id_reciente_borrado_se_vuelve_a_guardar(self, repositorio, procesador, conexion_bd):
+        ids = IdsRecientes(10)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, ids_recientes=ids)
+        servicio.crear_mensaje(self._crear_entrada())
+        conexion_bd.execute("DELETE FROM mensajes")
+        conexion_bd.commit()
+        _, creado = servicio.registrar_mensaje(self._crear_entrada())
+        assert creado is True
+
+    def test_modo_idempotente_devuelve_el_original(self, repositorio, procesador):
+        servicio = ServicioMensajes(
+            repositorio=repositorio, procesador=procesador, ids_recientes=IdsRecientes(10), idempotente=True
+        )
+        original, creado = servicio.registrar_mensaje(self._crear_entrada(content="Hola mundo"))
+        assert creado is True
+        repetido, creado = servicio.registrar_mensaje(self._crear_entrada(content="Otro texto"))
+        assert creado is False
+        assert repetido == original
+
+    def test_modo_idempotente_sin_ids_recientes(self, repositorio, procesador):
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, idempotente=True)
+        servicio.crear_mensaje(self._crear_entrada())
+        _, creado = servicio.registrar_mensaje(self._crear_entrada())
+        assert creado is False
+
+    def test_modo_idempotente_otra_sesion_es_conflicto(self, repositorio, procesador):
+        servicio = ServicioMensajes(
+            repositorio=repositorio, procesador=procesador, ids_recientes=IdsRecientes(10), idempotente=True
+        )
+        servicio.crear_mensaje(self._crear_entrada())
+        with pytest.raises(ErrorMensajeDuplicado):
+            servicio.registrar_mensaje(self._crear_entrada(session_id="session-002"))
+
+    def test_lote_idempotente(self, repositorio, procesador):
+        servicio = ServicioMensajes(
+            repositorio=repositorio, procesador=procesador, ids_recientes=IdsRecientes(10), idempotente=True
+        )
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-reciente"))
+        repositorio.guardar_mensaje(procesador.procesar(self._crear_entrada(message_id="msg-viejo")).fila())
+        entradas = [
+            self._crear_entrada(message_id=message_id).model_dump()
+            for message_id in ("msg-reciente", "msg-viejo", "msg-nuevo")
+        ]
+        resultados = servicio.crear_mensajes_lote(entradas)
+        assert [r["http_status"] for r in resultados] == [200, 200, 201]
+        assert resultados[0]["data"]["message_id"] == "msg-reciente"
+
+    def test_cache_sirve_paginas_e_invalida_al_escribir(self, repositorio, procesador):
+        cache = CachePaginas(max_entradas=10, max_bytes=10_000, ttl_segundos=60)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, cache=cache)
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-001"))
+
+        primera = servicio.obtener_mensajes_sesion("session-001")
+        assert servicio.obtener_mensajes_sesion("session-001") is primera
+        assert cache.estadisticas()["hits"] == 1
+
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-002"))
+        mensajes, total, _, _ = servicio.obtener_mensajes_sesion("session-001")
+        assert total == 2
+        assert len(mensajes) == 2
+
+    def test_cache_no_sirve_paginas_de_otra_version(self, repositorio, procesador, conexion_bd):
+        cache = CachePaginas(max_entradas=10, max_bytes=10_000, ttl_segundos=60)
+        servicio = ServicioMensajes(repositorio=repositorio, procesador=procesador, cache=cache)
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-001"))
+        version = servicio.obtener_version_sesion("session-001")
+        servicio.obtener_mensajes_sesion("session-001", version=version)
+
+        # Escritura hecha por otro proceso: no pasa por este cache
+        otro = ServicioMensajes(repositorio=repositorio, procesador=procesador)
+        otro.crear_mensaje(self._crear_entrada(message_id="msg-002"))
+        nueva = servicio.obtener_version_sesion("session-001")
+        assert nueva == version + 1
+        _, total, _, _ = servicio.obtener_mensajes_sesion("session-001", version=nueva)
+        assert total == 2
+
+    def test_exportar_ndjson_completo(self, servicio):
+        for i in range(5):
+            servicio.crear_mensaje(
+                self._crear_entrada(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
+            )
+        bloques = list(servicio.exportar_mensajes("session-001", lineas_por_bloque=2))
+        assert len(bloques) == 3
+        lineas = b"".join(bloques).decode().splitlines()
+        assert [json.loads(linea)["message_id"] for linea in lineas] == [f"msg-{i}" for i in range(5)]
+        assert "metadata" in json.loads(lineas[0])
+
+    def test_exportar_con_rango_de_tiempo(self, servicio):
+        for i in range(5):
+            servicio.crear_mensaje(
+                self._crear_entrada(message_id=f"msg-{i}", timestamp=f"2023-06-15T14:3{i}:00Z")
+            )
+        bloques = servicio.exportar_mensajes(
+            "session-001",
+            desde_us=timestamp_a_epoch_us("2023-06-15T14:31:00Z"),
+            hasta_us=timestamp_a_epoch_us("2023-06-15T14:33:00Z"),
+        )
+        ids = [json.loads(linea)["message_id"] for linea in b"".join(bloques).splitlines()]
+        assert ids == ["msg-1", "msg-2"]
+
+    def test_busqueda_por_cursor_recorre_todo(self, servicio):
+        for i in range(5):
+            servicio.crear_mensaje(self._crear_entrada(message_id=f"msg-{i}", content="consulta de saldo " + "x " * i))
+        vistos = []
+        cursor = None
+        while True:
+            resultados, cursor = servicio.buscar_mensajes("saldo", limite=2, cursor=cursor)
+            vistos.extend(r["message_id"] for r in resultados)
+            if cursor is None:
+                break
+        assert vistos == [f"msg-{i}" for i in range(5)]
+        assert resultados[0]["score"] > 0
+        assert "<mark>saldo</mark>" in resultados[0]["snippet"]
+
+    def test_busqueda_cursor_invalido(self, servicio):
+        with pytest.raises(ErrorCursorInvalido):
+            servicio.buscar_mensajes("saldo", cursor="no-es-un-cursor")
+
+    def test_estadisticas_sesion(self, servicio):
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-1", content="Hola mundo"))
+        servicio.crear_mensaje(self._crear_entrada(message_id="msg-2", content="Eres un idiota", sender="system"))
+        estadisticas = servicio.obtener_estadisticas_sesion("session-001")
+        assert estadisticas["message_count"] == 2
+        assert estadisticas["sender_counts"] == {"user": 1, "system": 1}
+        assert estadisticas["total_words"] == 5
+
+    def test_estadisticas_sesion_no_existente(self, servicio):
+        with pytest.raises(ErrorSesionNoEncontrada):
+            servicio.obtener_estadisticas_sesion("no-existe")
+
+    def test_exportar_sesion_no_existente(self, servicio):
+        with pytest.raises(ErrorSesionNoEncontrada):
+            servicio.exportar_mensajes("no-existe")
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.dependencias import servicio_desde_pool
+from app.esquemas.esquema_mensaje import MensajeEntrada
+from app.excepciones.excepciones_api import ErrorMensajeDuplicado
+from app.repositorios.base_datos import inicializar_base_datos
+from app.repositorios.pool_conexiones import PoolConexiones
+from app.servicios.servicio_mensajes_asincrono import ServicioMensajesAsincrono
+
+
+def _entrada(**kwargs) -> MensajeEntrada:
+    datos = {
+        "message_id": "msg-001",
+        "session_id": "session-001",
+        "content": "Hola mundo",
+        "timestamp": "2023-06-15T14:30:00Z",
+        "sender": "user",
+    }
+    datos.update(kwargs)
+    return MensajeEntrada(**datos)
+
+
+class TestServicioMensajesAsincrono:
+    @pytest.fixture
+    def pool(self, tmp_path):
+        ruta = str(tmp_path / "async.db")
+        inicializar_base_datos(ruta)
+        pool = PoolConexiones(ruta_bd=ruta, tamano=2)
+        yield pool
+        pool.cerrar()
+
+    @pytest.fixture(params=["ejecutor_dedicado", "threadpool_por_defecto"])
+    def ejecutor(self, request):
+        if request.param == "threadpool_por_defecto":
+            yield None
+            return
+        ejecutor = ThreadPoolExecutor(max_workers=2)
+        yield ejecutor
+        ejecutor.shutdown()
+
+    def test_crear_y_leer(self, pool, ejecutor):
+        servicio = ServicioMensajesAsincrono(lambda: servicio_desde_pool(pool), ejecutor=ejecutor)
+
+        async def _flujo():
+            await servicio.crear_mensaje(_entrada())
+            return await servicio.obtener_mensajes_sesion("session-001")
+
+        mensajes, total, _, _ = asyncio.run(_flujo())
+        assert total == 1
+        assert mensajes[0]["message_id"] == "msg-001"
+
+    def test_operaciones_concurrentes_devuelven_conexiones(self, pool, ejecutor):
+        servicio = ServicioMensajesAsincrono(lambda: servicio_desde_pool(pool), ejecutor=ejecutor)
+
+        async def _flujo():
+            await asyncio.gather(*(servicio.crear_mensaje(_entrada(message_id=f"msg-{i}")) for i in range(20)))
+
+        asyncio.run(_flujo())
+        assert pool.conexiones_creadas <= pool.tamano
+        with pool.conexion() as conexion:
+            assert conexion.execute("SELECT COUNT(*) FROM mensajes").fetchone()[0] == 20
+
+    def test_errores_se_propagan(self, pool, ejecutor):
+        servicio = ServicioMensajesAsincrono(lambda: servicio_desde_pool(pool), ejecutor=ejecutor)
+
+        async def _flujo():
+            await servicio.crear_mensaje(_entrada())
+            await servicio.crear_mensaje(_entrada())
+
+        with pytest.raises(ErrorMensajeDuplicado):
+            asyncio.run(_flujo())